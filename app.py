@@ -55,9 +55,10 @@ def cleanup():
     if cleanup_done:
         return True, None
 
-    from src.control import stop_counting, stop_model_benchmark, stop_mqtt_client
+    from src.control import stop_counting, stop_model_benchmark, stop_mqtt_client, stop_preview
     logger.info("Cleanup started...")
     try:
+        stop_preview()
         stop_counting()
         stop_mqtt_client()
         stop_model_benchmark()
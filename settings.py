@@ -64,14 +64,16 @@ DATASET_PATH = os.path.join(HOME_DIR, "datasets")
 EXPORTS_PATH = os.path.join(HOME_DIR, "exports")
 TMP_PATH = os.path.join(HOME_DIR, "data/tmp")
 INFERENCE_SESSIONS = os.path.join(HOME_DIR, "data/sessions")
+QUEUE_PATH = os.path.join(HOME_DIR, "data/queue")
 
 # Define files
 CONFIG_PATH = os.path.join(HOME_DIR, "data/configs/config.json")
 CAM_SOLUTIONS_PATH = os.path.join(HOME_DIR, "data/configs/cam_solutions.json")
 SYSTEM_SETTINGS_PATH = os.path.join(HOME_DIR, "data/configs/settings.json")
+COUNTS_QUEUE_PATH = os.path.join(HOME_DIR, "data/queue/counts.db")
 
 # Ensure the directories exist
-for path in [CONFIG_FOLDER_PATH, INFERENCE_SESSIONS, IMG_PATH, TMP_PATH, VID_PATH, LOG_PATH, BENCHMARKS_PATH, YOLO_PREDICTIONS_PATH, DATASET_PATH, EXPORTS_PATH]:
+for path in [CONFIG_FOLDER_PATH, INFERENCE_SESSIONS, IMG_PATH, TMP_PATH, VID_PATH, LOG_PATH, BENCHMARKS_PATH, YOLO_PREDICTIONS_PATH, DATASET_PATH, EXPORTS_PATH, QUEUE_PATH]:
     os.makedirs(path, exist_ok=True)
 
 
@@ -82,10 +84,6 @@ for path in [CAM_SOLUTIONS_PATH]:
             json.dump({}, file)
 
 
-# Camera solutions
-CV2_INSTALLED = False
-PICAMERA2_INSTALLED = False
-
 # Function to load camera solutions from the JSON file
 def load_camera_solutions():
     try:
@@ -102,39 +100,70 @@ def update_camera_solutions():
     return cam_solutions
 
 
+"""
+    Camera solutions and GPU support are determined on first access (PEP 562 module __getattr__).
+    Probing the cameras opens them and importing torch takes several seconds on a Raspberry Pi, both are only
+    needed when a stream, counting or benchmark is started, not to serve the UI.
+"""
 
-cam_solutions = load_camera_solutions()
-
-# Ensure that cam_solutions is not None and contains the necessary keys
-if not cam_solutions.get("cv2", False) and not cam_solutions.get("picam2", False):
-    cam_solutions = update_camera_solutions()
-
-CV2_INSTALLED = cam_solutions.get("cv2", False)
-PICAMERA2_INSTALLED = cam_solutions.get("picam2", False)
+# Camera solutions
+def load_camera_values():
+    cam_solutions = load_camera_solutions()
 
+    # Ensure that cam_solutions is not None and contains the necessary keys
+    if not cam_solutions.get("cv2", False) and not cam_solutions.get("picam2", False):
+        cam_solutions = update_camera_solutions()
 
+    return {
+        "CV2_INSTALLED": cam_solutions.get("cv2", False),
+        "PICAMERA2_INSTALLED": cam_solutions.get("picam2", False),
+    }
 
 # If you have a CUDA-enabled GPU, you can use it for inference. Ensure to uncomment the lines in the Compose-File.
-try:
-    import torch
-    CUDA_AVAILABLE = torch.cuda.is_available()
-    CUDA_DEVICE_COUNT = torch.cuda.device_count()
-    CUDA_DEVICE_NAME = torch.cuda.get_device_name()
-except Exception as e:
-    CUDA_AVAILABLE = False
-    CUDA_DEVICE_COUNT = 0
-    CUDA_DEVICE_NAME = "None"
+def load_cuda_values():
+    try:
+        import torch
+        return {
+            "CUDA_AVAILABLE": torch.cuda.is_available(),
+            "CUDA_DEVICE_COUNT": torch.cuda.device_count(),
+            "CUDA_DEVICE_NAME": torch.cuda.get_device_name(),
+        }
+    except Exception as e:
+        return {"CUDA_AVAILABLE": False, "CUDA_DEVICE_COUNT": 0, "CUDA_DEVICE_NAME": "None"}
 
 # If you have a MPS-enabled GPU on Macbooks with M1 chip and later, you can use it for inference also. This is not tested fully yet, but should run at least with PyTorch. """
-try:
-    import torch.backends.mps
-    MPS_AVAILABLE = torch.backends.mps.is_available() if torch.backends.mps.is_available() else False
-    MPS_BUILT = torch.backends.mps.is_built() if torch.backends.mps.is_built() else False
-    MPS_MACOS13_OR_NEWER = torch.backends.mps.is_macos13_or_newer() if torch.backends.mps.is_macos13_or_newer() else False
-except Exception as e:
-    MPS_AVAILABLE = False
-    MPS_BUILT = False
-    MPS_MACOS13_OR_NEWER = False
+def load_mps_values():
+    try:
+        import torch.backends.mps
+        return {
+            "MPS_AVAILABLE": torch.backends.mps.is_available() if torch.backends.mps.is_available() else False,
+            "MPS_BUILT": torch.backends.mps.is_built() if torch.backends.mps.is_built() else False,
+            "MPS_MACOS13_OR_NEWER": torch.backends.mps.is_macos13_or_newer() if torch.backends.mps.is_macos13_or_newer() else False,
+        }
+    except Exception as e:
+        return {"MPS_AVAILABLE": False, "MPS_BUILT": False, "MPS_MACOS13_OR_NEWER": False}
+
+lazy_values_lock = threading.RLock()
+lazy_values = {
+    "CV2_INSTALLED": load_camera_values,
+    "PICAMERA2_INSTALLED": load_camera_values,
+    "CUDA_AVAILABLE": load_cuda_values,
+    "CUDA_DEVICE_COUNT": load_cuda_values,
+    "CUDA_DEVICE_NAME": load_cuda_values,
+    "MPS_AVAILABLE": load_mps_values,
+    "MPS_BUILT": load_mps_values,
+    "MPS_MACOS13_OR_NEWER": load_mps_values,
+}
+
+def __getattr__(name):
+    loader = lazy_values.get(name)
+    if loader is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with lazy_values_lock:
+        # Stored as module attributes, __getattr__ is not called again for them
+        if name not in globals():
+            globals().update(loader())
+    return globals()[name]
 
 
 from src.utils.generateDefaults import generateDefaultConfigIfNotExists, generateDefaultSystemSettingsIfNotExists
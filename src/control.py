@@ -4,20 +4,16 @@ import os
 import time
 import threading
 from threading import Thread
-import cv2
-import torch
-import numpy as np
-import psutil
-import GPUtil
-from src.core.action_helpers import export_model, real_time_status
+from src.core.action_helpers import get_export_args, real_time_status
 from src.core.cryptography import EncryptionManager
-from src.core.clients.mqtt import MQTTClient
+from src.core.monitor import SystemMonitor
+from src.core.events import EVENTS, diff
 from src.core.stream.ffmpeg import conversion_in_progress, is_conversion_in_progress
-from src.core.stream.yt_live import StreamCatcher
 from src.core.stream.stream_solution import StreamSolution
-from src.core.inference.benchmark import ModelBenchmark
-from src.core.inference.inference import Inference
 from src.core.inference.queuemanager import QueueManager
+from src.core.inference.model_registry import MODELS
+from src.core.inference.export_jobs import EXPORT_JOBS, DONE, FAILED
+from src.core.inference.supervisor import PIPELINES
 from src.utils.custom_process import CustomProcess
 from src.utils.logger import Logger
 from src.utils.tools import convert_to_seconds
@@ -32,25 +28,41 @@ from settings import (
 
 logger = Logger("Control", LOG_PATH + "/control.log")
 
+"""
+    Heavy modules (torch, ultralytics, cv2, GPUtil, yt_dlp, paho) are imported in the functions that need them,
+    so the HTTP server starts without loading them. They are loaded with the first counting, benchmark or export.
+    Check the startup with: python -m src.utils.importtime
+"""
+
 # Global variables, class instances and threads
 encryption_manager = EncryptionManager()
-yt_live = StreamCatcher()
+yt_live = None
 queue_manager: QueueManager = QueueManager()
 
-mqtt_client: MQTTClient = None
+mqtt_client: "MQTTClient" = None
 mqtt_thread_instance: Thread = None
 mqtt_ready_event = threading.Event()
 
 stream = None
 stream_inference: Thread = None
 
-exporting_thread = False
-inference: Inference = None
+pending_export_job = None # Export job, after which the counting is started. A failed job stays until the next start or stop
+pending_export_lock = threading.Lock()
+PENDING = "pending" # Status of start_counting while the model is exported
+error = None # Last error of an action, also of the start after an export
+inference: "Inference" = None
 inference_thread: Thread = None
 
-bench: ModelBenchmark = None
+bench: "ModelBenchmark" = None
 bench_process: CustomProcess = None
 
+sweep = None
+sweep_thread: Thread = None
+SWEEP_STOP_TIMEOUT = 10 # seconds, a running export or the shutdown of the pool is not waited for
+
+system_monitor: SystemMonitor = None
+preview: "PreviewBroadcaster" = None
+
 """Load and decrypt the configuration data."""
 def load_encrypted_config(str):
     encrypted_data = encryption_manager.load_data(str)
@@ -62,67 +74,78 @@ def load_encrypted_config(str):
         return None
     
 
+""" Returns the YouTube stream catcher, yt_dlp is imported with the first use. """
+def get_yt_live():
+    global yt_live
+    if yt_live is None:
+        from src.core.stream.yt_live import StreamCatcher
+        yt_live = StreamCatcher()
+    return yt_live
+
+
+"""
+    Creates and starts the camera stream of a device config.
+    The URL, resolution and fps of a YouTube stream are resolved here and written to the config.
+"""
+def create_stream(config, only_simulation=False):
+    data = load_config(CONFIG_PATH)
+    index = next(index for index, device_config in enumerate(data["deviceConfigs"]) if device_config["id"] == config["id"])
+    youtube = False
+    stream_source_value = config["stream_source"]
+
+    if stream_source_value == "youtube":
+        # The first device config uses the shared catcher, its expiration is checked by the inference
+        if index == 0:
+            catcher = get_yt_live()
+        else:
+            from src.core.stream.yt_live import StreamCatcher
+            catcher = StreamCatcher()
+        catcher.set_url(config["stream_url"])
+        catcher.set_quality(int(config["stream_url_resolution"]))
+        stream_source_value = catcher.get_video_url()
+        resolution, fps = catcher.get_stream_values()
+
+        # Update the config file with the new stream URL
+        data["deviceConfigs"][index]["stream_resolution"] = resolution
+        data["deviceConfigs"][index]["stream_fps"] = fps
+        with open(CONFIG_PATH, "w") as file:
+            json.dump(data, file, indent=4)
+        config = {**config, "stream_resolution": resolution, "stream_fps": fps}
+
+        youtube = True
+    else:
+        stream_source_value = int(stream_source_value)
+
+    CameraStream = StreamSolution(only_simulation, youtube)
+    if CameraStream is None:
+        raise Exception("No camera stream solution available.")
 
+    if only_simulation:
+        stream_source_value = os.path.join(VID_PATH, "capture.mp4")
+        if not os.path.exists(stream_source_value):
+            warning = "No test video available. Creating a test video..."
+            logger.warning(warning)
+            # Create a test video
+            take_video(15)
+            while not os.path.exists(stream_source_value):
+                time.sleep(1)
+
+    width, height = map(int, config["stream_resolution"].split('x'))
+    camera_stream = CameraStream(source=stream_source_value, main_resolution=(width, height), fps=config["stream_fps"], stream_channel=config["stream_channel"])
+    camera_stream.start_camera()
+    return camera_stream
+
+
+""" Starts the stream of the first device config, used for snapshots, videos and the primary counting pipeline. """
 def start_stream(only_simulation=False):
-    global stream, error, bench_process, yt_live
+    global stream, error
     error = None
 
     if stream is None:
-        #solutions = load_config(CAM_SOLUTIONS_PATH)
-        
-        data = load_config(CONFIG_PATH)
-        youtube = False
         try:
-            stream_source_value = next(config["stream_source"] for config in data["deviceConfigs"])
-            stream_url = None
-            stream_url_resolution = None
-
-            if stream_source_value == "youtube":
-                stream_url = next(config["stream_url"] for config in data["deviceConfigs"])
-                stream_url_resolution = next(config["stream_url_resolution"] for config in data["deviceConfigs"])
-                yt_live.set_url(stream_url)
-                stream = yt_live.set_quality(int(stream_url_resolution))
-                stream_url = yt_live.get_video_url()
-                resolution, fps = yt_live.get_stream_values()
-
-                # Update the config file with the new stream URL
-                data["deviceConfigs"][0]["stream_resolution"] = resolution
-                data["deviceConfigs"][0]["stream_fps"] = fps
-                with open(CONFIG_PATH, "w") as file:
-                    json.dump(data, file, indent=4)
-
-                stream_source_value = stream_url
-                youtube = True
-            else:
-                stream_source_value = int(stream_source_value)
-
-            CameraStream = StreamSolution(only_simulation, youtube)
-            if CameraStream is not None:
-
-                if only_simulation:
-                    stream_source_value = os.path.join(VID_PATH, "capture.mp4")
-                    if not os.path.exists(stream_source_value):
-                        warning = "No test video available. Creating a test video..."
-                        logger.warning(warning)
-                        # Create a test video
-                        take_video(15)
-                        while not os.path.exists(stream_source_value):
-                            time.sleep(1)
-                        stream_source_value = os.path.join(VID_PATH, "capture.mp4")
-                            
-                main_resolution_value = next(config["stream_resolution"] for config in data["deviceConfigs"])
-                fps_value = next(config["stream_fps"] for config in data["deviceConfigs"])
-                width, height = map(int, main_resolution_value.split('x'))
-                stream_channel = next(config["stream_channel"] for config in data["deviceConfigs"])
-
-                stream = CameraStream(source=stream_source_value, main_resolution=(width, height), fps=fps_value, stream_channel=stream_channel)
-                stream.start_camera()
-                return True, "Stream started."
-            else:
-                error = "No camera stream solution available."
-                logger.error(error)
-                return False, error
-            
+            data = load_config(CONFIG_PATH)
+            stream = create_stream(next(config for config in data["deviceConfigs"]), only_simulation)
+            return True, "Stream started."
         except Exception as e:
             error = f"Error while starting camera stream: {e}"
             logger.error(error)
@@ -147,22 +170,66 @@ def stop_stream():
         return False, error
 
 
-# TODO: This needs to be implemented
-def stop_exporting():
-    pass
+"""
+    Cancels export jobs. A counting that waits for the export is not started anymore.
+    Args:
+        params (dict): Optional job_id, otherwise all running and queued exports are cancelled
+"""
+def stop_exporting(params=None):
+    global pending_export_job
+
+    job_id = (params or {}).get('job_id')
+    if job_id:
+        cancelled = 1 if EXPORT_JOBS.cancel(job_id) else 0
+    else:
+        cancelled = EXPORT_JOBS.cancel_all()
+
+    with pending_export_lock:
+        if pending_export_job is not None and not pending_export_job.is_active():
+            pending_export_job = None
+
+    if not cancelled:
+        warning = "No active export to stop."
+        logger.warning(warning)
+        return False, warning
+    info = f"{cancelled} export(s) cancelled."
+    logger.info(info)
+    return True, info
+
+
+"""
+    Exports the model of the device config ahead of time for the given formats, so a later switch of the format
+    doesn't wait for the export.
+    Args:
+        params (dict): formats (list), optional overrides of the device config values (e.g. imgsz, quantization)
+    Returns:
+        list: Status of the export jobs
+"""
+def prefetch_exports(params=None):
+    params = params or {}
+    data = load_config(CONFIG_PATH)
+    config = {**next(config for config in data["deviceConfigs"]), **params.get('overrides', {})}
+    export_args = get_export_args(config)
+
+    jobs = []
+    for format in params.get('formats', []):
+        if format == 'pt':
+            continue
+        jobs.append(EXPORT_JOBS.submit(config['model'], format, export_args).get_status())
+    logger.info(f"Prefetching exports: {[job['format'] for job in jobs]}")
+    return jobs
 
 
 def start_counting(params = None):
-    global stream, inference, inference_thread, error, exporting_thread, model_path
+    global stream, inference, inference_thread, error, pending_export_job
     error = None
-    model_path = None
 
     if params is None:
         params = {}
 
     only_simulation = params.get('only_simulation', False)
 
-    if inference_thread is not None and inference_thread.is_alive():
+    if PIPELINES.is_active():
         error = "Counting is already active."
         logger.warning(error)
         return False, error
@@ -170,152 +237,148 @@ def start_counting(params = None):
         error = "Can't start counting, a benchmark is running."
         logger.warning(error)
         return False, error
+    if sweep_thread is not None and sweep_thread.is_alive():
+        error = "Can't start counting, a sweep is running."
+        logger.warning(error)
+        return False, error
+    with pending_export_lock:
+        if pending_export_job is not None and pending_export_job.is_active():
+            info = "Counting starts as soon as the model is exported."
+            logger.info(info)
+            return PENDING, info
+        # A failed export of the last start is tried again
+        pending_export_job = None
 
-
-    if only_simulation:
-        stop_stream()
-        start_stream(True)
-    if stream is None:
-        start_stream()
-        
     try:
         data = load_config(CONFIG_PATH)
-        config = next(config for config in data["deviceConfigs"]) # We had multiple device configs before, for now we only use one
-
-        weights = config['model']
-        format = config['modelFormat']
-        imgsz = config['imgsz']
-        keras = config['keras']
-        optimize = config['optimize']
-        quantization = config['quantization']
-        dynamic = config['dynamic']
-        simplify = config['simplify']
-        opset = config['opset']
-        workspace = config['workspace']
-        nms = config['nms']
-        batch = config['batch']
-
+        configs = get_counting_configs(data, params)
     except Exception as e:
         error = f"Error loading config for Counting: {e}"
         logger.error(error)
         raise Exception(error)
-    
-    # Check if the model exists in the exports directory
+
+    # Check if the models exist in the exports directory
     from src.utils.export_helper import check_if_model_exists
-    exists, model_path = check_if_model_exists(weights, format, {
-        'imgsz': imgsz,
-        'keras': keras,
-        'optimize': optimize,
-        'half': quantization == 'fp16',
-        'int8': quantization == 'int8',
-        'dynamic': dynamic,
-        'simplify': simplify,
-        'opset': opset,
-        'workspace': workspace,
-        'nms': nms,
-        'batch': batch
-    }) if not format == 'pt' else (False, weights)
-
-
-    if not exists:
-        exporting_thread = True
-        if not format == 'pt':
-            exp, model_path = export_model({
-                'weights': weights,
-                'format': format,
-                'imgsz': imgsz,
-                'keras': keras,
-                'optimize': optimize,
-                'half': quantization == 'fp16',
-                'int8': quantization == 'int8',
-                'dynamic': dynamic,
-                'simplify': simplify,
-                'opset': opset,
-                'workspace': workspace,
-                'nms': nms,
-                'batch': batch,
-            }, logger=logger)
-            #if err:
-            if not exp:
-                error = exp
+    model_paths = {}
+    missing = []
+    for config in configs:
+        weights = config['model']
+        format = config['modelFormat']
+        export_args = get_export_args(config)
+        exists, model_path = check_if_model_exists(weights, format, export_args) if not format == 'pt' else (True, weights)
+        if exists:
+            model_paths[config['id']] = model_path
+        else:
+            missing.append((config, weights, format, export_args))
+
+    if missing:
+        # The exports run in the background, the counting is started when they are done
+        def on_exported(job):
+            global pending_export_job, error
+            with pending_export_lock:
+                if pending_export_job is not job:
+                    # Stopped in the meantime
+                    return
+                if job.status != DONE:
+                    # The failed job stays in the status, a new start exports again
+                    error = f"Export of {job.weights} to {job.format} failed, counting not started: {job.error}"
+                    logger.error(error)
+                    return
+                pending_export_job = None
+            status, msg = start_counting(params)
+            if not status:
+                error = f"Counting could not be started after the export: {msg}"
                 logger.error(error)
-                exporting_thread = False
-                return False, error
 
-        exporting_thread = False
+        with pending_export_lock:
+            for config, weights, format, export_args in missing:
+                job = EXPORT_JOBS.submit(weights, format, export_args, on_done=on_exported)
+                if job.status == DONE:
+                    # Finished by another export in the meantime
+                    model_paths[config['id']] = job.model_path
+                elif pending_export_job is None or not pending_export_job.is_active():
+                    # Waits for one export at a time, the start checks the others again
+                    pending_export_job = job
+            if pending_export_job is not None and pending_export_job.is_active():
+                info = f"Exporting the model to {pending_export_job.format} (job {pending_export_job.id}), counting starts when the export is finished."
+                logger.info(info)
+                return PENDING, info
+            if pending_export_job is not None and pending_export_job.status == FAILED:
+                error = f"Export of {pending_export_job.weights} to {pending_export_job.format} failed, counting not started: {pending_export_job.error}"
+                logger.error(error)
+                return False, error
 
+    if only_simulation:
+        stop_stream()
+        start_stream(True)
+    if stream is None:
+        start_stream()
+    if stream is None:
+        return False, error or "Camera stream is not active."
 
-    
-    inference = Inference(
-        model_str=model_path,
-        stream=stream,
-        only_simulation=only_simulation,
-    ) 
-    
-    def counting_logic():
-        global error
-        try:
-            inference.run()
-        except Exception as e:
-            error = str(e)
-        if only_simulation:
-            inference.deactivate()
-            import gc
-            gc.collect()
+    # The first pipeline uses the stream of control.py, the others get their own
+    entries = []
+    for index, config in enumerate(configs):
+        entry = {'config': config, 'model_path': model_paths[config['id']], 'stream': stream, 'standalone': False}
+        if index > 0:
+            try:
+                entry['stream'] = create_stream(config)
+                entry['standalone'] = True
+            except Exception as e:
+                logger.error(f"Camera stream of device config {config['id']} could not be started: {e}")
+                continue
+        entries.append(entry)
 
     try:
-        inference_thread = threading.Thread(target=counting_logic, daemon=True, name="Counting")
-        inference_thread.start()
-        inference_thread.join(3)
-        
-        while inference.active and not inference.inference_started_event.is_set():
-            inference.inference_started_event.wait(0.5)
-        
-        #if not inference.inference_started_event.is_set():
-        if error or (not inference.inference_started_event.is_set()):
-            inference.deactivate()
-            inference_thread.join(5)
-            inference = None
-            inference_thread = None
-            if error:
-                return False, error
-            return False, "Unknown error while starting counting."
-        
-        if inference_thread.is_alive() and inference.active:
-            if only_simulation:
-                info = "Simulation started."
-            else:
-                info = "Counting started."
-
-            logger.info(info)
-            return True, info
-        else:
-            inference.deactivate()
-            if inference_thread:
-                inference_thread.join()
-            inference = None
-            inference_thread = None
-            if error:
-                return False, error
-            else:
-                return False, "Error while starting counting."
-
+        status, msg = PIPELINES.start(entries, only_simulation)
     except Exception as e:
         error = f"Error while starting counting: {e}"
         logger.error(error)
-        inference.deactivate()
-        inference_thread.join()
+        PIPELINES.stop()
+        return False, error
+
+    if not status:
+        error = msg
+        inference = None
+        inference_thread = None
         return False, error
 
+    # Snapshots, the preview and the status use the primary pipeline
+    primary = PIPELINES.get_primary()
+    inference = primary.inference
+    inference_thread = primary.thread
+    logger.info(msg)
+    return True, msg
+
+
+"""
+    Device configs to count with: all of them, or the one given by deviceConfigId.
+    A simulation runs on the test video of the first device config only.
+"""
+def get_counting_configs(data, params):
+    deviceConfigId = params.get('deviceConfigId')
+    if deviceConfigId:
+        return [next(config for config in data["deviceConfigs"] if config['id'] == deviceConfigId)]
+    if params.get('only_simulation', False):
+        return [next(config for config in data["deviceConfigs"])]
+    return list(data["deviceConfigs"])
+
 
 def stop_counting():
-    global inference, inference_thread
+    global inference, inference_thread, pending_export_job
     error = None
+
+    with pending_export_lock:
+        if pending_export_job is not None and not PIPELINES.is_active():
+            # The export keeps running and ends up in the export cache
+            pending_export_job = None
+            info = "Counting won't be started after the export."
+            logger.info(info)
+            return True, info
+
     try:
-        if inference_thread is not None and inference_thread.is_alive():
-            inference.deactivate()
-            if inference_thread is not None:
-                inference_thread.join()
+        if PIPELINES.is_active():
+            PIPELINES.stop()
             inference = None
             inference_thread = None
             info = "Counting stopped."
@@ -374,10 +437,14 @@ def take_video(duration):
         return False, error
 
 
-def start_model_benchmark():
+def start_model_benchmark(params=None):
     """
     Starts a new benchmark process with the given parameters.
 
+    Args:
+        params (dict): mode "model" (ultralytics benchmark, default) or "pipeline" (whole counting pipeline,
+            see PipelineBenchmark), for the pipeline mode optional source ("video" or "coco8"), frames and variants
+
     This function first checks if a benchmark process is already running. If so, it logs a warning and returns `False`.
     If no benchmark process is running, it extracts the provided parameters and creates a new instance of `ModelBenchmark`.
     Then, it starts a new CustomProcess that runs the `run` method of the `ModelBenchmark` instance.
@@ -405,6 +472,12 @@ def start_model_benchmark():
             logger.warning(error)
             return False, error
 
+        import torch
+        from src.core.inference.benchmark import ModelBenchmark
+
+        # The benchmark process needs the memory of the cached models
+        MODELS.clear()
+
         config = load_config(CONFIG_PATH)
         deviceConfig = config["deviceConfigs"][0]
         torch.device("cpu")
@@ -420,17 +493,27 @@ def start_model_benchmark():
         data = None
         verbose = False
 
-        # Create a new instance of ModelBenchmark
-        bench = ModelBenchmark(
-            deviceConfigId=deviceConfigId,
-            model=model,
-            imgsz=imgsz,
-            half=half,
-            int8=int8,
-            device=device,
-            data=data,
-            verbose=verbose
-        )
+        params = params or {}
+        if params.get('mode', 'model') == 'pipeline':
+            from src.core.inference.pipeline_benchmark import PipelineBenchmark, DEFAULT_FRAMES
+            bench = PipelineBenchmark(
+                deviceConfigId=deviceConfigId,
+                source=params.get('source', 'video'),
+                frames=params.get('frames', DEFAULT_FRAMES),
+                variants=params.get('variants'),
+            )
+        else:
+            # Create a new instance of ModelBenchmark
+            bench = ModelBenchmark(
+                deviceConfigId=deviceConfigId,
+                model=model,
+                imgsz=imgsz,
+                half=half,
+                int8=int8,
+                device=device,
+                data=data,
+                verbose=verbose
+            )
 
         # If device is CPU, set CUDA_VISIBLE_DEVICES to "" and use a CustomProcess
         if device == "cpu":
@@ -524,10 +607,92 @@ def stop_model_benchmark():
         return False, error
 
 
+def start_sweep(params=None):
+    """
+    Starts a parameter sweep of simulations on the recorded test video.
+    The sweep runs the simulations in a process pool, this function only starts the managing thread and returns.
+
+    Args:
+        params (dict): grid (dict of value lists), optional workers, threads_per_worker and save_video
+    """
+    global sweep, sweep_thread, error
+    error = None
+
+    if params is None:
+        params = {}
+
+    if sweep_thread is not None and sweep_thread.is_alive():
+        error = "A sweep is already running."
+        logger.warning(error)
+        return False, error
+    if inference_thread is not None and inference_thread.is_alive():
+        error = "Can't start sweep, counting is active."
+        logger.warning(error)
+        return False, error
+    if bench_process is not None and bench_process.is_alive():
+        error = "Can't start sweep, a benchmark is running."
+        logger.warning(error)
+        return False, error
+
+    from src.core.inference.sweep import SimulationSweep
+    try:
+        sweep = SimulationSweep(
+            grid=params.get('grid', {}),
+            workers=params.get('workers'),
+            threads_per_worker=params.get('threads_per_worker'),
+            save_video=params.get('save_video', False),
+        )
+    except Exception as e:
+        error = f"Error while starting sweep: {e}"
+        logger.error(error)
+        return False, error
+
+    def sweep_logic():
+        global error
+        try:
+            sweep.run()
+            if sweep.error is not None:
+                error = f"Error in sweep: {sweep.error}"
+        except Exception as e:
+            error = f"Error in sweep: {e}"
+            logger.error(error)
+            sweep.active = False
+
+    sweep_thread = threading.Thread(target=sweep_logic, daemon=True, name="Sweep")
+    sweep_thread.start()
+
+    info = f"Sweep with {len(sweep.jobs)} simulations started."
+    logger.info(info)
+    return True, info
+
+
+def stop_sweep():
+    global sweep, sweep_thread
+
+    if sweep_thread is None or not sweep_thread.is_alive():
+        warning = "No active sweep to stop."
+        logger.warning(warning)
+        return False, warning
+
+    sweep.stop()
+    sweep_thread.join(SWEEP_STOP_TIMEOUT)
+    if sweep_thread.is_alive():
+        # The thread ends on its own, a new sweep or counting can't start until then
+        info = "Sweep is stopping."
+        logger.info(info)
+        return True, info
+
+    sweep_thread = None
+    info = "Sweep stopped."
+    logger.info(info)
+    return True, info
+
+
 def get_gpu_status():
     """
     Returns the status of the GPU, including usage, temperature, and VRAM utilization.
     """
+    import GPUtil
     gpus = GPUtil.getGPUs()
     gpu_status = []
 
@@ -546,9 +711,9 @@ def get_gpu_status():
     return gpu_status
 
 
-""" Returns the health status of the system. """
-def send_status():
-    global mqtt_client, stream, inference, bench_process, conversion_in_progress, queue_manager, exporting_thread
+""" Collects the application part of the status, called by the system monitor at a fixed rate. """
+def collect_status():
+    global mqtt_client, stream, inference, bench_process, conversion_in_progress, queue_manager
 
     inference_status = inference is not None and inference.active if inference else False
     benchmark_status = bench_process is not None and bench_process.is_alive() if bench_process else False
@@ -556,32 +721,9 @@ def send_status():
     expected_fps = stream.get_details()["fps"] if stream is not None and hasattr(stream, 'get_details') else None
     reached_fps = inference.get_performance_metrics()["avg_fps"] if inference_status else None
 
-    cpu_percent = psutil.cpu_percent() if hasattr(psutil, 'cpu_percent') else None
-
-    #sensor_temps = psutil.sensors_temperatures() if hasattr(psutil, 'sensors_temperatures') else {}
-    #cpu_temp = sensor_temps.get('coretemp', []) if sensor_temps else []
-    #cpu_temp = cpu_temp[0].current if cpu_temp else None
-
-    ram_available = psutil.virtual_memory().available * 100 / psutil.virtual_memory().total
-    ram_total = psutil.virtual_memory().total / 1024 / 1024
-    ram_used = psutil.virtual_memory().used / 1024 / 1024
-
-    gpu_status = get_gpu_status()
-
-    cpu = {
-        'percent': cpu_percent,
-        #'temp': cpu_temp
-    }
-
-    ram = {
-        'available': ram_available,
-        'total': ram_total,
-        'used': ram_used
-    }
-
     status = {
         'mqtt': {
-            'status': isinstance(mqtt_client, MQTTClient),
+            'status': mqtt_client is not None,
             'connected': mqtt_client.is_connected() if mqtt_client and hasattr(mqtt_client, 'is_connected') else False,
             'published_msg': mqtt_client.get_published_messages_since_start() if mqtt_client and hasattr(mqtt_client, 'get_published_messages_since_start') else None
         },
@@ -592,25 +734,50 @@ def send_status():
         },
         'inference': {
             'status': inference_status,
-            'exporter': exporting_thread,
+            'exporter': EXPORT_JOBS.is_exporting(),
+            'exports': EXPORT_JOBS.list_jobs(),
             'simulation': inference_status and ((inference.only_simulation) if inference else False),
             'details': inference_status and (inference.get_performance_metrics() if inference else None) or False,
             'queue_size': queue_manager.get_counts_queue_size() if isinstance(queue_manager, QueueManager) else 0,
             'real_time': inference_status and real_time_status(reached_fps, expected_fps) if reached_fps is not None and expected_fps is not None else None,
             'simulation_frames_to_process': stream.get_total_frames() if stream is not None and hasattr(stream, 'get_total_frames') else None,
+            'pipelines': PIPELINES.get_status(),
+            'pending_export': pending_export_job.get_status() if pending_export_job is not None else None,
+            'error': error,
         },
         'benchmark': {
             'status': benchmark_status
         },
+        'sweep': sweep.get_status() if sweep is not None else None,
+        'models': MODELS.get_status(),
         'video_converter': is_conversion_in_progress(),
-        'cpu': cpu,
-        'ram': ram,
-        'gpu': gpu_status
     }
 
     return status
 
 
+""" Pushes the changed status fields to the event stream (/api/events), the histories are left out. """
+def publish_status_event(previous, status):
+    excluded = ('history', 'sampled_at')
+    previous = {key: value for key, value in previous.items() if key not in excluded} if previous else {}
+    status = {key: value for key, value in status.items() if key not in excluded}
+
+    delta = diff(previous, status)
+    if delta:
+        EVENTS.publish("status", delta, delta=True)
+
+
+""" Returns the health status of the system (cached snapshot of the system monitor, incl. short histories). """
+def send_status():
+    global system_monitor
+
+    if system_monitor is None:
+        system_monitor = SystemMonitor(collect_status, get_gpu_status, on_sample=publish_status_event)
+        system_monitor.start()
+
+    return system_monitor.get_status()
+
+
 def start_mqtt_client():
     global mqtt_client, mqtt_thread_instance, mqtt_ready_event
 
@@ -652,12 +819,16 @@ def start_mqtt_client():
     dataendpoint = config.get("dataEndpoint", None)
     dataendpoint = dataendpoint.replace("+", deviceName, 1)
     dataendpoint = dataendpoint.replace("+", deviceLocation, 1)
+    publish_mode = system_settings.get('mqtt_publish_mode', 'topic')
+    payload_encoding = system_settings.get('mqtt_payload_encoding', 'json')
+
+    from src.core.clients.mqtt import MQTTClient
 
     def mqtt_thread():
         global mqtt_client
         nonlocal status, msg
 
-        mqtt_client = MQTTClient(dataendpoint, counts_publish_intervall, topics, authEnabled, client_id, host, port, username, password, tls, willMsg, qos, cleanSession, keepalive)
+        mqtt_client = MQTTClient(dataendpoint, counts_publish_intervall, topics, authEnabled, client_id, host, port, username, password, tls, willMsg, qos, cleanSession, keepalive, publish_mode, payload_encoding)
         status, msg = mqtt_client.start()
         mqtt_ready_event.set()
 
@@ -711,22 +882,47 @@ def restart_server():
         return False, error
 
 
-""" Returns the last inference frame. For visualization purposes. """
-def get_last_inference_frame():
+""" Returns the last processed frame of the counting as np.ndarray (None during simulations). """
+def get_last_inference_image():
     global inference
     if inference is not None:
         sim = inference.is_simulation()
         if sim:
             return None
         
-        #inference.change_vars(True, True) # TODO: This does not work expectedly
-        frame = inference.get_last_frame()
+        # In headless mode the frame is rendered on demand from the latest raw frame and detections
+        return inference.get_last_frame()
+    return None
 
-        if isinstance(frame, np.ndarray) and frame.size > 0:
-            ret, jpeg = cv2.imencode('.jpg', frame)
-            frame = jpeg.tobytes()
-        else:
-            frame = None
-        #inference.change_vars(False, False) # TODO: This does not work expectedly
-        return frame
+
+def get_last_inference_frame():
+    import cv2
+    import numpy as np
+    frame = get_last_inference_image()
+
+    if isinstance(frame, np.ndarray) and frame.size > 0:
+        ret, jpeg = cv2.imencode('.jpg', frame)
+        return jpeg.tobytes()
     return None
+
+
+""" Returns the shared MJPEG preview, the encoder thread runs only while somebody is watching. """
+def get_preview():
+    global preview
+
+    if preview is None:
+        from src.core.stream.preview import PreviewBroadcaster
+        system_settings = load_config(SYSTEM_SETTINGS_PATH)
+        preview = PreviewBroadcaster(
+            get_last_inference_image,
+            fps=system_settings.get('preview_fps', 5),
+            width=system_settings.get('preview_width', 640),
+            quality=system_settings.get('preview_quality', 70),
+            max_viewers=system_settings.get('preview_max_viewers', 2),
+        )
+    return preview
+
+
+def stop_preview():
+    if preview is not None:
+        preview.stop()
@@ -1,37 +1,43 @@
 
-import threading
-from src.core.inference.exporter import export
 from src.utils.logger import Logger
 
 
 # Some helper functions for the control.py
 
-error = None
-export_thread: threading.Thread = None
-
-# Function to export the model with given parameters
+# Export arguments of a device config, used to look up and create the exported model
+def get_export_args(config):
+    quantization = config['quantization']
+    return {
+        'imgsz': config['imgsz'],
+        'keras': config['keras'],
+        'optimize': config['optimize'],
+        'half': quantization == 'fp16',
+        'int8': quantization == 'int8',
+        'dynamic': config['dynamic'],
+        'simplify': config['simplify'],
+        'opset': config['opset'],
+        'workspace': config['workspace'],
+        'nms': config['nms'],
+        'batch': config['batch'],
+    }
+
+
+# Function to export the model with given parameters, blocks until the export job is finished
 def export_model(parameters, logger: Logger):
-    global error, export_thread, model_path
-    error = None
-    model_path = None
-
-    def target():
-        global error, model_path
-        try:
-            logger.info(f"Exporting with parameters: {parameters}")
-            model_path = export(**parameters)
-        except Exception as e:
-            error = str(e)
-            logger.error(f"Exception in export: {error}")
-
-    export_thread = threading.Thread(target=target, daemon=True)
-    export_thread.start()
-    export_thread.join()
-
-    if error:
-        logger.error(f"Error in export: {error}")
-        return False, error
-    return True, model_path
+    from src.core.inference.export_jobs import EXPORT_JOBS
+
+    parameters = dict(parameters)
+    weights = parameters.pop('weights')
+    format = parameters.pop('format')
+
+    logger.info(f"Exporting with parameters: {parameters}")
+    job = EXPORT_JOBS.submit(weights, format, parameters)
+    success, result = job.wait()
+
+    if not success:
+        logger.error(f"Error in export: {result}")
+        return False, result
+    return True, result
 
 
 # Function to determine real-time status based on reached and expected FPS
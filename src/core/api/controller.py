@@ -14,14 +14,17 @@ class ActionController:
             take_snapshot, take_video, 
             start_counting, stop_counting, 
             start_model_benchmark, stop_model_benchmark, 
-            restart_server
+            start_sweep, stop_sweep,
+            prefetch_exports, stop_exporting,
+            restart_server,
+            PENDING
         )
         
         if action not in ['start', 'stop', 'snap', 'video', 'restart']:
             return {"error": "Invalid action."}, 400
 
-        if target not in ['camera', 'counting', 'benchmark', 'mqtt', 'server']:
-            return {"error": "Invalid target. Use 'camera', 'counting','benchmark', or 'mqtt'."}, 400
+        if target not in ['camera', 'counting', 'benchmark', 'sweep', 'export', 'mqtt', 'server']:
+            return {"error": "Invalid target. Use 'camera', 'counting','benchmark', 'sweep', 'export' or 'mqtt'."}, 400
 
         # Mapping of targets to functions
         action_map = {
@@ -39,6 +42,14 @@ class ActionController:
                 'start': start_model_benchmark,
                 'stop': stop_model_benchmark
             },
+            'sweep': {
+                'start': start_sweep,
+                'stop': stop_sweep
+            },
+            'export': {
+                'start': prefetch_exports,
+                'stop': stop_exporting
+            },
             'mqtt': {
                 'start': start_mqtt_client,
                 'stop': stop_mqtt_client
@@ -55,7 +66,7 @@ class ActionController:
             return {"error": "Action not found for the target."}, 404
 
         try:
-            if target == 'counting' and action == 'start':
+            if (target in ('counting', 'sweep', 'benchmark') and action == 'start') or target == 'export':
                 result = func(params or {})
             elif target == 'camera' and action == 'video':
                 result = func(
@@ -63,6 +74,9 @@ class ActionController:
                 )
             else:
                 result = func()
+            # The counting waits for an export and is started afterwards
+            if isinstance(result, tuple) and result and result[0] == PENDING:
+                return {"message": result, "status": "pending"}, 202
             return {"message": result}, 200
         except Exception as e:
             self.logger.error(f"Error during action execution: {e}")
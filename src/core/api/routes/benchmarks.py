@@ -1,7 +1,5 @@
-import os
-import json
 from flask import Blueprint, jsonify, request
-from settings import BENCHMARKS_PATH
+from src.core.inference.benchmark_store import BENCHMARKS, DEFAULT_THRESHOLD
 
 
 benchmarks_bp = Blueprint('benchmarks', __name__)
@@ -9,27 +7,37 @@ benchmarks_bp = Blueprint('benchmarks', __name__)
 @benchmarks_bp.route('/api/benchmarks', methods=['GET', 'DELETE'])
 def benchmarks():
     if request.method == 'GET':
-        if os.path.exists(BENCHMARKS_PATH):
-            benchmark_files = [f for f in os.listdir(BENCHMARKS_PATH) if f.endswith(".json")]
-
-            if benchmark_files:
-                benchmarks_data = []
-                for benchmark_file in benchmark_files:
-                    with open(os.path.join(BENCHMARKS_PATH, benchmark_file), 'r') as f:
-                        data = json.load(f)
-                    benchmarks_data.append(data)
-                return jsonify(benchmarks_data)
-            else:
-                return jsonify({"message": "No benchmark files found."}), 200
+        benchmarks_data = BENCHMARKS.list_contents()
+        if benchmarks_data:
+            return jsonify(benchmarks_data)
         else:
             return jsonify({"message": "No benchmark files found."}), 200
     
     if request.method == 'DELETE':
-        if os.path.exists(BENCHMARKS_PATH):
-            for filename in os.listdir(BENCHMARKS_PATH):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(BENCHMARKS_PATH, filename)
-                    os.remove(file_path)
-            return jsonify({'message': 'Deleted all benchmark files.'}), 200
-        else:
-            return jsonify({'message': 'No benchmark files found.'}), 200
\ No newline at end of file
+        BENCHMARKS.clear()
+        return jsonify({'message': 'Deleted all benchmark files.'}), 200
+
+# Metadata of the benchmarks without the results
+@benchmarks_bp.route('/api/benchmarks/index', methods=['GET'])
+def benchmarks_index():
+    return jsonify(BENCHMARKS.list_meta())
+
+"""
+    Compares a benchmark with the best earlier run on the same hardware.
+    Query: file (default the latest benchmark), threshold (relative FPS drop, default 0.1)
+"""
+@benchmarks_bp.route('/api/benchmarks/compare', methods=['GET'])
+def benchmarks_compare():
+    try:
+        threshold = float(request.args.get('threshold', DEFAULT_THRESHOLD))
+    except ValueError:
+        return jsonify({"message": "threshold has to be a number."}), 400
+
+    try:
+        result = BENCHMARKS.compare(request.args.get('file'), threshold)
+    except FileNotFoundError as e:
+        return jsonify({"message": str(e)}), 404
+
+    if result is None:
+        return jsonify({"message": "No benchmark files found."}), 200
+    return jsonify(result)
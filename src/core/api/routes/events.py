@@ -0,0 +1,34 @@
+from flask import Blueprint, Response, jsonify
+from src.utils.tools import load_config
+from settings import SYSTEM_SETTINGS_PATH
+
+events_bp = Blueprint('events', __name__)
+
+"""Server-sent events
+    Pushes status deltas, live line counts and the queue depth as soon as they change, instead of polling /api/health.
+    On connect the client gets the current state of every event, afterwards only the changes.
+    Every client holds a server thread, more than events_max_subscribers clients get a 503.
+
+    Example (browser):
+        const source = new EventSource("/api/events");
+        source.addEventListener("counts", (e) => console.log(JSON.parse(e.data)));
+"""
+@events_bp.route('/api/events', methods=['GET'])
+def events():
+    from src.control import send_status
+    from src.core.events import EVENTS, stream_events
+
+    max_subscribers = load_config(SYSTEM_SETTINGS_PATH).get('events_max_subscribers', 3)
+    subscription = EVENTS.subscribe(max_subscribers)
+    if subscription is None:
+        return jsonify({'error': 'Too many event subscribers.'}), 503
+
+    # Starts the system monitor, which publishes the status events
+    send_status()
+
+    response = Response(stream_events(subscription), mimetype='text/event-stream')
+    # The server closes the response when the client disconnects, also if it was never iterated
+    response.call_on_close(subscription.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,51 @@
+from flask import Blueprint, jsonify, request
+
+exports_bp = Blueprint('exports', __name__)
+
+"""Export jobs
+    GET    /api/exports             running and finished export jobs and the exported models in the cache
+    POST   /api/exports/prefetch    {"formats": ["onnx", "openvino"], "overrides": {"imgsz": 320}}
+    GET    /api/exports/<job_id>    status and progress of a job
+    DELETE /api/exports/<job_id>    cancels a job
+"""
+@exports_bp.route('/api/exports', methods=['GET', 'DELETE'])
+def exports():
+    from src.core.inference.export_jobs import EXPORT_JOBS
+    from src.core.inference.export_cache import EXPORT_CACHE
+
+    if request.method == 'DELETE':
+        return jsonify({'message': f"Removed {EXPORT_JOBS.clear_finished()} finished jobs."}), 200
+
+    return jsonify({
+        'jobs': EXPORT_JOBS.list_jobs(),
+        'cache': EXPORT_CACHE.list_exports(),
+    }), 200
+
+
+@exports_bp.route('/api/exports/prefetch', methods=['POST'])
+def prefetch():
+    from src.control import prefetch_exports
+
+    params = request.get_json(silent=True) or {}
+    if not isinstance(params.get('formats'), list) or not params['formats']:
+        return jsonify({'error': 'No formats provided.'}), 400
+    try:
+        return jsonify(prefetch_exports(params)), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@exports_bp.route('/api/exports/<job_id>', methods=['GET', 'DELETE'])
+def export_job(job_id):
+    from src.core.inference.export_jobs import EXPORT_JOBS
+
+    job = EXPORT_JOBS.get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Export job not found.'}), 404
+
+    if request.method == 'DELETE':
+        if not EXPORT_JOBS.cancel(job_id):
+            return jsonify({'error': 'Export job is not active.'}), 409
+        return jsonify({'message': 'Export job cancelled.'}), 200
+
+    return jsonify(job.get_status()), 200
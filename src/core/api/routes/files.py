@@ -6,7 +6,7 @@ from flask import Blueprint, Response, jsonify
 from flask import Blueprint, jsonify, send_file, url_for, Response, request
 from settings import VID_PATH, IMG_PATH
 from src.utils.logger import Logger
-from src.control import take_snapshot, get_last_inference_frame
+from src.control import take_snapshot, get_last_inference_frame, get_preview
 
 # Logger konfigurieren
 LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "logs")
@@ -87,6 +87,24 @@ def get_inference_frame():
     else:
         return jsonify({'error': 'No frame found.'}), 404
     
+"""Live preview as MJPEG stream (multipart/x-mixed-replace), can be used directly as <img src>.
+    All viewers share one encoder, see src/core/stream/preview.py
+"""
+@files_bp.route('/api/inference/stream', methods=['GET'])
+def get_inference_stream():
+    from src.core.stream.preview import BOUNDARY
+
+    preview = get_preview()
+    if not preview.add_viewer():
+        return jsonify({'error': 'Too many preview viewers.'}), 503
+
+    response = Response(preview.stream(), mimetype=f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+    # The server closes the response when the viewer disconnects
+    response.call_on_close(preview.remove_viewer)
+    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+    
 @files_bp.route('/api/simulations', methods=['GET', 'DELETE'])
 def simulations():
     if request.method == 'GET':
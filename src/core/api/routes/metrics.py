@@ -0,0 +1,15 @@
+from flask import Blueprint, Response
+
+metrics_bp = Blueprint('metrics', __name__)
+
+"""Prometheus metrics
+    Stage latency histograms of the inference, queue depth, MQTT publish counters and capture stats
+    in the Prometheus text exposition format.
+    With USE_OIDC the endpoint is protected like every other route: scrapers send an access token as
+    "Authorization: Bearer <token>" (Prometheus scrape_configs: authorization.credentials_file), without
+    a valid token the answer is 401 instead of the redirect to the login.
+"""
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    from src.core.metrics import REGISTRY
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -8,7 +8,8 @@ def youtube_stream():
     if not url:
         return jsonify({'error': 'No URL provided.'}), 400
     try:
-        from src.control import yt_live
+        from src.control import get_yt_live
+        yt_live = get_yt_live()
         yt_live.set_url(url)
         formats = yt_live.get_formats()
         return jsonify(formats)
@@ -12,10 +12,13 @@ from src.core.api.routes.config import config_bp
 from src.core.api.routes.files import files_bp
 from src.core.api.routes.mqtt import mqtt_bp
 from src.core.api.routes.health import health_bp
+from src.core.api.routes.metrics import metrics_bp
+from src.core.api.routes.events import events_bp
 from src.core.api.routes.logs import logs_bp
 from src.core.api.routes.action import action_bp
 from src.core.api.routes.auth import auth_bp, init_oauth, introspect_token
 from src.core.api.routes.benchmarks import benchmarks_bp
+from src.core.api.routes.exports import exports_bp
 from src.core.api.routes.youtube import youtube_bp
 
 
@@ -50,8 +53,11 @@ app.register_blueprint(files_bp)
 app.register_blueprint(mqtt_bp)
 app.register_blueprint(action_bp)
 app.register_blueprint(health_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(events_bp)
 app.register_blueprint(logs_bp)
 app.register_blueprint(benchmarks_bp)
+app.register_blueprint(exports_bp)
 app.register_blueprint(youtube_bp)
 
 
@@ -94,6 +100,10 @@ def require_auth():
         else:
             return jsonify({"error": "Unauthorized"}), 401
             
+    # Scrapers can't follow the login
+    if request.endpoint == 'metrics.metrics':
+        return jsonify({"error": "Unauthorized"}), 401
+
     # No valid authentication, redirect to login
     return redirect(url_for('auth.login'))
 
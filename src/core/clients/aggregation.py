@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+"""
+    Aggregation of queued count snapshots before publishing.
+    Every snapshot from the queue has the structure counts[region][direction]["IN"|"OUT"][class] = {"count", "total_conf"}.
+    All snapshots are merged in one pass into totals per topic (region/direction/class) and time bucket,
+    counts and confidences are summed, so a backlog is published as correct totals instead of the last snapshot.
+"""
+
+def new_totals():
+    return {"IN": 0, "OUT": 0, "IN_CONF": 0.0, "OUT_CONF": 0.0}
+
+
+"""
+    Args:
+        entries (list): (id, created, counts) tuples from QueueManager.peek_counts()
+        bucket_seconds (float): Size of the time buckets in seconds, 0 puts everything into one bucket
+    Returns:
+        dict: {bucket start (seconds): {topic: {"IN", "OUT", "IN_CONF", "OUT_CONF"}}}, IN_CONF/OUT_CONF are sums
+"""
+def aggregate_counts(entries, bucket_seconds=0):
+    buckets = defaultdict(lambda: defaultdict(new_totals))
+
+    for _, created, data in entries:
+        bucket = created - created % bucket_seconds if bucket_seconds else 0
+        topics = buckets[bucket]
+
+        for region_name, directions in data.items():
+            for direction, counts in directions.items():
+                for category in ("IN", "OUT"):
+                    for visitor_type, count_data in counts.get(category, {}).items():
+                        totals = topics[f"{region_name}/{direction}/{visitor_type}"]
+                        totals[category] += count_data.get("count", 0)
+                        totals[f"{category}_CONF"] += count_data.get("total_conf", 0)
+
+    return buckets
+
+
+# Payload of one topic, the summed confidences are converted to the average confidence
+def to_payload(totals, timestamp=None):
+    payload = {
+        "IN": totals["IN"],
+        "OUT": totals["OUT"],
+        "IN_CONF": totals["IN_CONF"] / totals["IN"] if totals["IN"] else 0,
+        "OUT_CONF": totals["OUT_CONF"] / totals["OUT"] if totals["OUT"] else 0,
+    }
+    if timestamp is not None:
+        payload["timestamp"] = timestamp
+    return payload
@@ -1,8 +1,12 @@
+import gzip
 import json
 import threading
 import time
 import paho.mqtt.client as mqtt
+from src.core.metrics import REGISTRY
 from src.utils.logger import Logger
+from src.core.clients.aggregation import aggregate_counts, to_payload
+from src.core.inference.entities import ms_to_iso
 from settings import (
     LOG_PATH,
 )
@@ -11,8 +15,22 @@ logger = Logger("MQTT", LOG_PATH + "/mqtt.log")
 
 error = None
 
+try:
+    import cbor2
+    CBOR_INSTALLED = True
+except ImportError:
+    CBOR_INSTALLED = False
+
+MESSAGES_PUBLISHED = REGISTRY.counter("mqtt_messages_published", "Messages handed over to the MQTT client.")
+MESSAGES_ACKNOWLEDGED = REGISTRY.counter("mqtt_messages_acknowledged", "Messages sent (QoS 0) or acknowledged by the broker (QoS 1/2).")
+PUBLISH_FAILURES = REGISTRY.counter("mqtt_publish_failures", "Failed publish attempts of queued counts.", ["reason"])
+BATCH_SECONDS = REGISTRY.histogram("mqtt_batch_publish_seconds", "Duration of publishing one batch of queued counts incl. acknowledgements.", buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+
+PUBLISH_MODES = ("topic", "batch")
+PAYLOAD_ENCODINGS = ("json", "gzip", "cbor")
+
 class MQTTClient:
-    def __init__(self, dataendpoint, counts_publish_intervall, topics, authEnabled, client_id, host, port, username=None, password=None, tls=False, willMsg=None, qos=0, cleanSession=True, keepalive=60):
+    def __init__(self, dataendpoint, counts_publish_intervall, topics, authEnabled, client_id, host, port, username=None, password=None, tls=False, willMsg=None, qos=0, cleanSession=True, keepalive=60, publish_mode="topic", payload_encoding="json", ack_timeout=10):
         self.lock = threading.Lock()
         self.counts_publish_intervall = counts_publish_intervall
         self.config = { "topics": topics }
@@ -33,16 +51,37 @@ class MQTTClient:
         self.connect_event = threading.Event()
         self.publish_counts_job = True
         self.published_messages_since_start = 0
+        self.acknowledged_messages_since_start = 0
+
+        # topic: one message per region/direction/class, batch: one document per publish interval
+        if publish_mode not in PUBLISH_MODES:
+            logger.warning(f"Unknown publish mode: {publish_mode}, using topic mode.")
+            publish_mode = "topic"
+        if payload_encoding not in PAYLOAD_ENCODINGS:
+            logger.warning(f"Unknown payload encoding: {payload_encoding}, using JSON.")
+            payload_encoding = "json"
+        if payload_encoding == "cbor" and not CBOR_INSTALLED:
+            logger.warning("cbor2 is not installed, falling back to JSON payloads.")
+            payload_encoding = "json"
+        self.publish_mode = publish_mode
+        self.payload_encoding = payload_encoding
+        self.ack_timeout = ack_timeout
 
         # Callbacks
         self.client.on_connect = self.on_connect
         self.client.on_message = self.on_message
         self.client.on_connect_fail = self.on_connect_fail
+        self.client.on_publish = self.on_publish
 
 
     def get_published_messages_since_start(self):
         return self.published_messages_since_start
 
+    def on_publish(self, client, userdata, mid, reason_code, properties):
+        with self.lock:
+            self.acknowledged_messages_since_start += 1
+        MESSAGES_ACKNOWLEDGED.inc()
+
     def start(self):
         global error
         try:
@@ -170,16 +209,60 @@ class MQTTClient:
                 logger.error(error)
                 return False, error
 
-            self.client.publish(topic, message, qos, retain)
+            self.send(topic, message, qos, retain)
             info = f"Published message: {message} to topic: {topic} with QoS {qos}"
-            logger.info(info)
-            self.published_messages_since_start += 1
             return True, info
         except Exception as e:
             error = f"Failed to publish message: {e}"
             logger.error(error)
             return False, error
 
+    """
+        Hands a payload (str or bytes) over to the client.
+        Returns:
+            MQTTMessageInfo: Can be used to wait for the acknowledgement
+    """
+    def send(self, topic, payload, qos, retain=False):
+        message_info = self.client.publish(topic, payload, qos, retain)
+        if message_info.rc != mqtt.MQTT_ERR_SUCCESS:
+            raise RuntimeError(f"Failed to publish message to topic {topic}: {mqtt.error_string(message_info.rc)}")
+
+        logger.debug(f"Published message {message_info.mid} to topic: {topic} with QoS {qos}")
+        self.published_messages_since_start += 1
+        MESSAGES_PUBLISHED.inc()
+        return message_info
+
+    # Waits until all messages were sent (QoS 0) or acknowledged by the broker (QoS 1/2)
+    def wait_for_acks(self, message_infos):
+        deadline = time.time() + self.ack_timeout
+        for message_info in message_infos:
+            try:
+                message_info.wait_for_publish(max(0, deadline - time.time()))
+            except (ValueError, RuntimeError) as e:
+                logger.warning(f"Message {message_info.mid} was not published: {e}")
+                PUBLISH_FAILURES.inc(reason="not_sent")
+                return False
+            if not message_info.is_published():
+                PUBLISH_FAILURES.inc(reason="timeout")
+                logger.warning(f"No acknowledgement for message {message_info.mid} within {self.ack_timeout}s.")
+                return False
+        return True
+
+    def encode_payload(self, document):
+        if self.payload_encoding == "cbor":
+            return cbor2.dumps(document)
+        payload = json.dumps(document, separators=(",", ":"))
+        if self.payload_encoding == "gzip":
+            return gzip.compress(payload.encode("utf-8"))
+        return payload
+
+    # Topic of the batch documents: the data endpoint up to the first placeholder + "/batch"
+    def get_batch_topic(self):
+        parts = self.dataendpoint.split("/")
+        if "+" in parts:
+            parts = parts[:parts.index("+")]
+        return "/".join([part for part in parts if part] + ["batch"])
+
     def prepare_final_topic(self, topic):
         final_topic = self.dataendpoint
         placeholders = final_topic.split("/")
@@ -214,43 +297,68 @@ class MQTTClient:
         logger.info("Stopped publishing counts thread.")
         return None, None
                     
-    def publish_from_queue(self):
+    """
+        Publishes the queued counts in batches. A batch is only removed from the queue
+        after all of its messages were handed over to the client, otherwise it is retried in the next run.
+    """
+    def publish_from_queue(self, batch_size=1000):
         try:
             from src.control import queue_manager
-    
-            unpublished_data = queue_manager.get_counts_history()
-    
-            if unpublished_data:
-                payloads = {}
-    
-                for data in unpublished_data:
-                    for region_name, directions in data.items():
-                        for direction, counts in directions.items():
-                            for category in ["IN", "OUT"]:
-                                visitor_types = counts.get(category, {}) 
-                                for visitor_type, count_data in visitor_types.items():
-                                    topic = f"{region_name}/{direction}/{visitor_type}"
-    
-                                    if topic not in payloads:
-                                        payloads[topic] = {
-                                            "IN": 0, # "IN_CONF": 0,
-                                            "OUT": 0, # "OUT_CONF": 0
-                                        }
-                                    
-                                    count_value = count_data.get("count", 0)
-                                    #conf_value = count_data.get("avg_conf", 0)
-                                    
-                                    payloads[topic][category] = count_value
-                                    #payloads[topic][f"{category}_CONF"] = conf_value
-    
-                # Publish the counts
-                for topic, payload in payloads.items():
-                    topic = self.prepare_final_topic(topic)
-                    self.publish(topic, payload, qos=self.qos)
-                    time.sleep(0.01)
+
+            while self.publish_counts_job and self.is_connected():
+                batch = queue_manager.peek_counts(batch_size)
+                if not batch:
+                    break
+
+                with BATCH_SECONDS.time():
+                    published = self.publish_batch(batch)
+                if not published:
+                    logger.warning("Publishing failed, counts stay in the queue.")
+                    break
+
+                queue_manager.ack_counts([row_id for row_id, _, _ in batch])
         except Exception as e:
             error = f"Failed to publish data from Queue: {e}"
             logger.error(error)
             #raise Exception(error)
             #return False, error
+
+    """
+        Merges the queued snapshots per topic and time bucket and publishes the totals,
+        either as one message per topic or as one document for the whole batch.
+        Returns True when all messages were acknowledged.
+    """
+    def publish_batch(self, entries):
+        buckets = aggregate_counts(entries, self.counts_publish_intervall)
+        message_infos = []
+
+        try:
+            if self.publish_mode == "batch":
+                document = {
+                    "device": self.client_id,
+                    "buckets": [
+                        {
+                            "timestamp": ms_to_iso(bucket * 1000),
+                            "counts": {topic: to_payload(totals) for topic, totals in buckets[bucket].items()},
+                        }
+                        for bucket in sorted(buckets)
+                    ],
+                }
+                message_infos.append(self.send(self.get_batch_topic(), self.encode_payload(document), self.qos))
+            else:
+                for bucket in sorted(buckets):
+                    timestamp = ms_to_iso(bucket * 1000)
+                    for topic, totals in buckets[bucket].items():
+                        topic = self.prepare_final_topic(topic)
+                        message_infos.append(self.send(topic, self.encode_payload(to_payload(totals, timestamp)), self.qos))
+        except Exception as e:
+            logger.error(str(e))
+            PUBLISH_FAILURES.inc(reason="rejected")
+            return False
+
+        if not self.wait_for_acks(message_infos):
+            return False
+
+        logger.info(f"Published {len(entries)} queued counts in {len(message_infos)} message(s) ({self.publish_mode} mode).")
+        return True
                         
\ No newline at end of file
@@ -0,0 +1,161 @@
+import copy
+import json
+import threading
+import time
+
+"""
+    Event bus for the server-sent events stream (/api/events).
+    Producers (system monitor, inference, queue) publish the latest state of a topic, every subscriber keeps
+    only the pending state per topic: a slow client gets the newest values instead of a growing backlog, and
+    a publish costs one dict update per connected client. Deltas (delta=True) are merged into the pending state,
+    so no change is lost when they are coalesced.
+    Every SSE client holds a thread of the WSGI server, the route limits the subscribers (max_subscribers).
+
+    Events:
+        status: changed fields of send_status() (delta, merged)
+        counts: in/out counts per line of the running countings, by deviceConfigId (delta, merged)
+        queue:  size of the count queue
+"""
+
+HEARTBEAT_INTERVAL = 15 # seconds
+
+
+def merge_delta(target, delta):
+    for key, value in delta.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_delta(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+"""
+    Returns the fields of new that differ from old (nested dicts are compared recursively).
+    Keys that were removed are returned as None.
+"""
+def diff(old, new):
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    delta = {}
+    for key, value in new.items():
+        if key not in old:
+            delta[key] = value
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = diff(old[key], value)
+            if nested:
+                delta[key] = nested
+        elif value != old[key]:
+            delta[key] = value
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
+
+
+class Subscription:
+    def __init__(self, bus):
+        self.bus = bus
+        self.cond = threading.Condition()
+        self.pending = {}
+        self.closed = False
+
+    def push(self, event, data, delta=False):
+        with self.cond:
+            if delta and isinstance(self.pending.get(event), dict):
+                merge_delta(self.pending[event], copy.deepcopy(data))
+            else:
+                # Own copy, later deltas are merged into it
+                self.pending[event] = copy.deepcopy(data) if delta else data
+            self.cond.notify()
+
+    """
+        Waits for pending events.
+        Returns:
+            list: (event, data) tuples, empty after the timeout
+    """
+    def get(self, timeout=None):
+        with self.cond:
+            if not self.pending and not self.closed:
+                self.cond.wait(timeout)
+            events = list(self.pending.items())
+            self.pending = {}
+        return events
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = []
+        self.state = {}
+
+    """
+        Args:
+            max_subscribers (int): None is returned when this many clients are subscribed, 0 for no limit
+    """
+    def subscribe(self, max_subscribers=0):
+        subscription = Subscription(self)
+        with self.lock:
+            if max_subscribers and len(self.subscriptions) >= max_subscribers:
+                return None
+            self.subscriptions.append(subscription)
+            # The current state of every topic, so a new client doesn't wait for the next change
+            for event, data in self.state.items():
+                subscription.pending[event] = copy.deepcopy(data)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def has_subscribers(self):
+        return bool(self.subscriptions)
+
+    """
+        Args:
+            event (str): Name of the event
+            data (dict): Full state of the topic, or only the changed fields with delta=True
+            delta (bool): data is a delta that is merged into the stored state
+    """
+    def publish(self, event, data, delta=False):
+        with self.lock:
+            if delta and isinstance(self.state.get(event), dict):
+                merge_delta(self.state[event], copy.deepcopy(data))
+            else:
+                self.state[event] = copy.deepcopy(data)
+            subscriptions = list(self.subscriptions)
+
+        for subscription in subscriptions:
+            subscription.push(event, data, delta)
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+"""
+    Generator for the SSE response of one client.
+"""
+def stream_events(subscription):
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            events = subscription.get(timeout=HEARTBEAT_INTERVAL)
+            if subscription.closed:
+                return
+            if not events:
+                # Comment line, keeps proxies from closing the connection
+                yield f": heartbeat {int(time.time())}\n\n"
+                continue
+            for event, data in events:
+                yield format_event(event, data)
+    finally:
+        subscription.close()
+
+
+EVENTS = EventBus()
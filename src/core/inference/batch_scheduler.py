@@ -0,0 +1,261 @@
+import threading
+import time
+from src.core.metrics import REGISTRY
+from src.core.inference.model_registry import MODELS, ModelKey
+from src.utils.logger import Logger
+from settings import LOG_PATH
+
+logger = Logger("BatchScheduler", LOG_PATH + "/inference.log")
+
+BATCH_SIZE = REGISTRY.histogram("batch_scheduler_batch_size", "Frames per forward pass of the batch scheduler.", buckets=(1, 2, 3, 4, 6, 8, 12, 16))
+BATCH_WAIT = REGISTRY.histogram("batch_scheduler_wait_seconds", "Time a frame waited for its batch.")
+
+"""
+    Micro-batching across streams.
+    When several pipelines count with the same model, every pipeline hands its frame to the scheduler instead of
+    calling model.track itself. The scheduler collects the frames until every stream delivered one or the latency
+    budget of the oldest frame is used up, runs one forward pass for the batch and updates the tracker of each
+    stream with its detections. The results look like the results of model.track, the line counting of the
+    pipelines doesn't change.
+
+    ultralytics uses one tracker for all images of a track() call with a list of images, so the scheduler runs
+    predict() and keeps its own tracker per stream.
+"""
+
+DEFAULT_LATENCY_MS = 20
+REQUEST_TIMEOUT = 30 # seconds
+
+
+def create_tracker(tracker, fps):
+    from ultralytics.trackers.track import TRACKER_MAP
+    from ultralytics.utils import IterableSimpleNamespace, yaml_load
+    from ultralytics.utils.checks import check_yaml
+
+    cfg = IterableSimpleNamespace(**yaml_load(check_yaml(tracker)))
+    return TRACKER_MAP[cfg.tracker_type](args=cfg, frame_rate=fps)
+
+
+# Same as the ultralytics track callback: replaces the boxes of the result with the tracked boxes incl. the IDs
+def apply_tracker(tracker, result):
+    import torch
+
+    detections = result.boxes.cpu().numpy()
+    if len(detections) == 0:
+        return result
+    tracks = tracker.update(detections, result.orig_img)
+    if len(tracks) == 0:
+        return result[[]]
+    tracked = result[tracks[:, -1].astype(int)]
+    tracked.update(boxes=torch.as_tensor(tracks[:, :-1]))
+    return tracked
+
+
+class BatchRequest:
+    def __init__(self, frame):
+        self.frame = frame
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchClient:
+    def __init__(self, tracker, classes):
+        self.tracker = tracker
+        self.classes = set(classes) if classes else None
+        self.request = None
+
+
+class BatchScheduler:
+    """
+        Args:
+            key (ModelKey): Model of the pipelines
+            conf (float): Confidence threshold
+            iou (float): IoU threshold of the NMS
+            latency_ms (float): Longest time a frame waits for the frames of the other streams
+            max_batch (int): Frames per forward pass, default one per stream
+    """
+    def __init__(self, key, conf, iou, latency_ms=DEFAULT_LATENCY_MS, max_batch=None):
+        self.key = key
+        self.conf = conf
+        self.iou = iou
+        self.latency = latency_ms / 1000
+        self.max_batch = max_batch
+
+        self.cond = threading.Condition()
+        self.clients = {} # client_id -> BatchClient
+        self.thread = None
+        self.active = False
+        self.model = None
+        self.model_info = None
+
+        # Stats
+        self.batches = 0
+        self.frames = 0
+
+    """
+        Adds a stream. The model is loaded with the first stream.
+        Args:
+            client_id (str): ID of the stream, usually the deviceConfigId
+            tracker (str): Tracker config of the stream (e.g. botsort.yaml)
+            fps (int): Frame rate of the stream, for the tracker
+            classes (list): Classes counted by the stream, None for all
+    """
+    def register(self, client_id, tracker, fps, classes=None):
+        with self.cond:
+            if self.model is None:
+                self.model, self.model_info = MODELS.acquire(self.key)
+            self.clients[client_id] = BatchClient(create_tracker(tracker, fps or 30), classes)
+            if self.thread is None or not self.thread.is_alive():
+                self.active = True
+                self.thread = threading.Thread(target=self.run, daemon=True, name="BatchScheduler")
+                self.thread.start()
+        logger.info(f"Stream {client_id} added to the batch scheduler ({len(self.clients)} streams).")
+        return self.model_info
+
+    def unregister(self, client_id):
+        with self.cond:
+            client = self.clients.pop(client_id, None)
+            if client is not None and client.request is not None:
+                client.request.error = "Stream removed from the batch scheduler."
+                client.request.done.set()
+            if self.clients:
+                self.cond.notify_all()
+                return
+            self.active = False
+            self.cond.notify_all()
+            model, self.model = self.model, None
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(5)
+        if model is not None:
+            MODELS.release(model)
+        logger.info("Batch scheduler stopped, no streams left.")
+
+    # Starts the tracking of a stream fresh, e.g. after frames were skipped
+    def reset_tracker(self, client_id):
+        with self.cond:
+            client = self.clients.get(client_id)
+            if client is not None:
+                client.tracker.reset()
+
+    """
+        Hands a frame of a stream to the scheduler and waits for its tracked result.
+        Returns:
+            Results: ultralytics result with track IDs, like model.track()
+    """
+    def track(self, client_id, frame, timeout=REQUEST_TIMEOUT):
+        request = BatchRequest(frame)
+        with self.cond:
+            client = self.clients.get(client_id)
+            if client is None:
+                raise Exception(f"Stream {client_id} is not registered at the batch scheduler.")
+            client.request = request
+            self.cond.notify_all()
+
+        if not request.done.wait(timeout):
+            raise Exception("Batch scheduler did not answer in time.")
+        if request.error:
+            raise Exception(request.error)
+        return request.result
+
+    # Waits until all streams delivered a frame or the budget of the oldest frame is used up, the lock has to be held
+    def collect(self):
+        while self.active:
+            pending = [(client_id, client) for client_id, client in self.clients.items() if client.request is not None and not client.request.done.is_set()]
+            limit = min(len(self.clients), self.max_batch or len(self.clients))
+            if pending:
+                oldest = min(client.request.submitted for _, client in pending)
+                remaining = oldest + self.latency - time.perf_counter()
+                if len(pending) >= limit or remaining <= 0:
+                    # Oldest first
+                    pending.sort(key=lambda item: item[1].request.submitted)
+                    return pending[:limit]
+                self.cond.wait(remaining)
+            else:
+                self.cond.wait(0.5)
+        return []
+
+    def run(self):
+        while True:
+            with self.cond:
+                batch = self.collect()
+                if not self.active:
+                    return
+                requests = [(client, client.request) for _, client in batch]
+                for client, _ in requests:
+                    client.request = None
+
+            started = time.perf_counter()
+            for _, request in requests:
+                BATCH_WAIT.observe(started - request.submitted)
+            BATCH_SIZE.observe(len(requests))
+
+            try:
+                results = self.model.predict([request.frame for _, request in requests], imgsz=self.key.imgsz, device=self.key.device, conf=self.conf, iou=self.iou, verbose=False)
+                for (client, request), result in zip(requests, results):
+                    if client.classes is not None and len(result.boxes):
+                        mask = [int(cls) in client.classes for cls in result.boxes.cls.tolist()]
+                        result = result[mask]
+                    request.result = apply_tracker(client.tracker, result)
+            except Exception as e:
+                logger.error(f"Error in batch of {len(requests)} frames: {e}")
+                for _, request in requests:
+                    request.error = str(e)
+
+            self.batches += 1
+            self.frames += len(requests)
+            for _, request in requests:
+                request.done.set()
+
+    def get_status(self):
+        return {
+            "model": self.key.weights,
+            "streams": list(self.clients),
+            "latency_ms": self.latency * 1000,
+            "batches": self.batches,
+            "avg_batch_size": round(self.frames / self.batches, 2) if self.batches else 0,
+        }
+
+
+"""
+    Groups the pipelines that can share a forward pass (same model, device, size, thresholds), a scheduler is only
+    created for groups with more than one pipeline. Only pt models and dynamic exports take a batch of any size
+    (same rule as the image size of the stride controller), static exports keep their own forward passes.
+    Args:
+        configs (list): (config, model_path) of the pipelines
+    Returns:
+        dict: deviceConfigId -> BatchScheduler
+"""
+def create_schedulers(configs, latency_ms=DEFAULT_LATENCY_MS, max_batch=None):
+    groups = {}
+    for config, model_path in configs:
+        if not is_batchable(config):
+            continue
+        group = (model_path, config['modelFormat'], config['deviceType'], int(config['imgsz']), config['quantization'], float(config['conf']), float(config['iou']))
+        groups.setdefault(group, []).append(config['id'])
+
+    schedulers = {}
+    for (model_path, format, device, imgsz, quantization, conf, iou), ids in groups.items():
+        if len(ids) < 2:
+            continue
+        key = ModelKey(model_path, format, resolve_device(device), imgsz, quantization, None)
+        scheduler = BatchScheduler(key, conf, iou, latency_ms, max_batch)
+        for deviceConfigId in ids:
+            schedulers[deviceConfigId] = scheduler
+    return schedulers
+
+
+def is_batchable(config):
+    return config['modelFormat'] == 'pt' or config.get('dynamic', False)
+
+
+# Same choice as Inference.set_device
+def resolve_device(device):
+    if device == "cpu":
+        return device
+    import settings
+    if settings.CUDA_AVAILABLE:
+        return "cuda"
+    if settings.MPS_AVAILABLE:
+        return "mps"
+    return device
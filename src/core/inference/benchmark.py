@@ -1,12 +1,10 @@
-import json
 import multiprocessing
-import os
 from ultralytics.utils.benchmarks import benchmark
+from src.core.inference.benchmark_store import BENCHMARKS
 from src.utils.logger import Logger
 from datetime import datetime
 from settings import (
     LOG_PATH,
-    BENCHMARKS_PATH,
 )
 
 logger = Logger("Benchmark", LOG_PATH + "/benchmark.log")
@@ -56,14 +54,13 @@ class ModelBenchmark:
                     "date": datetime.now().strftime("%d.%m.%Y - %H:%M:%S")
                 }
 
-                today = datetime.now().strftime("%d-%m-%Y")
-                now = datetime.now().strftime("%H-%M-%S")
-                filename = f"benchmark_{self.deviceConfigId}_{today}_{now}.json"
-
-                file_path = os.path.join(BENCHMARKS_PATH, filename)
-
-                with open(file_path, 'w') as file:
-                    json.dump(content, file, indent=4)
+                BENCHMARKS.save(content, {
+                    "type": "model",
+                    "model": self.model,
+                    "imgsz": int(self.imgsz),
+                    "quantization": "int8" if self.int8 else "fp16" if self.half else "default",
+                    "device": str(self.device),
+                })
                 
                 return None
                 
@@ -0,0 +1,282 @@
+import fcntl
+import hashlib
+import json
+import os
+import platform
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from src.utils.logger import Logger
+from settings import (
+    LOG_PATH,
+    BENCHMARKS_PATH,
+)
+
+logger = Logger("BenchmarkStore", LOG_PATH + "/benchmark.log")
+
+"""
+    Index of the benchmark results.
+    The benchmark files (benchmark_*.json in BENCHMARKS_PATH) stay as they are, the index (index.json) holds
+    their content and metadata: device config, model, format, quantization and a fingerprint of the hardware.
+    It is updated when a benchmark is written, /api/benchmarks reads one file instead of every benchmark.
+    Files that were added or removed by hand are picked up with the next read (only the file names are compared).
+
+    compare() checks a run against the best earlier run of the same model, format and quantization on the same
+    hardware and flags a throughput regression beyond a threshold.
+"""
+
+INDEX_PATH = os.path.join(BENCHMARKS_PATH, "index.json")
+INDEX_VERSION = 1
+DEFAULT_THRESHOLD = 0.1 # 10 % less FPS than the best run
+
+# Header of the model benchmark files: Benchmarks complete for <model> with imgsz=<imgsz>, half=..., int8=..., device=<device>
+HEADER_PATTERN = re.compile(r"for (?P<model>\S+) with imgsz=(?P<imgsz>\d+), half=(?P<half>\w+), int8=(?P<int8>\w+), device=(?P<device>\S+)")
+
+
+def get_cpu_name():
+    try:
+        with open("/proc/cpuinfo", "r") as file:
+            for line in file:
+                # "Model" on Raspberry Pi, "model name" on x86
+                if line.startswith(("model name", "Model")):
+                    return line.split(":", 1)[1].strip()
+    except Exception:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def get_hardware():
+    try:
+        import psutil
+        memory = round(psutil.virtual_memory().total / 1024 ** 3)
+    except Exception:
+        memory = None
+
+    gpu = None
+    try:
+        import settings
+        gpu = settings.CUDA_DEVICE_NAME if settings.CUDA_AVAILABLE else None
+    except Exception:
+        pass
+
+    hardware = {
+        "machine": platform.machine(),
+        "cpu": get_cpu_name(),
+        "cpu_count": os.cpu_count(),
+        "memory_gb": memory,
+        "gpu": gpu,
+    }
+    hardware["fingerprint"] = hashlib.sha1(json.dumps(hardware, sort_keys=True).encode()).hexdigest()[:12]
+    return hardware
+
+
+def parse_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Metadata of files written before the index existed, taken from the header
+def guess_meta(content):
+    meta = {"type": content.get("type", "model")}
+    match = HEADER_PATTERN.search(content.get("header", ""))
+    if match:
+        meta.update({
+            "model": match["model"],
+            "imgsz": int(match["imgsz"]),
+            "quantization": "int8" if match["int8"] == "True" else "fp16" if match["half"] == "True" else "default",
+            "device": match["device"],
+        })
+    return meta
+
+
+def get_timestamp(content):
+    try:
+        return datetime.strptime(content["date"], "%d.%m.%Y - %H:%M:%S").timestamp()
+    except Exception:
+        return 0
+
+
+class BenchmarkStore:
+    def __init__(self, path=BENCHMARKS_PATH):
+        self.path = path
+        self.index_path = os.path.join(path, os.path.basename(INDEX_PATH))
+        self.lock = threading.RLock()
+
+    # Benchmarks are written from the benchmark process, the index is shared with the application
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.index_path + ".lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def list_files(self):
+        return {file for file in os.listdir(self.path) if file.startswith("benchmark_") and file.endswith(".json")}
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+            if index.get("version") == INDEX_VERSION:
+                return index
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Could not read benchmark index, rebuilding it: {e}")
+        return {"version": INDEX_VERSION, "benchmarks": {}}
+
+    def save_index(self, index):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(index, file, separators=(",", ":"))
+        os.replace(tmp_path, self.index_path)
+
+    def make_entry(self, content, meta):
+        return {
+            "meta": {
+                "deviceConfigId": content.get("deviceConfigId"),
+                "timestamp": get_timestamp(content),
+                **meta,
+            },
+            "content": content,
+        }
+
+    # Adds files that are not in the index yet and removes deleted ones. The lock has to be held
+    def sync(self, index):
+        files = self.list_files()
+        changed = False
+
+        for file in set(index["benchmarks"]) - files:
+            del index["benchmarks"][file]
+            changed = True
+
+        for file in files - set(index["benchmarks"]):
+            try:
+                with open(os.path.join(self.path, file), "r") as f:
+                    content = json.load(f)
+                # Files written by save() carry their metadata, older ones only the header
+                index["benchmarks"][file] = self.make_entry(content, content.get("meta") or guess_meta(content))
+                changed = True
+            except Exception as e:
+                logger.warning(f"Could not index benchmark {file}: {e}")
+
+        if changed:
+            self.save_index(index)
+        return index
+
+    def get_index(self):
+        with self.locked():
+            return self.sync(self.load_index())
+
+    """
+        Writes a benchmark file and adds it to the index.
+        Args:
+            content (dict): deviceConfigId, header, data (rows by index), date
+            meta (dict): model, format, quantization, imgsz, device, type
+        Returns:
+            str: Path of the benchmark file
+    """
+    def save(self, content, meta):
+        today = datetime.now().strftime("%d-%m-%Y")
+        now = datetime.now().strftime("%H-%M-%S")
+        file = f"benchmark_{content['deviceConfigId']}_{today}_{now}.json"
+
+        meta = {**meta, "hardware": get_hardware()}
+        content = {**content, "meta": meta}
+
+        with self.locked():
+            with open(os.path.join(self.path, file), "w") as f:
+                json.dump(content, f, indent=4)
+            index = self.load_index()
+            index["benchmarks"][file] = self.make_entry(content, meta)
+            self.sync(index)
+            self.save_index(index)
+        return os.path.join(self.path, file)
+
+    # Contents of all benchmark files, like the files themselves
+    def list_contents(self):
+        return [entry["content"] for entry in self.get_index()["benchmarks"].values()]
+
+    def list_meta(self):
+        return [{"file": file, **entry["meta"]} for file, entry in self.get_index()["benchmarks"].items()]
+
+    def clear(self):
+        with self.locked():
+            for file in self.list_files():
+                os.remove(os.path.join(self.path, file))
+            self.save_index({"version": INDEX_VERSION, "benchmarks": {}})
+
+    """
+        Compares the rows of a run with the best earlier run of the same device config, model, format, quantization
+        and hardware.
+        Args:
+            file (str): Benchmark file, default the latest
+            threshold (float): Relative FPS drop that counts as regression
+        Returns:
+            dict: file, meta and one comparison per row: format, fps, best_fps, best_file, change, regression
+    """
+    def compare(self, file=None, threshold=DEFAULT_THRESHOLD):
+        benchmarks = self.get_index()["benchmarks"]
+        if not benchmarks:
+            return None
+        if file is None:
+            file = max(benchmarks, key=lambda name: benchmarks[name]["meta"]["timestamp"])
+        if file not in benchmarks:
+            raise FileNotFoundError(f"Benchmark {file} not found.")
+
+        target = benchmarks[file]
+        meta = target["meta"]
+
+        def same_series(other):
+            other_meta = other["meta"]
+            return (
+                other_meta.get("deviceConfigId") == meta.get("deviceConfigId")
+                and other_meta.get("type", "model") == meta.get("type", "model")
+                and other_meta.get("model") == meta.get("model")
+                and other_meta.get("format") == meta.get("format")
+                and other_meta.get("quantization") == meta.get("quantization")
+                and other_meta.get("imgsz") == meta.get("imgsz")
+                and (other_meta.get("hardware") or {}).get("fingerprint") == (meta.get("hardware") or {}).get("fingerprint")
+                and other_meta["timestamp"] < meta["timestamp"]
+            )
+
+        previous = {name: entry for name, entry in benchmarks.items() if name != file and same_series(entry)}
+
+        rows = []
+        for row in target["content"].get("data", {}).values():
+            fps = parse_number(row.get("FPS"))
+            best_fps, best_file = None, None
+            for name, entry in previous.items():
+                for other in entry["content"].get("data", {}).values():
+                    other_fps = parse_number(other.get("FPS"))
+                    if other.get("Format") == row.get("Format") and other_fps is not None and (best_fps is None or other_fps > best_fps):
+                        best_fps, best_file = other_fps, name
+
+            change = (fps - best_fps) / best_fps if fps is not None and best_fps else None
+            rows.append({
+                "format": row.get("Format"),
+                "fps": fps,
+                "best_fps": best_fps,
+                "best_file": best_file,
+                "change": round(change, 4) if change is not None else None,
+                "regression": change is not None and change < -threshold,
+            })
+
+        return {
+            "file": file,
+            "meta": meta,
+            "threshold": threshold,
+            "compared_runs": len(previous),
+            "regression": any(row["regression"] for row in rows),
+            "rows": rows,
+        }
+
+
+BENCHMARKS = BenchmarkStore()
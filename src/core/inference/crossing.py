@@ -0,0 +1,87 @@
+import numpy as np
+
+"""
+    Vectorized line crossing check for all tracks against all region lines.
+    The line segments from build_regions are converted into arrays once, then every frame all track
+    displacements (previous -> current position) are tested against all lines in one batched
+    segment intersection pass instead of building shapely LineStrings per track, region and line.
+
+    Semantics match shapely's LineString.crosses() for two segments: the interiors have to intersect
+    in exactly one point. Touching at an end point, parallel and collinear segments do not count.
+"""
+
+class LineCrossingEngine:
+    def __init__(self, regions):
+        self.regions = regions or []
+        self.lines = []
+        self.line_region = []
+        self.region_classes = []
+
+        for region_index, region in enumerate(self.regions):
+            self.region_classes.append(set(region["tagsInThisRegion"]))
+            for line in region["lines"]:
+                self.lines.append(line)
+                self.line_region.append(region_index)
+
+        self.line_region = np.array(self.line_region, dtype=np.int64)
+        self.starts = np.array([line["start_coord"] for line in self.lines], dtype=np.float64).reshape(-1, 2)
+        self.ends = np.array([line["end_coord"] for line in self.lines], dtype=np.float64).reshape(-1, 2)
+        self.vectors = self.ends - self.starts
+
+    def class_mask(self, clss):
+        # (tracks x lines): True if the class of the track is counted in the region of the line
+        clss = np.asarray(clss, dtype=np.int64)
+        region_mask = np.array([[cls in classes for classes in self.region_classes] for cls in clss], dtype=bool).reshape(len(clss), len(self.region_classes))
+        return region_mask[:, self.line_region]
+
+    """
+        Args:
+            previous (N x 2): Previous positions of the tracks
+            current (N x 2): Current positions of the tracks
+            clss (N): Class of each track
+        Returns:
+            tuple: (track indices, line indices, signs) of all crossings, ordered by track and line.
+                   sign is 1 for IN and -1 for OUT.
+    """
+    def crossings(self, previous, current, clss):
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+        previous = np.asarray(previous, dtype=np.float64).reshape(-1, 2)
+        current = np.asarray(current, dtype=np.float64).reshape(-1, 2)
+        if len(previous) == 0 or len(self.lines) == 0:
+            return empty
+
+        displacement = current - previous
+
+        # Broadcast to (tracks x lines)
+        p = previous[:, None, :]
+        d = displacement[:, None, :]
+        q = self.starts[None, :, :]
+        e = self.vectors[None, :, :]
+        qp = q - p
+
+        denom = d[..., 0] * e[..., 1] - d[..., 1] * e[..., 0]
+        t_num = qp[..., 0] * e[..., 1] - qp[..., 1] * e[..., 0]
+        u_num = qp[..., 0] * d[..., 1] - qp[..., 1] * d[..., 0]
+
+        # 0 < t < 1 and 0 < u < 1 without dividing: compare numerators against the signed denominator
+        sign = np.sign(denom)
+        t_num = t_num * sign
+        u_num = u_num * sign
+        denom = np.abs(denom)
+
+        hits = (denom > 0) & (t_num > 0) & (t_num < denom) & (u_num > 0) & (u_num < denom)
+        hits &= self.class_mask(clss)
+
+        if not hits.any():
+            return empty
+
+        track_index, line_index = np.nonzero(hits)
+
+        # Side of the line where the track is now, same formula as before: < 0 is OUT, otherwise IN
+        rel = current[track_index] - self.starts[line_index]
+        vec = self.vectors[line_index]
+        side = rel[:, 0] * vec[:, 1] - rel[:, 1] * vec[:, 0]
+        signs = np.where(side < 0, -1, 1)
+
+        return track_index, line_index, signs
@@ -0,0 +1,228 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from src.utils.logger import Logger
+from settings import (
+    LOG_PATH,
+    HOME_DIR,
+    EXPORTS_PATH,
+)
+
+logger = Logger("ExportCache", LOG_PATH + "/exporter.log")
+
+"""
+    Content-addressed cache for exported models.
+    Every export is stored in EXPORTS_PATH/<key>/, the key is a hash of the weights contents, the format and the
+    export arguments that matter for this format. The manifest (EXPORTS_PATH/manifest.json) maps the keys to the
+    exported model and records the export duration, the size and the measured speed, so a lookup doesn't need to
+    guess file names and a changed .pt file (same name, new training) is exported again.
+
+    The manifest is shared by the application and the export/sweep worker processes: it is re-read before every
+    change under a file lock and replaced atomically.
+"""
+
+MANIFEST_PATH = os.path.join(EXPORTS_PATH, "manifest.json")
+MANIFEST_VERSION = 1
+
+# Export arguments that influence the result, per format
+# https://docs.ultralytics.com/modes/export/#arguments
+EXPORT_ARGS = {
+    'torchscript': ['imgsz', 'optimize', 'batch'],
+    'onnx': ['imgsz', 'half', 'dynamic', 'simplify', 'opset', 'batch'],
+    'openvino': ['imgsz', 'half', 'int8', 'batch'],
+    'engine': ['imgsz', 'half', 'dynamic', 'simplify', 'workspace', 'int8', 'batch'],
+    'coreml': ['imgsz', 'half', 'int8', 'nms', 'batch'],
+    'saved_model': ['imgsz', 'keras', 'int8', 'batch'],
+    'pb': ['imgsz', 'batch'],
+    'tflite': ['imgsz', 'half', 'int8', 'batch'],
+    'edgetpu': ['imgsz'],
+    'tfjs': ['imgsz', 'half', 'int8', 'batch'],
+    'paddle': ['imgsz', 'batch'],
+    'ncnn': ['imgsz', 'half', 'batch'],
+}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+# Only the arguments of the format, with stable types (1 and True, "320" and 320 give the same key)
+def filter_export_args(format, export_args):
+    keys = EXPORT_ARGS.get(format)
+    args = {key: value for key, value in export_args.items() if keys is None or key in keys}
+    for key, value in args.items():
+        if key in ('imgsz', 'batch', 'opset', 'workspace') and isinstance(value, str) and value.isdigit():
+            args[key] = int(value)
+        elif key in ('half', 'int8', 'dynamic', 'simplify', 'optimize', 'keras', 'nms'):
+            args[key] = bool(value)
+    return dict(sorted(args.items()))
+
+
+# The weights as ultralytics resolves them, "yolo11n" is loaded as yolo11n.pt from the working directory
+def resolve_weights(weights):
+    candidates = [weights] if os.path.splitext(weights)[1] else [weights, weights + ".pt"]
+    for candidate in candidates:
+        for path in (candidate, os.path.join(HOME_DIR, candidate)):
+            if os.path.isfile(path):
+                return os.path.abspath(path)
+    return None
+
+
+def get_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, file)) for file in files)
+    return total
+
+
+class ExportCache:
+    def __init__(self, path=MANIFEST_PATH, exports_path=EXPORTS_PATH):
+        self.path = path
+        self.exports_path = exports_path
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def locked(self):
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path + ".lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self):
+        try:
+            with open(self.path, "r") as file:
+                manifest = json.load(file)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest
+            logger.warning(f"Export manifest has version {manifest.get('version')}, starting a new one.")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Could not read export manifest, starting a new one: {e}")
+        return {"version": MANIFEST_VERSION, "weights": {}, "exports": {}}
+
+    def save(self, manifest):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+    """
+        SHA-256 of the weights file. The hashes are kept in the manifest by path, size and modification time,
+        a file is only read again when it changed.
+    """
+    def hash_weights(self, weights, manifest):
+        path = resolve_weights(weights)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        cached = manifest["weights"].get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime"] == stat.st_mtime:
+            return cached["sha256"]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha256 = digest.hexdigest()
+        manifest["weights"][path] = {"size": stat.st_size, "mtime": stat.st_mtime, "sha256": sha256}
+        return sha256
+
+    def make_key(self, sha256, format, export_args):
+        content = json.dumps([sha256, format, filter_export_args(format, export_args)], sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()[:20]
+
+    """
+        Returns the key of the export and the manifest entry, if the model was exported already.
+        Returns:
+            tuple: (key, entry) key is None if the weights are not available locally
+    """
+    def find(self, weights, format, export_args):
+        with self.locked():
+            manifest = self.load()
+            weights_count = len(manifest["weights"])
+            sha256 = self.hash_weights(weights, manifest)
+            if sha256 is None:
+                return None, None
+
+            key = self.make_key(sha256, format, export_args)
+            entry = manifest["exports"].get(key)
+            if entry is not None and not os.path.exists(entry["path"]):
+                logger.warning(f"Exported model {entry['path']} is missing, removing it from the manifest.")
+                del manifest["exports"][key]
+                entry = None
+                self.save(manifest)
+            elif len(manifest["weights"]) != weights_count:
+                self.save(manifest)
+            return key, entry
+
+    def lookup(self, weights, format, export_args):
+        _, entry = self.find(weights, format, export_args)
+        return entry["path"] if entry else None
+
+    # Directory for a new export, an unfinished export of the same key is replaced
+    def get_export_dir(self, key):
+        return os.path.join(self.exports_path, key)
+
+    def store(self, weights, format, export_args, export_path, export_time):
+        with self.locked():
+            manifest = self.load()
+            sha256 = self.hash_weights(weights, manifest)
+            key = self.make_key(sha256 or weights, format, export_args)
+            manifest["exports"][key] = {
+                "weights": weights,
+                "sha256": sha256,
+                "format": format,
+                "args": filter_export_args(format, export_args),
+                "path": export_path,
+                "created": time.time(),
+                "export_time": export_time,
+                "size_bytes": get_size(export_path),
+                "speed": None,
+            }
+            self.save(manifest)
+        logger.info(f"Stored export {key} ({format}) at {export_path}, took {export_time:.1f} s.")
+        return key
+
+    # Speed measured with this exported model (simulation, counting or benchmark)
+    def record_speed(self, export_path, fps, inference_ms=None, device=None):
+        with self.locked():
+            manifest = self.load()
+            for entry in manifest["exports"].values():
+                if entry["path"] == export_path:
+                    entry["speed"] = {
+                        "fps": fps,
+                        "inference_ms": inference_ms,
+                        "device": device,
+                        "measured": time.time(),
+                    }
+                    self.save(manifest)
+                    return True
+        return False
+
+    def remove(self, key):
+        with self.locked():
+            manifest = self.load()
+            entry = manifest["exports"].pop(key, None)
+            if entry is None:
+                return False
+            self.save(manifest)
+        shutil.rmtree(self.get_export_dir(key), ignore_errors=True)
+        return True
+
+    def list_exports(self):
+        with self.locked():
+            manifest = self.load()
+        return [{"key": key, **entry} for key, entry in manifest["exports"].items()]
+
+
+EXPORT_CACHE = ExportCache()
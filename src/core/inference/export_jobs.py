@@ -0,0 +1,272 @@
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from src.core.inference.export_cache import EXPORT_CACHE, filter_export_args
+from src.core.metrics import REGISTRY
+from src.utils.logger import Logger
+from src.utils.tools import generateUUID, load_config
+from settings import LOG_PATH, SYSTEM_SETTINGS_PATH
+
+logger = Logger("ExportJobs", LOG_PATH + "/exporter.log")
+
+EXPORT_JOBS_TOTAL = REGISTRY.counter("export_jobs", "Finished export jobs.", ["status"])
+EXPORT_JOBS_ACTIVE = REGISTRY.gauge("export_jobs_active", "Queued and running export jobs.")
+
+"""
+    Background export jobs.
+    Exports (ONNX, OpenVINO, TFLite, ...) take minutes on small devices. They run in their own processes, the
+    caller gets a job with an ID right away and is notified when the exported model is ready. Jobs can be
+    cancelled (the export process is terminated), the number of parallel exports is limited
+    (system setting export_max_concurrent) and the same export is never started twice.
+    Finished exports end up in the export cache (export_cache.py).
+"""
+
+DEFAULT_MAX_CONCURRENT = 1
+DEFAULT_EXPORT_SECONDS = 120 # Expected duration for the progress estimate, if no export of the format was timed yet
+POLL_INTERVAL = 0.5 # seconds
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+# Runs in the export process
+def run_export(parameters, results):
+    try:
+        from src.core.inference.exporter import export
+        results.put((DONE, export(**parameters)))
+    except Exception as e:
+        results.put((FAILED, str(e)))
+
+
+class ExportJob:
+    def __init__(self, weights, format, export_args):
+        self.id = generateUUID()
+        self.weights = weights
+        self.format = format
+        self.export_args = export_args
+        self.signature = json.dumps([weights, format, filter_export_args(format, export_args)], sort_keys=True)
+
+        self.status = QUEUED
+        self.model_path = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.expected_duration = DEFAULT_EXPORT_SECONDS
+
+        self.process = None
+        self.results = None
+        self.callbacks = []
+        self.done_event = threading.Event()
+
+    def is_active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    """
+        Waits until the job is finished.
+        Returns:
+            tuple: (success, model_path or error)
+    """
+    def wait(self, timeout=None):
+        self.done_event.wait(timeout)
+        if self.status == DONE:
+            return True, self.model_path
+        return False, self.error or f"Export is {self.status}."
+
+    # Estimated from the duration of earlier exports of the same format, ultralytics doesn't report a progress
+    def get_progress(self):
+        if self.status == DONE:
+            return 1.0
+        if self.status != RUNNING:
+            return 0.0
+        return round(min(0.95, (time.time() - self.started) / self.expected_duration), 2)
+
+    def get_status(self):
+        return {
+            "id": self.id,
+            "weights": self.weights,
+            "format": self.format,
+            "args": filter_export_args(self.format, self.export_args),
+            "status": self.status,
+            "progress": self.get_progress(),
+            "model_path": self.model_path,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class ExportJobManager:
+    def __init__(self, max_concurrent=None):
+        self.lock = threading.RLock()
+        self.jobs = {} # id -> job, in submit order
+        self.max_concurrent = max_concurrent
+        self.thread = None
+        self.context = multiprocessing.get_context("spawn")
+
+        EXPORT_JOBS_ACTIVE.set_function(lambda: len(self.get_active_jobs()))
+
+    def get_max_concurrent(self):
+        if self.max_concurrent is not None:
+            return self.max_concurrent
+        try:
+            return max(1, int(load_config(SYSTEM_SETTINGS_PATH).get('export_max_concurrent', DEFAULT_MAX_CONCURRENT)))
+        except Exception:
+            return DEFAULT_MAX_CONCURRENT
+
+    """
+        Queues an export. Returns the running job if the same export is already queued or running,
+        and a finished job if the model is in the export cache already.
+        Args:
+            on_done (callable): Called with the job when the export is done or failed, in its own thread
+    """
+    def submit(self, weights, format, export_args, on_done=None):
+        job = ExportJob(weights, format, export_args)
+
+        with self.lock:
+            existing = next((other for other in self.jobs.values() if other.signature == job.signature and other.is_active()), None)
+            if existing is not None:
+                if on_done is not None:
+                    existing.callbacks.append(on_done)
+                return existing
+
+            model_path = EXPORT_CACHE.lookup(weights, format, export_args)
+            if on_done is not None:
+                job.callbacks.append(on_done)
+            self.jobs[job.id] = job
+
+            if model_path is not None:
+                job.model_path = model_path
+                self.finish(job, DONE)
+                return job
+
+            logger.info(f"Export job {job.id} queued: {weights} ({format}).")
+            self.ensure_running()
+        return job
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    def get_active_jobs(self):
+        with self.lock:
+            return [job for job in self.jobs.values() if job.is_active()]
+
+    def is_exporting(self):
+        return bool(self.get_active_jobs())
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or not job.is_active():
+                return False
+            if job.process is not None and job.process.is_alive():
+                job.process.terminate()
+                job.process.join(5)
+            job.error = "Export cancelled."
+            self.finish(job, CANCELLED)
+        logger.info(f"Export job {job_id} cancelled.")
+        return True
+
+    def cancel_all(self):
+        return sum(self.cancel(job.id) for job in self.get_active_jobs())
+
+    def list_jobs(self):
+        with self.lock:
+            return [job.get_status() for job in self.jobs.values()]
+
+    # Removes finished jobs from the list
+    def clear_finished(self):
+        with self.lock:
+            finished = [job_id for job_id, job in self.jobs.items() if not job.is_active()]
+            for job_id in finished:
+                del self.jobs[job_id]
+        return len(finished)
+
+    def ensure_running(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.scheduler, daemon=True, name="ExportJobs")
+            self.thread.start()
+
+    def scheduler(self):
+        while True:
+            with self.lock:
+                self.poll()
+                if not self.get_active_jobs():
+                    # Started again by the next submit
+                    self.thread = None
+                    return
+            time.sleep(POLL_INTERVAL)
+
+    # Collects results of running exports and starts queued ones, the lock has to be held
+    def poll(self):
+        for job in [job for job in self.jobs.values() if job.status == RUNNING]:
+            try:
+                status, value = job.results.get_nowait()
+            except queue.Empty:
+                if job.process.is_alive():
+                    continue
+                status, value = FAILED, f"Export process exited with code {job.process.exitcode}."
+
+            job.process.join(5)
+            if status == DONE:
+                job.model_path = value
+            else:
+                job.error = value
+            self.finish(job, status)
+
+        running = sum(1 for job in self.jobs.values() if job.status == RUNNING)
+        for job in [job for job in self.jobs.values() if job.status == QUEUED]:
+            if running >= self.get_max_concurrent():
+                break
+            self.start(job)
+            running += 1
+
+    def start(self, job):
+        timed = [entry["export_time"] for entry in EXPORT_CACHE.list_exports() if entry["format"] == job.format and entry.get("export_time")]
+        if timed:
+            job.expected_duration = sum(timed) / len(timed)
+
+        job.results = self.context.Queue()
+        job.process = self.context.Process(
+            target=run_export,
+            args=({'weights': job.weights, 'format': job.format, **job.export_args}, job.results),
+            daemon=True,
+            name=f"Export-{job.format}",
+        )
+        job.status = RUNNING
+        job.started = time.time()
+        job.process.start()
+        logger.info(f"Export job {job.id} started: {job.weights} ({job.format}).")
+
+    def finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+        job.process = None
+        job.results = None
+        EXPORT_JOBS_TOTAL.inc(status=status)
+
+        if status == DONE:
+            logger.info(f"Export job {job.id} done: {job.model_path}")
+        elif status == FAILED:
+            logger.error(f"Export job {job.id} failed: {job.error}")
+        job.done_event.set()
+
+        if status in (DONE, FAILED):
+            for callback in job.callbacks:
+                threading.Thread(target=self.run_callback, args=(callback, job), daemon=True).start()
+
+    def run_callback(self, callback, job):
+        try:
+            callback(job)
+        except Exception as e:
+            logger.error(f"Error in callback of export job {job.id}: {e}")
+
+
+EXPORT_JOBS = ExportJobManager()
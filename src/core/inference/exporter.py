@@ -1,15 +1,15 @@
 from ultralytics import YOLO
 import shutil
 import os
-from settings import EXPORTS_PATH
+import time
+from src.core.inference.export_cache import EXPORT_CACHE, filter_export_args
 from src.utils.logger import Logger
 from settings import LOG_PATH
 
 
 logger = Logger("Exporter", LOG_PATH + "/exporter.log")
 
-def move_to_exports(model_path, finalized_export_path):
-    destination_path = os.path.join(EXPORTS_PATH, finalized_export_path)
+def move_to_exports(model_path, destination_path):
 
     if os.path.exists(destination_path):
         shutil.rmtree(destination_path)
@@ -20,17 +20,11 @@ def move_to_exports(model_path, finalized_export_path):
         if os.path.exists(model_path):
             # Check if model_path is a file or directory
             if os.path.isdir(model_path):
-                
-                for item in os.listdir(model_path):
-                    source_item = os.path.join(model_path, item)
-                    dest_item = os.path.join(destination_path, item)
-                    
-                    if os.path.isdir(source_item):
-                        shutil.copytree(source_item, dest_item)
-                    else:
-                        shutil.copy2(source_item, dest_item)
-                        
-                return destination_path
+                # The directory keeps its name, ultralytics detects the format by the suffix (e.g. _openvino_model)
+                dest_dir = os.path.join(destination_path, os.path.basename(os.path.normpath(model_path)))
+                logger.info(f"Moving directory from {model_path} to {dest_dir}")
+                shutil.copytree(model_path, dest_dir)
+                return dest_dir
                 
             else:
                 # For single files
@@ -62,47 +56,31 @@ def export(weights, format, imgsz, keras, optimize, half, int8, dynamic, simplif
         "keras": keras,
         "optimize": optimize,
     }
-    
-    # https://docs.ultralytics.com/de/modes/export/#arguments
-    if format == 'torchscript':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'optimize', 'batch']}
-    elif format == 'onnx':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'half', 'dynamic', 'simplify', 'opset', 'batch']}
-    elif format == 'openvino':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'half', 'int8', 'batch']}
-    elif format == 'engine':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'half', 'dynamic', 'simplify', 'workspace', 'int8', 'batch']}
-    elif format == 'coreml':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'half', 'int8', 'nms', 'batch']}
-    elif format == 'saved_model':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'keras', 'int8', 'batch']}
-    elif format == 'pb':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'batch']}
-    elif format == 'tflite':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'half', 'int8', 'batch']}
-    elif format == 'edgetpu':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz']}
-    elif format == 'tfjs':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'half', 'int8', 'batch']}
-    elif format == 'paddle':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'batch']}
-    elif format == 'ncnn':
-        export_args = {k: v for k, v in export_args.items() if k in ['imgsz', 'half', 'batch']}
-
+    export_args = filter_export_args(format, export_args)
 
     try:
         # Store the export path returned by model.export()
+        start_time = time.time()
         export_path = model.export(format=format, **export_args)
+        export_time = time.time() - start_time
 
-        finalized_export_path = export_path + '_' + '_'.join([f"{key}_{value}" for key, value in export_args.items() if key in ['imgsz', 'half', 'int8', 'dynamic', 'simplify', 'opset', 'workspace', 'nms', 'batch'] and value])
-        # Move the exported model to the exports directory
-        if export_path:
-            final_path = move_to_exports(str(export_path), finalized_export_path)
-            return final_path
-        else:
-            error = logger.warning("Export succeeded but no path was returned")
+        if not export_path:
+            error = "Export succeeded but no path was returned"
+            logger.warning(error)
             raise Exception(error)
 
+        # Move the exported model into the directory of its cache key, the weights are available locally now
+        key, _ = EXPORT_CACHE.find(weights, format, export_args)
+        if key is None:
+            raise Exception(f"Weights {weights} not found after the export.")
+        final_path = move_to_exports(str(export_path), EXPORT_CACHE.get_export_dir(key))
+        if final_path is None:
+            raise Exception(f"Could not move the exported model {export_path}.")
+
+        EXPORT_CACHE.store(weights, format, export_args, final_path, export_time)
+        return final_path
+
     except Exception as e:
-        error = logger.error(f"Error exporting model: {e}")
+        error = f"Error exporting model: {e}"
+        logger.error(error)
         raise Exception(error)
@@ -1,4 +1,3 @@
-import glob
 import sys
 import os
 
@@ -13,16 +12,24 @@ import time
 import numpy as np
 from datetime import date
 from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
-from shapely.geometry import LineString
-from ultralytics import YOLO
 from ultralytics.utils.plotting import Annotator, colors
 from src.utils.logger import Logger
 from src.core.inference.names import names
-from src.core.stream.ffmpeg import convert_video
+from src.core.stream.ffmpeg import VideoEncoder
+from src.core.stream.capture import FrameReader
 from src.utils.tools import load_config, convert_to_seconds
 from src.core.inference.utils import build_regions, draw_regions, format_check
+from src.core.inference.crossing import LineCrossingEngine
+from src.core.inference.track_store import TrackStore
 from src.core.inference.entities import create_session_entity
+from src.core.inference.model_registry import MODELS, ModelKey, reset_trackers, predict_padded
+from src.core.inference.motion_gate import create_motion_gate
+from src.core.inference.stride_controller import create_stride_controller
+from src.core.inference.export_cache import EXPORT_CACHE
+from src.core.metrics import REGISTRY
+from src.core.events import EVENTS
 from settings import (
     LOG_PATH,
     VID_PATH,
@@ -31,17 +38,44 @@ from settings import (
     DEVICE_ID,
     CUDA_AVAILABLE,
     MPS_AVAILABLE,
-    TMP_PATH,
 )
 
 logger = Logger("Inference", LOG_PATH + "/inference.log")
 
+# Instrumentation, exposed on /metrics
+STAGE_SECONDS = REGISTRY.histogram("inference_stage_seconds", "Duration of the inference stages per frame (per batch for capture and model).", ["stage"])
+FRAMES_PROCESSED = REGISTRY.counter("inference_frames_processed", "Frames that went through the model.", ["mode"])
+LINE_CROSSINGS = REGISTRY.counter("inference_line_crossings", "Counted line crossings.", ["direction"])
+
 names = names
 
 class Inference:
-    def __init__(self, stream, model_str, only_simulation):
+    """
+        Args:
+            stream: CameraStream to read from
+            model_str (str): Path of the (exported) model
+            only_simulation (bool): Run a simulation on the recorded test video
+            overrides (dict): Device config values that replace the ones from config.json (simulation sweeps)
+            run_name (str): Suffix for the simulation files, so parallel simulations don't overwrite each other
+            save_video (bool): Render and encode the simulation video, otherwise only the results are saved
+            standalone (bool): Runs outside of control.py (e.g. in a worker process), the inference owns the stream
+            stages (dict): Switches stages of the pipeline on or off (pipeline benchmark):
+                count (line counting), draw (rendering), blur, queue (write the counts to the queue after every frame)
+            deviceConfigId (str): Device config to run, default the first one. Only the ROIs and tags without a
+                deviceConfigId or with this one are used
+            counts_namespace (str): Prefix of the region names in the counts, when several pipelines write to the queue
+            scheduler (BatchScheduler): Shares the forward passes with other streams (live counting only)
+    """
+    def __init__(self, stream, model_str, only_simulation, overrides=None, run_name=None, save_video=True, standalone=False, stages=None, deviceConfigId=None, counts_namespace=None, scheduler=None):
         # PROPS
         self.only_simulation = only_simulation
+        self.run_name = run_name
+        self.save_video = save_video
+        self.standalone = standalone
+        self.stages = {"count": True, "draw": True, "blur": True, "queue": False, **(stages or {})}
+        self.stage_samples = None # dict of lists, the duration of every stage is recorded when set
+        self.counts_namespace = counts_namespace
+        self.scheduler = scheduler if not only_simulation else None
         self.model_str = model_str
         self.stream = stream
         self.last_frame = None
@@ -56,14 +90,15 @@ class Inference:
         
         # BASIC
         self.inference_started_event = threading.Event()
-        self.temp_dir = os.path.join(TMP_PATH, f"simframes_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        self.frame_count_sim = 0
-
-        # If it's a simulation, create a temporary directory for frames
-        if self.only_simulation:
-            self.temp_dir = os.path.join(TMP_PATH, f"simframes_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-            os.makedirs(self.temp_dir, exist_ok=True)
-            self.frame_count_sim = 0
+        self.frame_requested = threading.Event()
+        self.snapshot_ready = threading.Event()
+        self.snapshot_lock = threading.Lock()
+        self.snapshot = None
+
+        # Simulations are streamed into the encoder while they run
+        self.encoder = None
+        self.sim_datetime = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        self.simulation_result = None
         
         self.frame_width = int(self.stream.get_details()['resolution'][0])
         self.frame_height = int(self.stream.get_details()['resolution'][1])
@@ -73,6 +108,7 @@ class Inference:
 
         # DATA
         self.init_time = None
+        self.model_info = None
         self.frame_count = 0
         self.avg_performance = {
             "avg_fps": 0,
@@ -89,11 +125,11 @@ class Inference:
             "OUT": defaultdict(lambda: {"count": 0, "total_conf": 0})
         }))
 
-        self.track_history = defaultdict(list)  # tracking history for each track ID
-        
         # Set Config
         DATA = load_config(CONFIG_PATH)
-        CONFIG = next(config for config in DATA["deviceConfigs"])
+        CONFIG = next(config for config in DATA["deviceConfigs"] if deviceConfigId is None or config['id'] == deviceConfigId)
+        if overrides:
+            CONFIG = {**CONFIG, **overrides}
         self.deviceConfigId = CONFIG['id']
         self.deviceId = DEVICE_ID
         self.format = CONFIG['modelFormat']
@@ -105,23 +141,64 @@ class Inference:
         self.quantization = CONFIG['quantization']
         self.device = CONFIG['deviceType']
         self.vid_stride = CONFIG['vid_stride']
-        self.hasRegions = True if "deviceRois" in DATA and len(DATA["deviceRois"]) > 0 else False
-        self.obj_clss = list(map(int, DATA["deviceTags"][0]["tags"])) if "deviceTags" in DATA else None
-        self.regions = build_regions(DATA["deviceRois"]) if self.hasRegions else None
+        self.batch = max(1, int(CONFIG.get('batch', 1))) if self.only_simulation else 1
+        # Static exports only take full batches of the export batch size
+        self.static_batch = self.format != 'pt' and not CONFIG.get('dynamic', False)
+        self.export_batch = max(1, int(CONFIG.get('batch', 1)))
+        rois = [roi for roi in DATA.get("deviceRois", []) if roi.get("deviceConfigId") in (None, self.deviceConfigId)]
+        tags = next((tags for tags in DATA.get("deviceTags", []) if tags.get("deviceConfigId") == self.deviceConfigId), None) or (DATA["deviceTags"][0] if "deviceTags" in DATA else None)
+        self.hasRegions = len(rois) > 0
+        self.obj_clss = list(map(int, tags["tags"])) if tags else None
+        self.regions = build_regions(rois) if self.hasRegions else None
+
+        # Capture stage: live cameras always deliver the newest frame, simulations must not drop frames
+        self.reader = FrameReader(
+            self.stream,
+            capacity=max(4, self.batch * self.vid_stride + 2),
+            mode="lossless" if self.only_simulation else "latest",
+        )
 
         # VALIDATION
         self.validate_regions()
+        self.crossing_engine = LineCrossingEngine(self.regions)
 
         # Load system settings
         SYSTEM_SETTINGS = load_config(SYSTEM_SETTINGS_PATH)
-        self.blur_humans = SYSTEM_SETTINGS['blur_humans']
+        self.blur_humans = SYSTEM_SETTINGS['blur_humans'] and self.stages["blur"]
+        # Headless: the hot loop does no drawing at all, frames are only rendered when requested
+        self.headless = SYSTEM_SETTINGS.get('headless', True) and not self.only_simulation
+        if self.only_simulation and not self.save_video:
+            # No video, the final frame is only rendered once as cover image, requested in run_simulation
+            self.headless = True
+        if stages is not None:
+            self.headless = not self.stages["draw"]
         self.detect_count_timespan = SYSTEM_SETTINGS['detect_count_timespan']
         counts_save_intervall_tmp = SYSTEM_SETTINGS['counts_save_intervall']
         self.counts_save_intervall = convert_to_seconds(counts_save_intervall_tmp, SYSTEM_SETTINGS['counts_save_intervall_format'])
 
+        # Adapts vid_stride (and imgsz) of the live counting to the measured load, the batched forward passes have one imgsz
+        self.stride_controller = create_stride_controller(
+            SYSTEM_SETTINGS,
+            self.deviceConfigId,
+            self.fps,
+            self.vid_stride,
+            self.imgsz,
+            dynamic_imgsz=(self.format == 'pt' or CONFIG.get('dynamic', False)) and self.scheduler is None,
+        ) if not self.only_simulation else None
+
+        # Skips the model while nothing moves at the lines (live counting only, simulations are compared by their counts)
+        self.motion_gate = create_motion_gate(SYSTEM_SETTINGS, self.deviceConfigId, self.regions, self.frame_width, self.frame_height) if not self.only_simulation else None
+        self.active_tracks = 0
+
+        # Tracking history for each track ID, bounded per track and evicted when a track is not seen anymore
+        self.track_store = TrackStore(
+            capacity=SYSTEM_SETTINGS.get('track_history_length', 30),
+            ttl=SYSTEM_SETTINGS.get('track_ttl', 5),
+        )
+
         # Init Functions
         self.set_device() if self.device != "cpu" else None
-        self.queue_manager = check_queue_manager_exists()
+        self.queue_manager = check_queue_manager_exists() if not self.standalone else None
         self.active = True
 
         # Create session
@@ -161,8 +238,25 @@ class Inference:
             logger.error(error)
             raise Exception(error)
 
-    def get_last_frame(self):
-        return self.last_frame
+    """
+        Returns the last processed frame.
+        In headless mode the inference thread only hands over a copy of the next raw frame on request,
+        the rendering happens here in the thread of the caller.
+    """
+    def get_last_frame(self, timeout=2):
+        if not self.headless:
+            return self.last_frame
+
+        with self.snapshot_lock:
+            self.snapshot_ready.clear()
+            self.frame_requested.set()
+            if not self.snapshot_ready.wait(timeout):
+                self.frame_requested.clear()
+                return None
+            frame, detections, tracks = self.snapshot
+            self.snapshot = None
+
+        return self.render(frame, detections, tracks)
     
     def change_vars(self, annotate, show_regions):
         self.annotate = annotate
@@ -192,9 +286,26 @@ class Inference:
             "avg_fps": self.avg_performance["avg_fps"],
             "avg_fps_model": self.avg_performance["avg_fps_model"],
             "frames_processed": self.frame_count,
+            "capture": self.reader.get_stats(),
+            "model": self.model_info,
+            "stride": self.stride_controller.get_status() if self.stride_controller is not None else None,
+            "motion_gate": self.motion_gate.get_status() if self.motion_gate is not None else None,
         }
         return inference_performance
 
+    # Times a stage of the pipeline: with self.stage("count"): ...
+    @contextmanager
+    def stage(self, name):
+        with STAGE_SECONDS.time(stage=name) as timer:
+            yield timer
+        if self.stage_samples is not None:
+            self.stage_samples[name].append(timer.elapsed)
+
+    def observe_stage(self, name, seconds):
+        STAGE_SECONDS.observe(seconds, stage=name)
+        if self.stage_samples is not None:
+            self.stage_samples[name].append(seconds)
+
     def blur_objects(self, frame, boxes, blur_factor=55):
         for box in boxes:
             x1, y1, x2, y2 = map(int, box)
@@ -204,148 +315,361 @@ class Inference:
         return frame
     
     # https://github.com/ultralytics/ultralytics/blob/main/examples/YOLOv8-Region-Counter/yolov8_region_counter.py
-    def count(self, track_id, cls, cls_name, region_name, line, previous_position, current_position, conf, current_time):
-        line_geom = LineString([line["start_coord"], line["end_coord"]])
-        
-        if line_geom.crosses(LineString([previous_position, current_position])):
-            cross_product = (current_position[0] - line["start_coord"][0]) * (line["end_coord"][1] - line["start_coord"][1]) - \
-                               (current_position[1] - line["start_coord"][1]) * (line["end_coord"][0] - line["start_coord"][0])
-                
+    def count(self, track_ids, clss, confs, previous_positions, current_positions):
+        track_index, line_index, signs = self.crossing_engine.crossings(previous_positions, current_positions, clss)
+        if len(track_index) == 0:
+            return
+
+        for i, j, sign in zip(track_index.tolist(), line_index.tolist(), signs.tolist()):
+            line = self.crossing_engine.lines[j]
+            region_name = self.regions[self.crossing_engine.line_region[j]]["name"]
+            if self.counts_namespace:
+                region_name = f"{self.counts_namespace}:{region_name}"
             direction = line["direction"]
-                
-            if cross_product < 0:  # OUT
+            cls_name = names.get(clss[i], str(clss[i]))
+
+            if sign < 0:  # OUT
                 line["counts"]["out"] += 1
+                LINE_CROSSINGS.inc(direction="OUT")
                 self.counts[region_name][direction]["OUT"][cls_name]["count"] += 1
-                self.counts[region_name][direction]["OUT"][cls_name]["total_conf"] += conf
+                self.counts[region_name][direction]["OUT"][cls_name]["total_conf"] += confs[i]
             else:  # IN
                 line["counts"]["in"] += 1
+                LINE_CROSSINGS.inc(direction="IN")
                 self.counts[region_name][direction]["IN"][cls_name]["count"] += 1
-                self.counts[region_name][direction]["IN"][cls_name]["total_conf"] += conf
+                self.counts[region_name][direction]["IN"][cls_name]["total_conf"] += confs[i]
+
+            self.last_track_id = track_ids[i]
+
+        # Live counts for the UI (/api/events), one entry per device config so the pipelines don't replace each other
+        EVENTS.publish("counts", {self.deviceConfigId: self.get_line_counts()}, delta=True)
+
+    # In/out counts of every line since the start of the counting
+    def get_line_counts(self):
+        return {
+            "deviceConfigId": self.deviceConfigId,
+            "simulation": self.only_simulation,
+            "lines": [
+                {
+                    "id": line["id"],
+                    "region": self.regions[self.crossing_engine.line_region[index]]["name"],
+                    "direction": line["direction"],
+                    "in": line["counts"]["in"],
+                    "out": line["counts"]["out"],
+                }
+                for index, line in enumerate(self.crossing_engine.lines)
+            ],
+        }
+
+
+    """
+        Updates the track history and counts the line crossings for one result.
+        Returns the detections as plain arrays (or None), so the frame can be rendered later on demand.
+    """
+    def process_detections(self, result, now):
+        if result.boxes.id is None or len(result.boxes.id) == 0:
+            return None
+
+        detections = {
+            "boxes": result.boxes.xyxy.cpu().numpy(),
+            "track_ids": result.boxes.id.int().cpu().tolist(),
+            "clss": [int(cls) for cls in result.boxes.cls.cpu().tolist()],
+            "confs": result.boxes.conf.cpu().tolist(),
+        }
+        boxes = detections["boxes"]
+        track_ids = detections["track_ids"]
+
+        # Tracking-Points: add the current positions to the track history
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        previous_positions, has_previous = self.track_store.update(track_ids, centers, now)
+
+        # Überprüfe Linienüberquerungen, all tracks with a previous position against all lines at once
+        if has_previous.any():
+            moved = np.nonzero(has_previous)[0].tolist()
+            self.count(
+                [track_ids[i] for i in moved],
+                [detections["clss"][i] for i in moved],
+                [detections["confs"][i] for i in moved],
+                previous_positions[has_previous],
+                centers[has_previous],
+            )
+
+        return detections
+
+    """
+        Draws regions, boxes and track lines and blurs humans.
+        tracks can hold a copy of the track points, otherwise the current track history is used.
+    """
+    def render(self, frame, detections, tracks=None):
+        with self.stage("draw"):
+            # DRAW REGIONS (VISUALIZATION)
+            frame = draw_regions(frame, self.regions) if (self.show_regions and self.hasRegions) else frame
+
+            if detections is None:
+                return frame
+
+            annotator = Annotator(frame, line_width=2, example=str(names)) if self.annotate else None
+            blur_boxes = []
+
+            for box, track_id, cls, conf in zip(detections["boxes"], detections["track_ids"], detections["clss"], detections["confs"]):
+                blur_boxes.append(box) if self.annotate and cls == 0 else None
+                annotator.box_label(box, f"{str(names[cls])} ID:{track_id} Conf:{conf:.2f}", color=colors(cls, True)) if self.annotate else None
+
+                # Visualize
+                points = tracks[track_id] if tracks is not None else self.track_store.get(track_id)
+                points = points.reshape((-1, 1, 2)).astype(np.int32)
+                cv2.polylines(frame, [points], isClosed=False, color=colors(cls, True), thickness=2)
+
+        # Blur objects
+        if self.blur_humans and blur_boxes:
+            with self.stage("blur"):
+                frame = self.blur_objects(frame, blur_boxes)
+
+        return frame
+
+    # Called from the inference thread: copy the raw frame and everything needed to render it later
+    def take_snapshot(self, frame, detections):
+        with self.stage("snapshot"):
+            tracks = {track_id: self.track_store.get(track_id).copy() for track_id in detections["track_ids"]} if detections else None
+            self.snapshot = (frame.copy(), detections, tracks)
+        self.frame_requested.clear()
+        self.snapshot_ready.set()
+
+    # Base name of the simulation files: simvid_<deviceConfigId>_<datetime>[_<run_name>]
+    def get_simulation_name(self):
+        name = f"simvid_{self.deviceConfigId}_{self.sim_datetime}"
+        return f"{name}_{self.run_name}" if self.run_name else name
+
+    def encode_frame(self, frame):
+        if self.encoder is None:
+            height, width = frame.shape[:2]
+            channels = frame.shape[2] if frame.ndim == 3 else 1
+            output_file = os.path.join(VID_PATH, f"{self.get_simulation_name()}_temp.mp4")
+            self.encoder = VideoEncoder(output_file, width, height, self.fps, channels)
+            self.encoder.start()
+        self.encoder.write(frame)
+
+    def track(self, model, frames):
+        with self.stage("model"):
+            if self.scheduler is not None:
+                # One frame, batched with the frames of the other streams
+                return [self.scheduler.track(self.deviceConfigId, frames)]
+            return model.track(frames, imgsz=self.imgsz, device=self.device, iou=self.iou, conf=self.conf, persist=True, tracker=self.tracker, classes=self.obj_clss, verbose=False)
+
+    # Everything after the model for one frame: counting, metrics and (if not headless) rendering
+    def process_frame(self, frame, result, now):
+        with self.stage("evict"):
+            self.track_store.evict(now)
+
+        """ PROCESS DETECTION """
+        with self.stage("count"):
+            detections = self.process_detections(result, now) if self.stages["count"] else None
+
+        preprocess = result.speed['preprocess']
+        inference = result.speed['inference']
+        postprocess = result.speed['postprocess']
+        self.performance_metrics(preprocess, inference, postprocess)
+
+        # Timings measured by ultralytics, in ms
+        self.observe_stage("preprocess", preprocess / 1000)
+        self.observe_stage("inference", inference / 1000)
+        self.observe_stage("postprocess", postprocess / 1000)
+        FRAMES_PROCESSED.inc(mode="simulation" if self.only_simulation else "live")
+
+        if self.stages["queue"]:
+            with self.stage("queue"):
+                self.flush_counts()
+
+        if self.headless:
+            # Nothing is drawn or copied, unless somebody asked for the frame
+            if self.frame_requested.is_set():
+                self.take_snapshot(frame, detections)
+            return
+
+        frame = self.render(frame, detections)
+
+        try:
+            with self.stage("copy"):
+                self.last_frame = frame.copy()
+        except Exception as e:
+            logger.error("Could not copy frame: " + str(e))
+            self.last_frame = None
+
+        if self.only_simulation and self.save_video and self.last_frame is not None:
+            # The copy is handed over to the encoder and is never modified afterwards
+            with self.stage("encode"):
+                self.encode_frame(self.last_frame)
+
+    # Writes the counts into the persistent queue for the MQTT client
+    def flush_counts(self):
+        if not self.counts or not self.queue_manager:
+            return
+        try:
+            self.queue_manager.save_counts(self.counts)
+        except Exception as e:
+            logger.error(f"Could not save counts to queue: {e}")
+
+    """
+        Motion gate in front of the model.
+        Returns:
+            bool: True if the frame goes to the model
+    """
+    def gate(self, model, frame):
+        if self.motion_gate is None:
+            return True
+        with self.stage("gate"):
+            passed = self.motion_gate.check(frame, time.time(), self.active_tracks)
+        if passed and self.motion_gate.reopened():
+            self.reset_tracking(model)
+        return passed
+
+    # The tracker didn't see the skipped frames, its lost tracks must not be continued by new objects
+    def reset_tracking(self, model):
+        if self.scheduler is not None:
+            self.scheduler.reset_tracker(self.deviceConfigId)
+        elif model is not None:
+            reset_trackers(model)
+        self.track_store.clear()
+
+    def run_live(self, model):
+        last_save_time = time.time()
+
+        while self.active:
+            with self.stage("capture"):
+                ret, frame = self.reader.read(timeout=10)
+            if not ret and not self.active:
+                break
+            if not ret:
+                from src.control import get_yt_live
+                isExpired = get_yt_live().get_expiration()
+                if isExpired < datetime.now():
+                    info = "Stream expired!"
+                    logger.info(info)
+                    # this needs to be handled in another way
+                    raise Exception(info)
+
+                error = "Could not read image from camera."
+                logger.error(error)
+                raise Exception(error)
+                
                 
-            self.last_track_id = track_id
+            # vid_stride issue: https://github.com/ultralytics/ultralytics/issues/5770
+            # https://github.com/ultralytics/ultralytics/issues/11723
+            # officially vid_stride is not supported in tracking mode
+            # https://docs.ultralytics.com/usage/cfg/#predict-settings
+            if self.frame_count % (self.vid_stride) == 0 and not self.gate(model, frame):
+                # Nothing moves at the lines, the frame is not passed to the model
+                if self.headless and self.frame_requested.is_set():
+                    self.take_snapshot(frame, None)
+            elif self.frame_count % (self.vid_stride) == 0:
+                processing_started = time.perf_counter()
+
+                # TRACKING
+                results = self.track(model, frame)
+
+                # FROM HERE AT THE LATEST WE KNOW THAT THE INFERENCE HAS BEEN STARTED, SO WE INFORM IN CONTROL.PY
+                if self.active and not self.inference_started_event.is_set():
+                    self.inference_started_event.set()
+
+                self.process_frame(frame, results[0], time.time())
+
+                self.active_tracks = len(results[0].boxes.id) if results[0].boxes.id is not None else 0
+                if self.stride_controller is not None:
+                    capture = self.reader.get_stats()
+                    self.vid_stride, self.imgsz = self.stride_controller.update(
+                        time.perf_counter() - processing_started,
+                        self.active_tracks,
+                        capture["frames_captured"],
+                        capture["frames_dropped"],
+                    )
+
+            # Save and reset counts, also while the motion gate or the stride skip the frames
+            if time.time() - last_save_time >= self.counts_save_intervall:
+                self.flush_counts()
+                last_save_time = time.time()
+
+                # Reset
+                self.counts = defaultdict(lambda: defaultdict(lambda: {
+                    "IN": defaultdict(lambda: {"count": 0, "total_conf": 0}), 
+                    "OUT": defaultdict(lambda: {"count": 0, "total_conf": 0})
+                }))
+                
+            self.frame_count += 1
 
+    """
+        Offline simulation: the video is decoded on the reader thread as fast as possible (lossless),
+        the model gets `batch` strided frames per forward pass and the tracker runs sequentially over the
+        batched results. The achieved throughput is logged and stored with the simulation results.
+    """
+    def run_simulation(self, model):
+        frames_per_batch = self.batch * self.vid_stride
+
+        while self.active:
+            with self.stage("capture"):
+                ret, frames = self.reader.read_batch(frames_per_batch, timeout=10)
+            if not ret:
+                break
+
+            # Video time instead of wall clock for the track TTL, the simulation is not running in real time
+            selected, timestamps = [], []
+            for frame in frames:
+                if self.frame_count % (self.vid_stride) == 0:
+                    selected.append(frame)
+                    timestamps.append(self.frame_count / self.fps if self.fps else time.time())
+                self.frame_count += 1
+
+            if not selected:
+                continue
+
+            # The cover image shows the final counts, snapshot the last frame of the final batch
+            last_batch = self.headless and not self.save_video and self.reader.exhausted(timeout=10)
+
+            # TRACKING, one forward pass for the whole batch, tracker updates in frame order
+            # The tail of the video is padded with its last frame for static exports
+            results = predict_padded(lambda frames: self.track(model, frames), selected, self.batch if self.static_batch else 0)
+
+            if self.active and not self.inference_started_event.is_set():
+                self.inference_started_event.set()
+
+            for i, (frame, result, now) in enumerate(zip(selected, results, timestamps)):
+                if last_batch and i == len(selected) - 1:
+                    self.frame_requested.set()
+                self.process_frame(frame, result, now)
+
+        elapsed_time = time.time() - self.start_time
+        info = f"Simulation Video has ended. {self.frame_count} frames in {elapsed_time:.1f}s ({self.avg_performance['avg_fps']:.1f} FPS, batch {self.batch})."
+        logger.info(info)
+        return info
+
+    # Models are cached across runs, the key contains everything that changes the loaded model
+    def get_model_key(self):
+        return ModelKey(self.model_str, self.format, self.device, self.imgsz, self.quantization, self.tracker, self.export_batch if self.static_batch else 1)
+
+    # The measured speed is stored with the export in the manifest of the export cache
+    def record_model_speed(self):
+        if self.format == 'pt' or self.frame_count < 2:
+            return
+        try:
+            EXPORT_CACHE.record_speed(self.model_str, self.avg_performance["avg_fps_model"], self.avg_performance["avg_time_inference"], self.device)
+        except Exception as e:
+            logger.warning(f"Could not record the model speed: {e}")
 
     def run(self):
         try:
-            model = YOLO(self.model_str)
+            if self.scheduler is not None:
+                self.model_info = self.scheduler.register(self.deviceConfigId, self.tracker, self.fps, self.obj_clss)
+                model = None
+            else:
+                model, self.model_info = MODELS.acquire(self.get_model_key())
+            self.reader.start()
             self.start_time = time.time()
             self.init_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            last_save_time = time.time()
             self.frame_count += 1
-            
-            while self.active:
-                ret, frame = self.stream.read()
-                if not ret and self.only_simulation:
-                    info = "Simulation Video has ended."
-                    logger.info(info)
-                    return info
-                if not ret:
-                    from src.control import yt_live
-                    isExpired = yt_live.get_expiration()
-                    if isExpired < datetime.now():
-                        info = "Stream expired!"
-                        logger.info(info)
-                        # this needs to be handled in another way
-                        raise Exception(info)
-
-                    error = "Could not read image from camera."
-                    logger.error(error)
-                    raise Exception(error)
-                    
-                    
-                # vid_stride issue: https://github.com/ultralytics/ultralytics/issues/5770
-                # https://github.com/ultralytics/ultralytics/issues/11723
-                # officially vid_stride is not supported in tracking mode
-                # https://docs.ultralytics.com/usage/cfg/#predict-settings
-                if self.frame_count % (self.vid_stride) == 0:
-                    # TRACKING
-                    results = model.track(frame, imgsz=self.imgsz, device=self.device, iou=self.iou, conf=self.conf, persist=True, tracker=self.tracker, classes=self.obj_clss, verbose=False)
-                    # DRAW REGIONS (VISUALIZATION)
-                    frame = draw_regions(frame, self.regions) if (self.show_regions and self.hasRegions) else frame
-
-                    # FROM HERE AT THE LATEST WE KNOW THAT THE INFERENCE HAS BEEN STARTED, SO WE INFORM IN CONTROL.PY
-                    if self.active and not self.inference_started_event.is_set():
-                        self.inference_started_event.set()
-
-                    current_time = datetime.now().timestamp() * 1000
-
-                    """ PROCESS DETECTION """
-                    if results[0].boxes.id is not None and len(results[0].boxes.id) > 0:
-                        boxes = results[0].boxes.xyxy.cpu()
-                        track_ids = results[0].boxes.id.int().cpu().tolist()
-                        clss = results[0].boxes.cls.cpu().tolist()      
-                        confs = results[0].boxes.conf.cpu().tolist()
-
-                        annotator = Annotator(frame, line_width=2, example=str(names)) if self.annotate else None
-                        blur_boxes = []
-
-                        for box, track_id, cls, conf in zip(boxes, track_ids, clss, confs):
-                            cls = int(cls)
-                            cls_name = names.get(cls, str(cls))
-                            
-                            blur_boxes.append(box) if self.annotate and cls == 0 else None
-                            annotator.box_label(box, f"{str(names[cls])} ID:{track_id} Conf:{conf:.2f}", color=colors(cls, True)) if self.annotate else None
-                            
-                            # Tracking-Points
-                            bbox_center = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
-
-                            # Add the current position to the track history
-                            self.track_history[track_id].append((float(bbox_center[0]), float(bbox_center[1])))
-                            
-                            # Visualize
-                            points = np.array(self.track_history[track_id]).reshape((-1, 1, 2)).astype(np.int32)
-                            cv2.polylines(frame, [points], isClosed=False, color=colors(cls, True), thickness=2)
-                            
-                            # Überprüfe Linienüberquerungen
-                            track = self.track_history[track_id]
-                            
-                            if len(track) > 1:
-                                previous_position, current_position = track[-2], track[-1]
-                                
-                                for region in self.regions:
-                                    if cls not in region["tagsInThisRegion"]:
-                                        continue
-                                        
-                                    region_name = region["name"]
-                                    
-                                    for line in region["lines"]:
-                                        self.count(track_id, cls, cls_name, region_name, line, previous_position, current_position, conf, current_time)
-                        
-                        # Blur objects
-                        if self.blur_humans and blur_boxes:
-                            frame = self.blur_objects(frame, blur_boxes)
-                                                
-                    # Save and reset counts
-                    if not self.only_simulation:
-                        if time.time() - last_save_time >= self.counts_save_intervall:
-                            self.queue_manager.save_counts(self.counts) if not self.only_simulation and self.counts else None
-                            last_save_time = time.time()
-                            
-                            # Reset
-                            self.counts = defaultdict(lambda: defaultdict(lambda: {
-                                "IN": defaultdict(lambda: {"count": 0, "total_conf": 0}), 
-                                "OUT": defaultdict(lambda: {"count": 0, "total_conf": 0})
-                            }))
-                            self.track_history = defaultdict(list)
-                            #self.crossed_lines = defaultdict(set)
-                    
-                    preprocess = results[0].speed['preprocess']
-                    inference = results[0].speed['inference']
-                    postprocess = results[0].speed['postprocess']
-                    self.performance_metrics(preprocess, inference, postprocess)
-
-                    if self.only_simulation:
-                        frame_path = os.path.join(self.temp_dir, f"frame_{self.frame_count_sim:06d}.jpg")
-                        cv2.imwrite(frame_path, frame)
-                        self.frame_count_sim += 1
-
-                    try:
-                        self.last_frame = frame.copy()
-                    except Exception as e:
-                        logger.error("Could not copy frame: " + str(e))
-                        self.last_frame = None
-                    
-                self.frame_count += 1
+
+            if self.only_simulation:
+                return self.run_simulation(model)
+
+            self.run_live(model)
 
             logger.info("Inference peacefully stopped.")
         except Exception as e:
@@ -354,8 +678,20 @@ class Inference:
             self.deactivate()
             raise Exception(error)
         finally:
-            if 'model' in locals():
+            self.reader.stop()
+
+            if not self.only_simulation:
+                # Counts since the last save would be lost otherwise
+                self.flush_counts()
+
+            if self.scheduler is not None:
+                self.scheduler.unregister(self.deviceConfigId)
+            elif 'model' in locals():
+                # Back into the cache, the next start doesn't load and warm up the model again
+                MODELS.release(model)
                 del model
+
+            self.record_model_speed()
             
             if self.device != "cpu":
                 import torch
@@ -363,45 +699,41 @@ class Inference:
 
             if self.only_simulation and self.save_sim:
                 self.save_simulation()
+            elif self.encoder is not None:
+                self.encoder.abort()
+                self.encoder = None
             
             self.deactivate()
 
     def save_simulation(self):
-        video_writer = None
         try:
-            datetime_str = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-            
-            frame_paths = sorted(glob.glob(os.path.join(self.temp_dir, "*.jpg")))
-            cover_image = cv2.imread(frame_paths[-1])
-            cover_image_filename = f"simvid_{self.deviceConfigId}_{datetime_str}.jpg"
+            datetime_str = self.sim_datetime
+            simulation_name = self.get_simulation_name()
+
+            if self.save_video:
+                if self.last_frame is None or self.encoder is None:
+                    raise Exception("No frames were processed.")
+                cover_image = self.last_frame
+            else:
+                if self.snapshot is None:
+                    raise Exception("No frames were processed.")
+                cover_image = self.render(*self.snapshot)
+
+            cover_image_filename = f"{simulation_name}.jpg"
             cover_image_path = os.path.join(VID_PATH, cover_image_filename)
             cv2.imwrite(cover_image_path, cover_image)
             
-            video_filename = f"simvid_{self.deviceConfigId}_{datetime_str}.mp4"
-            video_filename_temp = f"simvid_{self.deviceConfigId}_{datetime_str}_temp.mp4"
-            output_file = os.path.join(VID_PATH, video_filename_temp)
-            final_output_file = os.path.join(VID_PATH, video_filename)
-            
-            video_writer = cv2.VideoWriter(output_file, cv2.VideoWriter_fourcc(*'mp4v'), 
-                                          self.fps, (self.frame_width, self.frame_height))
-            
-            # Get Frames and write to video
-            for frame_path in frame_paths:
-                frame = cv2.imread(frame_path)
-                video_writer.write(frame)
-                os.remove(frame_path)
-                
-            video_writer.release()
-            
-            try:
-                convert_video(output_file, final_output_file)
-                logger.info(f"Video successfully converted")
-            except RuntimeError as e:
-                logger.error(str(e))
-                raise Exception(str(e))
-
-            if os.path.exists(output_file):
-                os.remove(output_file)
+            if self.save_video:
+                video_filename = f"{simulation_name}.mp4"
+                final_output_file = os.path.join(VID_PATH, video_filename)
+
+                try:
+                    self.encoder.close()
+                    os.replace(self.encoder.output_path, final_output_file)
+                    logger.info(f"Video successfully encoded")
+                except RuntimeError as e:
+                    logger.error(str(e))
+                    raise Exception(str(e))
 
             total_in = 0
             total_out = 0
@@ -453,24 +785,32 @@ class Inference:
                 "total_out_conf": total_out_conf / total_out if total_out and total_out_conf > 0 else 0,
             }
 
-            json_filename = f"simvid_{self.deviceConfigId}_{datetime_str}.json"
+            if self.run_name:
+                json_data["run_name"] = self.run_name
+
+            json_filename = f"{simulation_name}.json"
             json_file_path = os.path.join(VID_PATH, json_filename)
 
             with open(json_file_path, 'w') as f:
                 json.dump(json_data, f, indent=4)
 
+            self.simulation_result = json_data
+
             logger.info(f"JSON file saved successfully: {json_file_path}")
 
         except Exception as e:
             logger.error(f"Error saving video or JSON file: {str(e)}")
         finally:
-            if self.temp_dir and os.path.exists(self.temp_dir):
-                import shutil
-                shutil.rmtree(self.temp_dir)
-                self.temp_dir = None
-
-            from src.control import stop_stream
-            stop_stream()
+            if self.encoder is not None:
+                self.encoder.abort()
+                self.encoder = None
+
+            if self.standalone:
+                if self.stream is not None:
+                    self.stream.stop_camera()
+            else:
+                from src.control import stop_stream
+                stop_stream()
 
             if self.stream is not None:
                 self.stream = None
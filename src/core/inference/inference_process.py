@@ -0,0 +1,395 @@
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from src.utils.logger import Logger
+from settings import LOG_PATH
+
+logger = Logger("InferenceProcess", LOG_PATH + "/inference.log")
+
+"""
+    Counting in its own process.
+    The camera stays in the application process (snapshots and videos use it), a pump thread copies every
+    frame into a ring buffer in shared memory. The worker process reads the frames from the ring and runs the
+    Inference as usual, so the model, the tracking and the drawing don't hold the GIL of the web server.
+    Counts, performance metrics, events and requested preview frames come back over a multiprocessing queue,
+    the counts are written into the queue of the application.
+
+    InferenceProcessProxy has the interface of Inference that control.py and the supervisor use.
+    Enabled with the system setting inference_process.
+"""
+
+RING_SLOTS = 4
+METRICS_INTERVAL = 1 # seconds
+FIRST_FRAME_TIMEOUT = 10 # seconds
+STOP_TIMEOUT = 10 # seconds until the worker is terminated
+
+
+"""
+    Ring buffer of equally sized frames in shared memory, one writer and one reader.
+    Every slot has a sequence number: the writer invalidates it before copying and sets it afterwards,
+    the reader checks it after copying and retries when the slot was overwritten in the meantime.
+    Modes like the FrameReader: latest (the reader skips to the newest frame) or lossless (the writer waits).
+"""
+class SharedFrameRing:
+    def __init__(self, shape, dtype=np.uint8, slots=RING_SLOTS, mode="latest", context=None):
+        context = context or multiprocessing.get_context("spawn")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype).str
+        self.slots = slots
+        self.mode = mode
+        self.frame_size = int(np.prod(self.shape)) * np.dtype(dtype).itemsize
+
+        self.shm = shared_memory.SharedMemory(create=True, size=self.frame_size * slots)
+        self.sequences = context.Array('q', [-1] * slots, lock=False)
+        self.timestamps = context.Array('d', slots, lock=False)
+        self.written = context.Value('q', -1, lock=False)
+        self.consumed = context.Value('q', -1, lock=False)
+        self.closed = context.Value('b', False, lock=False)
+        self.cond = context.Condition()
+        self.owner = True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["owner"] = False
+        return state
+
+    def get_buffer(self):
+        return np.ndarray((self.slots, *self.shape), dtype=self.dtype, buffer=self.shm.buf)
+
+    """
+        Copies a frame into the next slot.
+        Returns:
+            bool: False if the ring was closed
+    """
+    def write(self, frame, timestamp=None):
+        with self.cond:
+            sequence = self.written.value + 1
+            while self.mode == "lossless" and sequence - self.consumed.value > self.slots and not self.closed.value:
+                self.cond.wait(0.5)
+            if self.closed.value:
+                return False
+
+        slot = sequence % self.slots
+        self.sequences[slot] = -1
+        np.copyto(self.get_buffer()[slot], frame)
+        self.timestamps[slot] = timestamp or time.time()
+        self.sequences[slot] = sequence
+
+        with self.cond:
+            self.written.value = sequence
+            self.cond.notify_all()
+        return True
+
+    """
+        Returns a copy of the next frame (latest mode: the newest one).
+        Returns:
+            tuple: (ret, frame, timestamp, dropped) ret is False after the timeout or when the ring is closed and empty
+    """
+    def read(self, timeout=None):
+        deadline = time.time() + timeout if timeout else None
+        while True:
+            with self.cond:
+                while self.written.value <= self.consumed.value:
+                    if self.closed.value:
+                        return False, None, None, 0
+                    remaining = deadline - time.time() if deadline else 0.5
+                    if remaining <= 0:
+                        return False, None, None, 0
+                    self.cond.wait(min(remaining, 0.5))
+                last = self.consumed.value
+                sequence = self.written.value if self.mode == "latest" else last + 1
+
+            slot = sequence % self.slots
+            frame = self.get_buffer()[slot].copy()
+            timestamp = self.timestamps[slot]
+            if self.sequences[slot] != sequence:
+                # Overwritten while copying, take the newer one
+                continue
+
+            with self.cond:
+                self.consumed.value = sequence
+                self.cond.notify_all()
+            return True, frame, timestamp, sequence - last - 1
+
+    def close(self):
+        with self.cond:
+            self.closed.value = True
+            self.cond.notify_all()
+
+    def release(self):
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+"""
+    CameraStream interface on top of the ring, used by the Inference in the worker process.
+"""
+class SharedFrameStream:
+    def __init__(self, ring, details, total_frames=None):
+        self.ring = ring
+        self.details = details
+        self.total_frames = total_frames
+        self.frames_dropped = 0
+
+    def isOpened(self):
+        return not self.ring.closed.value
+
+    def get_details(self):
+        return self.details
+
+    def get_total_frames(self):
+        return self.total_frames
+
+    def read(self):
+        ret, frame, _, dropped = self.ring.read(timeout=FIRST_FRAME_TIMEOUT)
+        self.frames_dropped += dropped
+        return ret, frame
+
+    def start_camera(self):
+        return True, None
+
+    def stop_camera(self):
+        pass
+
+
+# Queue manager of the worker, the counts are written by the application
+class CountsForwarder:
+    def __init__(self, results):
+        self.results = results
+
+    def save_counts(self, counts, created=None):
+        self.results.put(("counts", json.dumps(counts), created or time.time()))
+
+
+# Runs in the worker process
+def run_worker(parameters, ring, details, total_frames, results, commands):
+    from src.core.events import EVENTS
+    from src.core.inference.inference import Inference
+
+    stream = SharedFrameStream(ring, details, total_frames)
+    try:
+        inference = Inference(stream=stream, standalone=True, **parameters)
+    except Exception as e:
+        results.put(("error", str(e)))
+        return
+    inference.queue_manager = CountsForwarder(results)
+
+    def handle_commands():
+        while True:
+            command = commands.get()
+            if command[0] == "stop":
+                inference.deactivate()
+                return
+            if command[0] == "frame":
+                frame = inference.get_last_frame()
+                results.put(("frame", command[1], frame))
+            elif command[0] == "vars":
+                inference.change_vars(*command[1:])
+
+    def forward_state():
+        subscription = EVENTS.subscribe()
+        started = False
+        while inference.active or not started:
+            if not started and inference.inference_started_event.is_set():
+                results.put(("started",))
+                started = True
+            for event, data in subscription.get(METRICS_INTERVAL):
+                if event == "counts":
+                    results.put(("event", event, data))
+            if inference.init_time is not None:
+                metrics = inference.get_performance_metrics()
+                metrics["capture"]["frames_dropped_ring"] = stream.frames_dropped
+                results.put(("metrics", metrics))
+            if not started and not inference.active:
+                return
+        subscription.close()
+
+    threading.Thread(target=handle_commands, daemon=True, name="Commands").start()
+    threading.Thread(target=forward_state, daemon=True, name="State").start()
+
+    try:
+        result = inference.run()
+        results.put(("stopped", result, inference.simulation_result))
+    except Exception as e:
+        results.put(("error", str(e)))
+    finally:
+        ring.close()
+
+
+class InferenceProcessProxy:
+    """
+        Same arguments as Inference, the stream is read in this process and handed over to the worker.
+    """
+    def __init__(self, stream, model_str, only_simulation, standalone=False, deviceConfigId=None, counts_namespace=None, **kwargs):
+        self.stream = stream
+        self.model_str = model_str
+        self.only_simulation = only_simulation
+        self.standalone = standalone
+        self.parameters = {
+            "model_str": model_str,
+            "only_simulation": only_simulation,
+            "deviceConfigId": deviceConfigId,
+            "counts_namespace": counts_namespace,
+            **kwargs,
+        }
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+        self.commands = self.context.Queue()
+        self.ring = None
+        self.process = None
+        self.pump_thread = None
+
+        self.queue_manager = None
+        self.active = True
+        self.inference_started_event = threading.Event()
+        self.init_time = None
+        self.metrics = None
+        self.simulation_result = None
+        self.error = None
+
+        self.frame_lock = threading.Lock()
+        self.frame_request = 0
+        self.frame_reply = None
+        self.frame_ready = threading.Event()
+
+    def is_simulation(self):
+        return self.only_simulation
+
+    def activate(self):
+        self.inference_started_event.set()
+        self.active = True
+
+    def deactivate(self):
+        self.inference_started_event.clear()
+        if self.active:
+            self.active = False
+            self.commands.put(("stop",))
+
+    def change_vars(self, annotate, show_regions):
+        self.commands.put(("vars", annotate, show_regions))
+
+    def get_performance_metrics(self):
+        return self.metrics or {
+            "init_time": None,
+            "avg_fps": 0,
+            "avg_fps_model": 0,
+            "frames_processed": 0,
+            "capture": None,
+            "model": None,
+        }
+
+    # Asks the worker for a rendered frame
+    def get_last_frame(self, timeout=2):
+        if self.process is None or not self.process.is_alive():
+            return None
+        with self.frame_lock:
+            self.frame_request += 1
+            self.frame_ready.clear()
+            self.commands.put(("frame", self.frame_request))
+            if not self.frame_ready.wait(timeout):
+                return None
+            return self.frame_reply
+
+    # Copies the camera frames into the ring until the worker has stopped, simulations don't drop frames
+    def pump(self):
+        try:
+            while not self.ring.closed.value:
+                ret, frame = self.stream.read()
+                if not ret or not isinstance(frame, np.ndarray):
+                    break
+                if frame.shape != self.ring.shape:
+                    logger.warning(f"Frame with shape {frame.shape} doesn't fit into the ring ({self.ring.shape}), skipped.")
+                    continue
+                if not self.ring.write(frame):
+                    break
+        except Exception as e:
+            logger.error(f"Error while copying frames to the inference process: {e}")
+        finally:
+            self.ring.close()
+
+    def handle(self, message):
+        kind = message[0]
+        if kind == "started":
+            self.init_time = time.time()
+            self.inference_started_event.set()
+        elif kind == "metrics":
+            self.metrics = message[1]
+        elif kind == "counts":
+            if self.queue_manager:
+                self.queue_manager.save_counts(json.loads(message[1]), message[2])
+        elif kind == "event":
+            from src.core.events import EVENTS
+            EVENTS.publish(message[1], message[2], delta=True)
+        elif kind == "frame":
+            if message[1] == self.frame_request:
+                self.frame_reply = message[2]
+                self.frame_ready.set()
+        elif kind == "stopped":
+            self.simulation_result = message[2]
+            return True
+        elif kind == "error":
+            self.error = message[1]
+            return True
+        return False
+
+    def run(self):
+        ret, frame = self.stream.read()
+        if not ret or not isinstance(frame, np.ndarray):
+            raise Exception("Could not read image from camera.")
+
+        details = self.stream.get_details()
+        total_frames = self.stream.get_total_frames() if self.only_simulation else None
+        self.ring = SharedFrameRing(frame.shape, frame.dtype, mode="lossless" if self.only_simulation else "latest", context=self.context)
+        self.ring.write(frame)
+
+        self.process = self.context.Process(
+            target=run_worker,
+            args=(self.parameters, self.ring, details, total_frames, self.results, self.commands),
+            daemon=True,
+            name="Inference",
+        )
+        self.process.start()
+        self.pump_thread = threading.Thread(target=self.pump, daemon=True, name="FramePump")
+        self.pump_thread.start()
+        logger.info(f"Inference process {self.process.pid} started.")
+
+        try:
+            finished = False
+            while not finished:
+                try:
+                    finished = self.handle(self.results.get(timeout=0.5))
+                except queue.Empty:
+                    if not self.process.is_alive():
+                        self.error = self.error or f"Inference process exited with code {self.process.exitcode}."
+                        break
+            # Counts and events sent before the end
+            while True:
+                try:
+                    self.handle(self.results.get_nowait())
+                except queue.Empty:
+                    break
+        finally:
+            self.active = False
+            self.ring.close()
+            self.process.join(STOP_TIMEOUT)
+            if self.process.is_alive():
+                logger.warning("Inference process did not stop, terminating it.")
+                self.process.terminate()
+                self.process.join()
+            self.pump_thread.join(5)
+            self.ring.release()
+            self.inference_started_event.clear()
+
+            if self.only_simulation and not self.standalone:
+                from src.control import stop_stream
+                stop_stream()
+
+        if self.error:
+            logger.error(f"Error in inference process: {self.error}")
+            raise Exception(self.error)
+        logger.info("Inference process peacefully stopped.")
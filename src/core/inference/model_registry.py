@@ -0,0 +1,241 @@
+import gc
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from src.core.metrics import REGISTRY
+from src.utils.logger import Logger
+from src.utils.tools import load_config
+from settings import LOG_PATH, SYSTEM_SETTINGS_PATH
+
+logger = Logger("ModelRegistry", LOG_PATH + "/inference.log")
+
+MODEL_LOAD_SECONDS = REGISTRY.histogram("model_load_seconds", "Time to load a model and to warm it up.", ["phase"], buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 60))
+MODEL_REQUESTS = REGISTRY.counter("model_cache_requests", "Model requests, served from the cache (hit) or loaded (miss).", ["result"])
+MODEL_CACHE_MODELS = REGISTRY.gauge("model_cache_models", "Loaded models in the cache.")
+MODEL_CACHE_MEMORY = REGISTRY.gauge("model_cache_memory_bytes", "Estimated memory of the loaded models.")
+
+"""
+    Cache for loaded YOLO models.
+    Loading a model and the first forward pass (graph building, kernel selection, TensorRT/OpenVINO compilation)
+    take seconds. The registry keeps loaded and warmed-up models across stop/start cycles of the counting.
+
+    Models are leased: acquire() hands out a model that is not used by another inference (a second one is loaded
+    if needed), release() puts it back. Idle models are evicted least recently used first, when there are more
+    than max_models or their estimated memory exceeds max_memory_mb.
+    The trackers of a reused model are reset, a new counting never continues the track IDs of the last one.
+"""
+
+DEFAULT_MAX_MODELS = 2
+WARMUP_RUNS = 2
+
+
+# The tracker is part of the key, ultralytics keeps the tracker type of the first track() call
+# batch: images per forward pass a static export takes, 1 for pt models and dynamic exports
+ModelKey = namedtuple("ModelKey", ["weights", "format", "device", "imgsz", "quantization", "tracker", "batch"], defaults=(1,))
+
+
+def format_key(key):
+    return f"{key.weights} ({key.format}, {key.device}, imgsz={key.imgsz}, {key.quantization}, {key.tracker}, batch={key.batch})"
+
+
+"""
+    Runs predict (e.g. model.track) on a batch that may be shorter than the batch of a static export, like the
+    last batch of a video. The frames are padded with the last one, the results of the padding are dropped.
+    Args:
+        predict (callable): Takes the list of frames, returns one result per frame
+        batch (int): Batch of the static export, 0 for models that take any batch
+"""
+def predict_padded(predict, frames, batch=0):
+    padding = batch - len(frames)
+    if padding <= 0:
+        return predict(frames)
+    return predict(frames + [frames[-1]] * padding)[:len(frames)]
+
+
+class ModelEntry:
+    def __init__(self, key, model, load_time, warmup_time, memory):
+        self.key = key
+        self.model = model
+        self.load_time = load_time
+        self.warmup_time = warmup_time
+        self.memory = memory
+        self.in_use = False
+        self.uses = 0
+        self.last_used = time.time()
+
+    def get_info(self, cached):
+        return {
+            "model_cached": cached,
+            "model_load_time": self.load_time,
+            "model_warmup_time": self.warmup_time,
+            "model_memory_mb": round(self.memory / 1024 / 1024, 1) if self.memory else None,
+        }
+
+
+def get_process_memory():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except Exception:
+        return 0
+
+
+def get_gpu_memory(device):
+    if not str(device).startswith("cuda"):
+        return 0
+    try:
+        import torch
+        return torch.cuda.memory_allocated()
+    except Exception:
+        return 0
+
+
+def reset_trackers(model):
+    predictor = getattr(model, "predictor", None)
+    for tracker in getattr(predictor, "trackers", None) or []:
+        tracker.reset()
+    if predictor is not None and hasattr(predictor, "vid_path"):
+        predictor.vid_path = [None] * len(predictor.vid_path)
+
+
+class ModelRegistry:
+    def __init__(self, max_models=None, max_memory_mb=None):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # id(entry) -> entry, least recently used first
+        self.max_models = max_models
+        self.max_memory_mb = max_memory_mb
+
+        MODEL_CACHE_MODELS.set_function(lambda: len(self.entries))
+        MODEL_CACHE_MEMORY.set_function(lambda: sum(entry.memory for entry in list(self.entries.values())))
+
+    # The limits can be changed in the system settings without a restart
+    def get_limits(self):
+        try:
+            SYSTEM_SETTINGS = load_config(SYSTEM_SETTINGS_PATH)
+        except Exception:
+            SYSTEM_SETTINGS = {}
+        max_models = self.max_models if self.max_models is not None else SYSTEM_SETTINGS.get('model_cache_size', DEFAULT_MAX_MODELS)
+        max_memory_mb = self.max_memory_mb if self.max_memory_mb is not None else SYSTEM_SETTINGS.get('model_cache_memory_mb', 0)
+        return max_models, max_memory_mb
+
+    def load(self, key):
+        from ultralytics import YOLO
+        import numpy as np
+
+        memory_before = get_process_memory() + get_gpu_memory(key.device)
+
+        started = time.perf_counter()
+        model = YOLO(key.weights)
+        load_time = time.perf_counter() - started
+
+        # The first passes build the predictor and compile the graph, the tracker is created with the first track() call
+        started = time.perf_counter()
+        dummy = np.zeros((key.imgsz, key.imgsz, 3), dtype=np.uint8)
+        # A static export with batch > 1 rejects a single image
+        images = [dummy] * key.batch if key.batch > 1 else dummy
+        for _ in range(WARMUP_RUNS):
+            model.predict(images, imgsz=key.imgsz, device=key.device, verbose=False)
+        warmup_time = time.perf_counter() - started
+
+        memory = max(0, get_process_memory() + get_gpu_memory(key.device) - memory_before)
+
+        MODEL_LOAD_SECONDS.observe(load_time, phase="load")
+        MODEL_LOAD_SECONDS.observe(warmup_time, phase="warmup")
+        logger.info(f"Loaded {format_key(key)} in {load_time:.2f} s, warm-up {warmup_time:.2f} s, ~{memory / 1024 / 1024:.0f} MB.")
+        return ModelEntry(key, model, load_time, warmup_time, memory)
+
+    """
+        Returns a loaded and warmed-up model for the key, that is not used by anybody else.
+        Returns:
+            tuple: (model, info) info has model_cached, model_load_time, model_warmup_time and model_memory_mb
+    """
+    def acquire(self, key):
+        with self.lock:
+            entry = next((entry for entry in self.entries.values() if entry.key == key and not entry.in_use), None)
+            if entry is not None:
+                entry.in_use = True
+                self.entries.move_to_end(id(entry))
+
+        if entry is not None:
+            MODEL_REQUESTS.inc(result="hit")
+            reset_trackers(entry.model)
+            entry.uses += 1
+            logger.info(f"Reusing cached model {format_key(key)}.")
+            return entry.model, entry.get_info(cached=True)
+
+        MODEL_REQUESTS.inc(result="miss")
+        entry = self.load(key)
+        entry.in_use = True
+        entry.uses += 1
+        with self.lock:
+            self.entries[id(entry)] = entry
+            self.evict()
+        return entry.model, entry.get_info(cached=False)
+
+    def release(self, model):
+        with self.lock:
+            entry = next((entry for entry in self.entries.values() if entry.model is model), None)
+            if entry is None:
+                return
+            entry.in_use = False
+            entry.last_used = time.time()
+            self.entries.move_to_end(id(entry))
+            evicted = self.evict()
+        if evicted:
+            self.free_memory()
+
+    # Removes idle models, least recently used first, until the limits are met. The lock has to be held
+    def evict(self):
+        max_models, max_memory_mb = self.get_limits()
+        evicted = 0
+        for entry_id, entry in list(self.entries.items()):
+            memory = sum(cached.memory for cached in self.entries.values())
+            over_count = max_models is not None and len(self.entries) > max_models
+            over_memory = bool(max_memory_mb) and memory > max_memory_mb * 1024 * 1024
+            if not over_count and not over_memory:
+                break
+            if entry.in_use:
+                continue
+            del self.entries[entry_id]
+            evicted += 1
+            logger.info(f"Evicted model {format_key(entry.key)} from the cache.")
+        return evicted
+
+    # Unloads all idle models, e.g. before a benchmark needs the memory
+    def clear(self):
+        with self.lock:
+            idle = [entry_id for entry_id, entry in self.entries.items() if not entry.in_use]
+            for entry_id in idle:
+                del self.entries[entry_id]
+        if idle:
+            self.free_memory()
+            logger.info(f"Cleared {len(idle)} cached models.")
+        return len(idle)
+
+    def free_memory(self):
+        gc.collect()
+        try:
+            # Only if torch is loaded already, an empty cache doesn't need it
+            if "torch" in sys.modules:
+                sys.modules["torch"].cuda.empty_cache()
+        except Exception:
+            pass
+
+    def get_status(self):
+        with self.lock:
+            return [
+                {
+                    "model": format_key(entry.key),
+                    "in_use": entry.in_use,
+                    "uses": entry.uses,
+                    "load_time": entry.load_time,
+                    "warmup_time": entry.warmup_time,
+                    "memory_mb": round(entry.memory / 1024 / 1024, 1),
+                    "last_used": entry.last_used,
+                }
+                for entry in self.entries.values()
+            ]
+
+
+MODELS = ModelRegistry()
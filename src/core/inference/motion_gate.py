@@ -0,0 +1,158 @@
+import cv2
+import numpy as np
+from src.core.metrics import REGISTRY
+from src.utils.logger import Logger
+from settings import LOG_PATH
+
+logger = Logger("MotionGate", LOG_PATH + "/inference.log")
+
+GATE_FRAMES = REGISTRY.counter("motion_gate_frames", "Frames checked by the motion gate, passed to the model or skipped.", ["stream", "result"])
+GATE_SKIP_RATIO = REGISTRY.gauge("motion_gate_skip_ratio", "Share of the checked frames the motion gate skipped.", ["stream"])
+
+"""
+    Skips the model on static frames.
+    Only the area around the counting lines is watched: the bounding box of all lines of the ROIs, with a margin
+    so objects are detected before they reach a line. The area is downscaled to a small gray image and compared
+    with a running average of the last frames, a frame passes when enough pixels changed.
+
+    The tracker must not miss anything: frames are only skipped when the last result had no tracks and nothing
+    moved for hold_seconds. When the gate opens again after skipped frames, the tracks are started fresh
+    (see Inference.reset_tracking), an old track ID never continues on a new object.
+"""
+
+DEFAULT_THRESHOLD = 0.002 # share of changed pixels
+DEFAULT_HOLD_SECONDS = 2
+PIXEL_THRESHOLD = 25 # gray value difference of a changed pixel
+MARGIN = 0.1 # of the frame size around the lines
+WIDTH = 160 # width of the compared image
+BACKGROUND_ALPHA = 0.05
+
+
+# Bounding box of all lines, with margin, in pixels. The whole frame if there are no lines
+def get_lines_box(regions, frame_width, frame_height, margin=MARGIN):
+    points = [coord for region in regions or [] for line in region["lines"] for coord in (line["start_coord"], line["end_coord"])]
+    if not points:
+        return 0, 0, frame_width, frame_height
+    points = np.asarray(points, dtype=np.float64)
+    x1, y1 = points.min(axis=0) - (margin * frame_width, margin * frame_height)
+    x2, y2 = points.max(axis=0) + (margin * frame_width, margin * frame_height)
+    # At least one pixel, also for lines on the right or bottom edge
+    x1 = int(min(max(0, x1), frame_width - 1))
+    y1 = int(min(max(0, y1), frame_height - 1))
+    return (
+        x1,
+        y1,
+        int(min(frame_width, max(x2, x1 + 1))),
+        int(min(frame_height, max(y2, y1 + 1))),
+    )
+
+
+class MotionGate:
+    """
+        Args:
+            stream (str): Label of the metrics, usually the deviceConfigId
+            regions (list): Regions from build_regions
+            frame_width (int), frame_height (int): Size of the camera frames
+            threshold (float): Share of changed pixels in the watched area that counts as motion
+            hold_seconds (float): Frames keep passing this long after the last motion
+    """
+    def __init__(self, stream, regions, frame_width, frame_height, threshold=DEFAULT_THRESHOLD, hold_seconds=DEFAULT_HOLD_SECONDS):
+        self.stream = stream
+        self.box = get_lines_box(regions, frame_width, frame_height)
+        self.threshold = threshold
+        self.hold_seconds = hold_seconds
+
+        x1, y1, x2, y2 = self.box
+        scale = min(1.0, WIDTH / max(1, x2 - x1))
+        self.size = (max(1, int((x2 - x1) * scale)), max(1, int((y2 - y1) * scale)))
+
+        self.background = None
+        self.last_motion = None
+        self.skipping = False
+
+        # Stats
+        self.frames = 0
+        self.skipped = 0
+        self.last_changed = 0
+
+    def prepare(self, frame):
+        x1, y1, x2, y2 = self.box
+        area = frame[y1:y2, x1:x2]
+        small = cv2.resize(area, self.size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    """
+        Decides if a frame goes to the model.
+        Args:
+            frame (np.ndarray): Camera frame
+            now (float): time.time()
+            active_tracks (int): Tracks in the last result
+        Returns:
+            bool: True if the model has to run
+    """
+    def check(self, frame, now, active_tracks):
+        gray = self.prepare(frame)
+        self.frames += 1
+
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            self.last_motion = now
+            return self.passed()
+
+        difference = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        self.last_changed = np.count_nonzero(difference > PIXEL_THRESHOLD) / difference.size
+        cv2.accumulateWeighted(gray, self.background, BACKGROUND_ALPHA)
+
+        if self.last_changed >= self.threshold:
+            self.last_motion = now
+
+        if active_tracks or now - self.last_motion < self.hold_seconds:
+            return self.passed()
+
+        if not self.skipping:
+            logger.info(f"No motion at the lines since {self.hold_seconds} s, skipping the model.")
+        self.skipping = True
+        self.skipped += 1
+        GATE_FRAMES.inc(stream=self.stream, result="skipped")
+        GATE_SKIP_RATIO.set(self.get_skip_ratio(), stream=self.stream)
+        return False
+
+    def passed(self):
+        GATE_FRAMES.inc(stream=self.stream, result="passed")
+        GATE_SKIP_RATIO.set(self.get_skip_ratio(), stream=self.stream)
+        return True
+
+    # True once after skipped frames, the tracking has to start fresh
+    def reopened(self):
+        if not self.skipping:
+            return False
+        self.skipping = False
+        return True
+
+    def get_skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0
+
+    def get_status(self):
+        return {
+            "box": self.box,
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "skip_ratio": round(self.get_skip_ratio(), 4),
+            "changed": round(float(self.last_changed), 4),
+            "skipping": self.skipping,
+        }
+
+
+# Gate for a live counting, None if the system setting motion_gate is off
+def create_motion_gate(SYSTEM_SETTINGS, stream, regions, frame_width, frame_height):
+    if not SYSTEM_SETTINGS.get('motion_gate', False):
+        return None
+    return MotionGate(
+        stream,
+        regions,
+        frame_width,
+        frame_height,
+        threshold=SYSTEM_SETTINGS.get('motion_gate_threshold', DEFAULT_THRESHOLD),
+        hold_seconds=SYSTEM_SETTINGS.get('motion_gate_hold', DEFAULT_HOLD_SECONDS),
+    )
@@ -0,0 +1,275 @@
+import glob
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from src.core.inference.benchmark_store import BENCHMARKS
+from src.core.inference.export_cache import get_size
+from src.utils.logger import Logger
+from src.utils.tools import load_config
+from settings import (
+    LOG_PATH,
+    VID_PATH,
+    CONFIG_PATH,
+    DATASET_PATH,
+)
+
+logger = Logger("PipelineBenchmark", LOG_PATH + "/benchmark.log")
+
+"""
+    Benchmark of the whole counting pipeline instead of the model alone.
+    Replays the recorded test video (capture.mp4) or the images of datasets/coco8 through the Inference loop
+    (capture, tracking, line counting, drawing, blur, queue) and switches the stages on one after another.
+    Every variant is one row of the benchmark file, with the throughput and the latency percentiles per stage.
+    The file has the format of the model benchmark (benchmark_<deviceConfigId>_<date>_<time>.json), the
+    benchmarks page shows both.
+"""
+
+# Stages switched on per variant, the tracking runs in every variant
+VARIANTS = [
+    ("track", {"count": False, "draw": False, "blur": False, "queue": False}),
+    ("+count", {"count": True, "draw": False, "blur": False, "queue": False}),
+    ("+draw", {"count": True, "draw": True, "blur": False, "queue": False}),
+    ("+blur", {"count": True, "draw": True, "blur": True, "queue": False}),
+    ("+queue", {"count": True, "draw": True, "blur": True, "queue": True}),
+]
+
+SOURCES = ("video", "coco8")
+DEFAULT_FRAMES = 300
+PERCENTILES = (50, 95, 99)
+
+
+"""
+    Stream with the interface of CameraStream, that replays frames from a generator.
+    The frames are decoded while reading, like in a simulation.
+"""
+class ReplayStream:
+    def __init__(self, frames, resolution, fps, total_frames, source):
+        self.frames = frames
+        self.resolution = resolution
+        self.fps = fps
+        self.total_frames = total_frames
+        self.source = source
+
+    def isOpened(self):
+        return self.frames is not None
+
+    def get_details(self):
+        return {"resolution": self.resolution, "fps": self.fps, "source": self.source}
+
+    def get_total_frames(self):
+        return self.total_frames
+
+    def read(self):
+        frame = next(self.frames, None) if self.frames is not None else None
+        return (frame is not None), frame
+
+    def start_camera(self):
+        return True, None
+
+    def stop_camera(self):
+        self.frames = None
+
+
+def read_video(path, max_frames):
+    import cv2
+    capture = cv2.VideoCapture(path)
+    try:
+        count = 0
+        while count < max_frames:
+            ret, frame = capture.read()
+            if not ret:
+                return
+            count += 1
+            yield frame
+    finally:
+        capture.release()
+
+
+# The images are repeated until max_frames, all frames get the same size like the frames of a camera
+def read_images(paths, resolution, max_frames):
+    import cv2
+    for index in range(max_frames):
+        frame = cv2.imread(paths[index % len(paths)])
+        yield cv2.resize(frame, resolution)
+
+
+def percentiles(samples):
+    import numpy as np
+    values = np.asarray(samples) * 1000
+    result = {f"p{p}": round(float(np.percentile(values, p)), 3) for p in PERCENTILES}
+    result["mean"] = round(float(values.mean()), 3)
+    result["count"] = len(samples)
+    return result
+
+
+class PipelineBenchmark:
+    """
+        Args:
+            deviceConfigId (str): Device config to benchmark, the ROIs and tags of config.json are used
+            source (str): "video" (capture.mp4) or "coco8" (datasets/coco8 images)
+            frames (int): Frames per variant
+            variants (list): Names of the variants to run, default all
+    """
+    def __init__(self, deviceConfigId, source="video", frames=DEFAULT_FRAMES, variants=None):
+        if source not in SOURCES:
+            raise ValueError(f"Unknown source {source}, use one of {SOURCES}.")
+        self.deviceConfigId = deviceConfigId
+        self.source = source
+        self.frames = int(frames)
+        self.variants = [variant for variant in VARIANTS if variants is None or variant[0] in variants]
+        self.benchmark_active = multiprocessing.Event()
+        self.active = True
+
+    def deactivate(self):
+        self.benchmark_active.set()
+        self.active = False
+
+    def get_config(self):
+        data = load_config(CONFIG_PATH)
+        return next(config for config in data["deviceConfigs"] if config["id"] == self.deviceConfigId)
+
+    # The exported model of the device config, exported in this process if it doesn't exist yet
+    def resolve_model(self, config):
+        if config["modelFormat"] == "pt":
+            return config["model"]
+
+        from src.core.action_helpers import get_export_args
+        from src.utils.export_helper import check_if_model_exists
+        export_args = get_export_args(config)
+        exists, model_path = check_if_model_exists(config["model"], config["modelFormat"], export_args)
+        if exists:
+            return model_path
+
+        from src.core.inference.exporter import export
+        return export(weights=config["model"], format=config["modelFormat"], **export_args)
+
+    def create_stream(self, config):
+        width, height = map(int, config["stream_resolution"].split('x'))
+
+        if self.source == "video":
+            path = os.path.join(VID_PATH, "capture.mp4")
+            if not os.path.exists(path):
+                raise FileNotFoundError("No test video available (capture.mp4), record a video first.")
+            frames = read_video(path, self.frames)
+            return ReplayStream(frames, (width, height), config["stream_fps"], self.frames, path)
+
+        paths = sorted(glob.glob(os.path.join(DATASET_PATH, "coco8", "images", "*", "*.jpg")))
+        if not paths:
+            raise FileNotFoundError(f"No images found in {os.path.join(DATASET_PATH, 'coco8')}.")
+        frames = read_images(paths, (width, height), self.frames)
+        return ReplayStream(frames, (width, height), config["stream_fps"], self.frames, "coco8")
+
+    """
+        Runs the Inference loop once with the stages of the variant.
+        Returns:
+            dict: fps, frames, elapsed_time and the latency percentiles per stage (ms)
+    """
+    def run_variant(self, config, model_path, name, stages, queue_path):
+        from src.core.inference.inference import Inference
+        from src.core.inference.queuemanager import QueueManager
+
+        stream = self.create_stream(config)
+        inference = Inference(
+            stream=stream,
+            model_str=model_path,
+            only_simulation=True,
+            run_name=f"benchmark_{name}",
+            save_video=False,
+            standalone=True,
+            stages=stages,
+        )
+        inference.stage_samples = defaultdict(list)
+        inference.save_sim = False
+        if stages["queue"]:
+            inference.queue_manager = QueueManager(path=queue_path, max_entries=1000)
+
+        # Stop from the main process
+        done = threading.Event()
+        def watch_stop():
+            while not done.is_set():
+                if self.benchmark_active.wait(0.5):
+                    inference.deactivate()
+                    return
+        threading.Thread(target=watch_stop, daemon=True).start()
+
+        try:
+            inference.run()
+            elapsed_time = time.time() - inference.start_time
+        finally:
+            done.set()
+            stream.stop_camera()
+            if inference.queue_manager is not None:
+                inference.queue_manager.close()
+
+        # frame_count starts at 1
+        frames = inference.frame_count - 1
+        return {
+            "fps": frames / elapsed_time if elapsed_time > 0 else 0,
+            "frames": frames,
+            "elapsed_time": elapsed_time,
+            "stages": {stage: percentiles(samples) for stage, samples in inference.stage_samples.items() if samples},
+        }
+
+    def run(self):
+        config = self.get_config()
+        model_path = self.resolve_model(config)
+        size = get_size(model_path) if os.path.exists(model_path) else 0
+
+        data = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            queue_path = os.path.join(tmp_dir, "benchmark_queue.db")
+            for index, (name, stages) in enumerate(self.variants):
+                if not self.active or self.benchmark_active.is_set():
+                    break
+                logger.info(f"Pipeline benchmark variant {name} ({self.frames} frames from {self.source}).")
+
+                row = {
+                    "Format": f"{config['modelFormat']} {name}",
+                    "Status❔": "❌",
+                    "Size (MB)": str(round(size / 1024 / 1024, 1)),
+                    "metrics/mAP50-95(B)": "-",
+                    "Inference time (ms/im)": "-",
+                    "FPS": "-",
+                    "Stages": ", ".join(stage for stage, enabled in stages.items() if enabled) or "track",
+                }
+                try:
+                    result = self.run_variant(config, model_path, name, stages, queue_path)
+                    inference_time = result["stages"].get("inference", {}).get("p50")
+                    row.update({
+                        "Status❔": "✅" if result["frames"] > 0 else "❎",
+                        "Inference time (ms/im)": str(inference_time) if inference_time is not None else "-",
+                        "FPS": str(round(result["fps"], 2)),
+                        "Frames": str(result["frames"]),
+                        "stages": result["stages"],
+                    })
+                except Exception as e:
+                    logger.error(f"Error in pipeline benchmark variant {name}: {e}")
+                    row["Error"] = str(e)
+                data[index] = row
+
+        header = f"Pipeline benchmark for {config['model']} ({config['modelFormat']}) with imgsz={config['imgsz']}, quantization={config['quantization']}, device={config['deviceType']}, source={self.source}"
+        content = {
+            "deviceConfigId": self.deviceConfigId,
+            "type": "pipeline",
+            "header": header,
+            "data": data,
+            "date": datetime.now().strftime("%d.%m.%Y - %H:%M:%S"),
+        }
+
+        file_path = BENCHMARKS.save(content, {
+            "type": "pipeline",
+            "model": config["model"],
+            "format": config["modelFormat"],
+            "imgsz": int(config["imgsz"]),
+            "quantization": config["quantization"],
+            "device": config["deviceType"],
+            "source": self.source,
+        })
+
+        logger.info(f"Pipeline benchmark written to {file_path}")
+        self.deactivate()
+        return content
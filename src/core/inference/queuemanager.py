@@ -1,29 +1,156 @@
+import json
 import os
 import queue
+import sqlite3
 import threading
 import time
 from datetime import date
+from src.core.metrics import REGISTRY
+from src.core.events import EVENTS
+from src.utils.logger import Logger
+from src.utils.tools import load_config, convert_to_seconds
+from settings import (
+    LOG_PATH,
+    COUNTS_QUEUE_PATH,
+    SYSTEM_SETTINGS_PATH,
+)
+
+logger = Logger("QueueManager", LOG_PATH + "/queue.log")
 
 lock = threading.RLock()
 
-# Buffer for unpublished messages
+QUEUE_SIZE = REGISTRY.gauge("counts_queue_size", "Unpublished count snapshots in the queue.")
+QUEUE_ENQUEUED = REGISTRY.counter("counts_queue_enqueued", "Count snapshots written to the queue.")
+QUEUE_ACKED = REGISTRY.counter("counts_queue_acked", "Count snapshots removed from the queue after publishing.")
+QUEUE_DROPPED = REGISTRY.counter("counts_queue_dropped", "Count snapshots dropped because of the queue limit or retention.")
+
+"""
+    Buffer for unpublished messages.
+    The counts are stored in a SQLite database in WAL mode, so they survive a restart or a crash while the
+    MQTT broker is not reachable. The queue is bounded by the number of entries and by a retention time,
+    the oldest entries are dropped first.
+
+    Consumers read a batch with peek_counts() and remove it with ack_counts() only after it was published,
+    so nothing is lost if publishing fails in between.
+"""
+
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_RETENTION = 7 * 24 * 3600 # seconds
+
 
 class QueueManager:
-    def __init__(self):
+    def __init__(self, path=COUNTS_QUEUE_PATH, max_entries=None, retention=None):
         self.lock = threading.Lock()
-        self.counts_history_queue = queue.Queue()
         self.entities_queue = queue.Queue()
         self.session_day = date.today()
+        self.path = path
 
+        if max_entries is None or retention is None:
+            try:
+                SYSTEM_SETTINGS = load_config(SYSTEM_SETTINGS_PATH)
+            except Exception:
+                SYSTEM_SETTINGS = {}
+            if max_entries is None:
+                max_entries = SYSTEM_SETTINGS.get('queue_max_entries', DEFAULT_MAX_ENTRIES)
+            if retention is None and 'queue_retention' in SYSTEM_SETTINGS:
+                retention = convert_to_seconds(SYSTEM_SETTINGS['queue_retention'], SYSTEM_SETTINGS.get('queue_retention_format', 'h'))
 
-    def get_counts_history(self):
-        counts_history = []
+        self.max_entries = max_entries
+        self.retention = retention if retention is not None else DEFAULT_RETENTION
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=FULL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS counts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+
+        QUEUE_SIZE.set_function(self.get_counts_queue_size)
+
+        size = self.get_counts_queue_size()
+        if size:
+            logger.info(f"Restored {size} unpublished counts from {self.path}")
+
+    def close(self):
         with self.lock:
-            while not self.counts_history_queue.empty():
-                counts = self.counts_history_queue.get()
-                counts_history.append(counts)
-        return counts_history
-    
+            self.db.close()
+
+    # Applies retention time and max size, the lock has to be held
+    def _enforce_limits(self):
+        dropped = 0
+        if self.retention:
+            dropped += self.db.execute("DELETE FROM counts WHERE created < ?", (time.time() - self.retention,)).rowcount
+        if self.max_entries:
+            dropped += self.db.execute(
+                "DELETE FROM counts WHERE id <= (SELECT id FROM counts ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.max_entries,)
+            ).rowcount
+        if dropped:
+            QUEUE_DROPPED.inc(dropped)
+            logger.warning(f"Dropped {dropped} unpublished counts (queue limit or retention reached).")
+        return dropped
+
+    def save_counts(self, counts, created=None):
+        payload = json.dumps(counts)
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                self.db.execute("INSERT INTO counts (created, payload) VALUES (?, ?)", (created or time.time(), payload))
+                self._enforce_limits()
+                self.db.execute("COMMIT")
+                QUEUE_ENQUEUED.inc()
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        self.publish_size()
+
+    """
+        Returns the oldest entries without removing them.
+        Returns:
+            list: (id, created, counts) tuples, oldest first
+    """
+    def peek_counts(self, limit=100):
+        with self.lock:
+            self._enforce_limits()
+            rows = self.db.execute("SELECT id, created, payload FROM counts ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, created, json.loads(payload)) for row_id, created, payload in rows]
+
+    # Removes published entries
+    def ack_counts(self, ids):
+        if not ids:
+            return 0
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                removed = 0
+                ids = list(ids)
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    removed += self.db.execute(f"DELETE FROM counts WHERE id IN ({placeholders})", chunk).rowcount
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        QUEUE_ACKED.inc(removed)
+        self.publish_size()
+        return removed
+
+    # Queue depth for the UI (/api/events)
+    def publish_size(self):
+        EVENTS.publish("queue", {"size": self.get_counts_queue_size()})
+
+    # Takes everything out of the queue (the entries are removed immediately)
+    def get_counts_history(self):
+        entries = self.peek_counts(limit=-1)
+        self.ack_counts([row_id for row_id, _, _ in entries])
+        return [counts for _, _, counts in entries]
+
     def get_entities(self):
         entities = []
         with self.lock:
@@ -32,20 +159,14 @@ class QueueManager:
                 entities.append(entity)
         return entities
 
-    def save_counts(self, counts):
-        with self.lock:
-            self.counts_history_queue.put(counts)
-            print(f"Counts in queue: {self.counts_history_queue.qsize()}")
-
     def get_counts_queue_size(self):
-        with self.lock: 
-            return self.counts_history_queue.qsize()
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM counts").fetchone()[0]
 
 
     def is_queue_empty(self):
-        return self.counts_history_queue.empty()
-    
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM counts LIMIT 1").fetchone() is None
+
     def is_entities_queue_empty(self):
         return self.entities_queue.empty()
-        
-
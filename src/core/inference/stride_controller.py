@@ -0,0 +1,204 @@
+import time
+from collections import deque
+from src.core.metrics import REGISTRY
+from src.utils.logger import Logger
+from settings import LOG_PATH
+
+logger = Logger("StrideController", LOG_PATH + "/inference.log")
+
+STRIDE = REGISTRY.gauge("stride_controller_stride", "Effective frame stride chosen by the stride controller.", ["stream"])
+IMGSZ = REGISTRY.gauge("stride_controller_imgsz", "Image size chosen by the stride controller.", ["stream"])
+UTILIZATION = REGISTRY.gauge("stride_controller_utilization", "Measured share of the wall-clock time the pipeline is busy with the processed frames.", ["stream"])
+DECISIONS = REGISTRY.counter("stride_controller_decisions", "Changes made by the stride controller.", ["stream", "action"])
+
+"""
+    Closed-loop control of vid_stride (and optionally imgsz) for the live counting.
+    The live FrameReader hands over the newest frame and drops the older ones when the pipeline is slower than
+    the camera, so the camera fps say nothing about the processed frames. The controller works on measured values
+    only: the processing time per frame (model, tracking, counting), the wall-clock rate of the processed frames
+    and the share of the camera frames the reader dropped.
+
+    - Dropped frames: the pipeline doesn't keep up, a higher stride would only throw away fresh frames on top of
+      the dropped ones. The stride is lowered, the image size is the lever for the latency.
+    - Throughput: with target_fps the stride is raised while the pipeline keeps up and processes more than
+      target_fps, and lowered when it processes less. Without target_fps the stride stays at the configured value
+      while objects are in the scene.
+    - Activity: while objects are tracked the stride is capped at max_stride_active, skipped frames make tracks
+      jump over the lines. Without tracks for idle_seconds the stride may go up to max_stride.
+    - Latency: when the processing time of a single frame exceeds latency_ms, the image size is reduced in steps
+      of 32 (only models with a dynamic input size), and raised again with enough headroom.
+
+    Every change is counted in stride_controller_decisions and kept in the status of the counting.
+"""
+
+DEFAULT_MAX_DROP_RATIO = 0.05 # share of the camera frames the reader may drop while the pipeline counts as keeping up
+DEFAULT_MAX_STRIDE = 8
+DEFAULT_MAX_STRIDE_ACTIVE = 2
+IDLE_SECONDS = 10
+HOLD_SECONDS = 2 # minimum time between two changes
+MAX_INTERVAL = 5 # seconds, longer gaps between processed frames (e.g. motion gate) are not measured
+EMA_ALPHA = 0.1
+IMGSZ_STEP = 32
+MIN_IMGSZ = 160
+HISTORY_LENGTH = 20
+
+
+class StrideController:
+    """
+        Args:
+            stream (str): Label of the metrics, usually the deviceConfigId
+            camera_fps (float): Frame rate of the camera, for the status only
+            stride (int): Configured vid_stride, the lower limit
+            imgsz (int): Configured image size, the upper limit
+            target_fps (float): Processed frames per second to hold, 0 for the configured stride while objects are tracked
+            latency_ms (float): Processing time budget per frame, 0 to keep the image size
+            adapt_imgsz (bool): The model accepts other image sizes (pt or dynamic export)
+    """
+    def __init__(self, stream, camera_fps, stride=1, imgsz=640, target_fps=0, latency_ms=0, adapt_imgsz=False,
+                 max_stride=DEFAULT_MAX_STRIDE, max_stride_active=DEFAULT_MAX_STRIDE_ACTIVE, max_drop_ratio=DEFAULT_MAX_DROP_RATIO):
+        self.stream = stream
+        self.camera_fps = float(camera_fps) if camera_fps else None
+        self.min_stride = max(1, int(stride))
+        self.max_stride = max(self.min_stride, int(max_stride))
+        self.max_stride_active = max(self.min_stride, int(max_stride_active))
+        self.max_imgsz = int(imgsz)
+        self.target_fps = float(target_fps or 0)
+        self.latency = float(latency_ms or 0) / 1000
+        self.adapt_imgsz = adapt_imgsz and self.latency > 0
+        self.max_drop_ratio = max_drop_ratio
+
+        self.stride = self.min_stride
+        self.imgsz = self.max_imgsz
+        self.busy = None # EMA of the processing time per frame
+        self.interval = None # EMA of the wall-clock time between two processed frames
+        self.drop_ratio = None # EMA of the share of the camera frames the reader dropped
+        self.last_update = None
+        self.last_captured = None
+        self.last_dropped = None
+        self.last_change = 0
+        self.last_activity = 0
+        self.history = deque(maxlen=HISTORY_LENGTH)
+
+        STRIDE.set(self.stride, stream=stream)
+        IMGSZ.set(self.imgsz, stream=stream)
+
+    def get_processed_fps(self):
+        return 1 / self.interval if self.interval else 0
+
+    def get_utilization(self):
+        return min(1.0, self.busy / self.interval) if self.busy and self.interval else 0
+
+    def decide(self, action, reason, now):
+        self.last_change = now
+        # The next decision is based on what was measured with the new values
+        self.interval = None
+        self.drop_ratio = None
+        DECISIONS.inc(stream=self.stream, action=action)
+        self.history.append({"time": now, "action": action, "stride": self.stride, "imgsz": self.imgsz, "reason": reason})
+        logger.info(f"{self.stream}: {action} to stride {self.stride}, imgsz {self.imgsz} ({reason}).")
+
+    def is_idle(self, now):
+        return now - self.last_activity >= IDLE_SECONDS
+
+    # Highest stride the activity allows
+    def get_stride_limit(self, now):
+        return self.max_stride if self.is_idle(now) else self.max_stride_active
+
+    def measure(self, busy, frames_captured, frames_dropped, now):
+        self.busy = busy if self.busy is None else self.busy + EMA_ALPHA * (busy - self.busy)
+
+        if self.last_update is not None and 0 < now - self.last_update <= MAX_INTERVAL:
+            interval = now - self.last_update
+            self.interval = interval if self.interval is None else self.interval + EMA_ALPHA * (interval - self.interval)
+        self.last_update = now
+
+        if self.last_captured is not None and frames_captured > self.last_captured:
+            ratio = min(1.0, (frames_dropped - self.last_dropped) / (frames_captured - self.last_captured))
+            self.drop_ratio = ratio if self.drop_ratio is None else self.drop_ratio + EMA_ALPHA * (ratio - self.drop_ratio)
+        self.last_captured, self.last_dropped = frames_captured, frames_dropped
+
+    """
+        Called after every processed frame.
+        Args:
+            busy (float): Processing time of the frame in seconds
+            active_tracks (int): Tracked objects in the frame
+            frames_captured (int), frames_dropped (int): Counters of the FrameReader (get_stats)
+            now (float): time.time()
+        Returns:
+            tuple: (stride, imgsz) for the next frames
+    """
+    def update(self, busy, active_tracks, frames_captured, frames_dropped, now=None):
+        now = time.time() if now is None else now
+        self.measure(busy, frames_captured, frames_dropped, now)
+        if active_tracks:
+            self.last_activity = now
+
+        utilization = self.get_utilization()
+        UTILIZATION.set(round(utilization, 3), stream=self.stream)
+
+        if self.interval is None or self.drop_ratio is None or now - self.last_change < HOLD_SECONDS:
+            return self.stride, self.imgsz
+
+        limit = self.get_stride_limit(now)
+        processed_fps = self.get_processed_fps()
+        keeps_up = self.drop_ratio <= self.max_drop_ratio
+        if self.target_fps:
+            wants_more = processed_fps < self.target_fps * 0.9
+            wants_less = processed_fps > self.target_fps * 1.1
+        else:
+            wants_more = not self.is_idle(now)
+            wants_less = self.is_idle(now)
+
+        if self.stride > limit:
+            self.stride = max(limit, self.stride - 1)
+            self.decide("stride_down", "objects in the scene", now)
+        elif self.adapt_imgsz and self.busy > self.latency and self.imgsz - IMGSZ_STEP >= MIN_IMGSZ:
+            self.imgsz -= IMGSZ_STEP
+            self.decide("imgsz_down", f"{self.busy * 1000:.0f} ms over the budget of {self.latency * 1000:.0f} ms", now)
+        elif self.stride > self.min_stride and not keeps_up:
+            self.stride -= 1
+            self.decide("stride_down", f"reader drops {self.drop_ratio:.0%} of the frames, {processed_fps:.1f} fps", now)
+        elif self.stride > self.min_stride and wants_more:
+            self.stride -= 1
+            self.decide("stride_down", f"{processed_fps:.1f} fps, utilization {utilization:.2f}", now)
+        elif self.stride < limit and keeps_up and wants_less:
+            self.stride += 1
+            self.decide("stride_up", f"{processed_fps:.1f} fps, utilization {utilization:.2f}", now)
+        elif self.adapt_imgsz and self.imgsz < self.max_imgsz and self.busy * ((self.imgsz + IMGSZ_STEP) / self.imgsz) ** 2 < self.latency * 0.8:
+            self.imgsz += IMGSZ_STEP
+            self.decide("imgsz_up", f"{self.busy * 1000:.0f} ms, budget {self.latency * 1000:.0f} ms", now)
+
+        STRIDE.set(self.stride, stream=self.stream)
+        IMGSZ.set(self.imgsz, stream=self.stream)
+        return self.stride, self.imgsz
+
+    def get_status(self):
+        return {
+            "stride": self.stride,
+            "imgsz": self.imgsz,
+            "utilization": round(self.get_utilization(), 3),
+            "processed_fps": round(self.get_processed_fps(), 2),
+            "camera_fps": self.camera_fps,
+            "drop_ratio": round(self.drop_ratio, 3) if self.drop_ratio is not None else None,
+            "processing_ms": round(self.busy * 1000, 2) if self.busy else None,
+            "target_fps": self.target_fps or None,
+            "latency_ms": self.latency * 1000 or None,
+            "decisions": list(self.history),
+        }
+
+
+# Controller for a counting, None if the system setting adaptive_stride is off
+def create_stride_controller(SYSTEM_SETTINGS, stream, camera_fps, stride, imgsz, dynamic_imgsz):
+    if not SYSTEM_SETTINGS.get('adaptive_stride', False):
+        return None
+    return StrideController(
+        stream,
+        camera_fps,
+        stride=stride,
+        imgsz=imgsz,
+        target_fps=SYSTEM_SETTINGS.get('adaptive_target_fps', 0),
+        latency_ms=SYSTEM_SETTINGS.get('adaptive_latency_ms', 0),
+        adapt_imgsz=dynamic_imgsz and SYSTEM_SETTINGS.get('adaptive_imgsz', False),
+        max_stride=SYSTEM_SETTINGS.get('adaptive_max_stride', DEFAULT_MAX_STRIDE),
+        max_stride_active=SYSTEM_SETTINGS.get('adaptive_max_stride_active', DEFAULT_MAX_STRIDE_ACTIVE),
+    )
@@ -0,0 +1,271 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from src.core.action_helpers import real_time_status
+from src.utils.logger import Logger
+from src.utils.tools import load_config
+from settings import LOG_PATH, SYSTEM_SETTINGS_PATH
+
+logger = Logger("Supervisor", LOG_PATH + "/inference.log")
+
+"""
+    Runs one counting pipeline (stream + inference) per device config.
+    Every pipeline has its own stream, model, ROIs and counts. When more than one pipeline runs, the region names
+    in the counts of a pipeline get the name of its device config as prefix (<name>:<region>), the topics keep
+    their region/direction/class levels.
+    With more than one pipeline the available cores are split between them (system setting
+    pipeline_cpu_affinity): the inference thread of a pipeline is pinned to its cores, the threads it starts
+    (frame reader, model threads) inherit the mask.
+    control.py keeps the first pipeline as `inference`, snapshots and the preview use this one.
+    With the system setting inference_process the inference of every pipeline runs in its own process
+    (inference_process.py), with batch_streams pipelines with the same model share their forward passes
+    (batch_scheduler.py).
+"""
+
+START_TIMEOUT = 3 # seconds until the thread of a failed start has exited
+
+
+# Prefix of the region names of a pipeline, without the separator and wildcards of MQTT topics
+def get_namespace(config):
+    return re.sub(r"[/+#]", "_", str(config.get('name') or config['id']))
+
+
+# Splits the cores of the process into one set per pipeline, None if there are not enough cores
+def plan_cpus(count):
+    if count < 2 or not hasattr(os, "sched_getaffinity"):
+        return [None] * count
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < count:
+        return [None] * count
+    size = len(cpus) // count
+    plan = [set(cpus[index * size:(index + 1) * size]) for index in range(count)]
+    # Leftover cores go to the first pipeline
+    plan[0].update(cpus[count * size:])
+    return plan
+
+
+class Pipeline:
+    """
+        Args:
+            config (dict): Device config of the pipeline
+            model_path (str): Path of the (exported) model
+            stream: Started CameraStream
+            only_simulation (bool): Simulation on the recorded test video
+            standalone (bool): The pipeline owns the stream and stops it, the stream of the first pipeline belongs to control.py
+            namespace (str): Prefix of the region names in the counts, None for a single pipeline
+            cpus (set): Cores for the inference thread, None for no pinning
+            scheduler (BatchScheduler): Shared forward passes with the other pipelines of the same model
+    """
+    def __init__(self, config, model_path, stream, only_simulation=False, standalone=True, namespace=None, cpus=None, scheduler=None):
+        self.config = config
+        self.deviceConfigId = config['id']
+        self.model_path = model_path
+        self.stream = stream
+        self.only_simulation = only_simulation
+        self.standalone = standalone
+        self.namespace = namespace
+        self.cpus = cpus
+        self.scheduler = scheduler
+        self.inference = None
+        self.thread = None
+        self.error = None
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def is_active(self):
+        return self.is_alive() and self.inference is not None and self.inference.active
+
+    def pin(self):
+        if not self.cpus:
+            return
+        try:
+            os.sched_setaffinity(threading.get_native_id(), self.cpus)
+            logger.info(f"Pipeline {self.deviceConfigId} pinned to cores {sorted(self.cpus)}.")
+        except Exception as e:
+            logger.warning(f"Could not pin pipeline {self.deviceConfigId} to cores {sorted(self.cpus)}: {e}")
+
+    def run(self):
+        # The inference process inherits the cores of this thread
+        self.pin()
+        try:
+            self.inference.run()
+        except Exception as e:
+            self.error = str(e)
+        if self.only_simulation:
+            self.inference.deactivate()
+            import gc
+            gc.collect()
+
+    """
+        Starts the inference thread and waits until the first frame went through the model.
+        Returns:
+            tuple: (success, message)
+    """
+    def start(self, use_process=False):
+        self.error = None
+
+        try:
+            if use_process:
+                from src.core.inference.inference_process import InferenceProcessProxy
+                self.inference = InferenceProcessProxy(
+                    model_str=self.model_path,
+                    stream=self.stream,
+                    only_simulation=self.only_simulation,
+                    standalone=self.standalone,
+                    deviceConfigId=self.deviceConfigId,
+                    counts_namespace=self.namespace,
+                )
+            else:
+                from src.core.inference.inference import Inference
+                self.inference = Inference(
+                    model_str=self.model_path,
+                    stream=self.stream,
+                    only_simulation=self.only_simulation,
+                    standalone=self.standalone,
+                    deviceConfigId=self.deviceConfigId,
+                    counts_namespace=self.namespace,
+                    scheduler=self.scheduler,
+                )
+        except Exception as e:
+            self.error = str(e)
+            self.stop()
+            return False, self.error
+        if self.inference.queue_manager is None:
+            # Standalone only means the pipeline owns its stream, the counts go into the shared queue
+            from src.utils.exists_helper import check_queue_manager_exists
+            self.inference.queue_manager = check_queue_manager_exists()
+
+        self.thread = threading.Thread(target=self.run, daemon=True, name=f"Counting-{self.deviceConfigId[:8]}")
+        self.thread.start()
+        self.thread.join(START_TIMEOUT)
+
+        while self.inference.active and not self.inference.inference_started_event.is_set():
+            self.inference.inference_started_event.wait(0.5)
+
+        if self.error or not self.inference.inference_started_event.is_set() or not self.is_active():
+            self.stop()
+            return False, self.error or "Unknown error while starting counting."
+
+        return True, "Simulation started." if self.only_simulation else "Counting started."
+
+    def stop(self):
+        if self.inference is not None:
+            self.inference.deactivate()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        if self.standalone and self.stream is not None:
+            self.stream.stop_camera()
+            self.stream = None
+        self.thread = None
+
+    def get_status(self):
+        active = self.is_active()
+        expected_fps = self.stream.get_details()["fps"] if self.stream is not None and hasattr(self.stream, 'get_details') else None
+        reached_fps = self.inference.get_performance_metrics()["avg_fps"] if active else None
+        return {
+            'deviceConfigId': self.deviceConfigId,
+            'status': active,
+            'simulation': self.only_simulation,
+            'namespace': self.namespace,
+            'cpus': sorted(self.cpus) if self.cpus else None,
+            'batching': self.scheduler.get_status() if self.scheduler is not None else None,
+            'details': self.inference.get_performance_metrics() if active else None,
+            'real_time': real_time_status(reached_fps, expected_fps) if active else None,
+            'error': self.error,
+        }
+
+
+class PipelineSupervisor:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.pipelines = OrderedDict() # deviceConfigId -> Pipeline, the first one is the primary pipeline
+
+    def get_settings(self):
+        try:
+            return load_config(SYSTEM_SETTINGS_PATH)
+        except Exception:
+            return {}
+
+    """
+        Starts one pipeline per entry. The primary pipeline (first entry) has to start, the others are started
+        as far as possible, their errors are reported in the status.
+        Args:
+            entries (list): dicts with config, model_path, stream and standalone
+            only_simulation (bool): Simulation on the recorded test video
+        Returns:
+            tuple: (success, message)
+    """
+    def start(self, entries, only_simulation=False):
+        with self.lock:
+            if self.is_active():
+                return False, "Counting is already active."
+            # Finished pipelines of the last run
+            self.stop()
+
+            SYSTEM_SETTINGS = self.get_settings()
+            multiple = len(entries) > 1
+            cpus = plan_cpus(len(entries)) if SYSTEM_SETTINGS.get('pipeline_cpu_affinity', True) else [None] * len(entries)
+            use_process = SYSTEM_SETTINGS.get('inference_process', False)
+
+            # Pipelines with the same model share the forward passes, only within this process
+            schedulers = {}
+            if multiple and not use_process and not only_simulation and SYSTEM_SETTINGS.get('batch_streams', False):
+                from src.core.inference.batch_scheduler import create_schedulers, DEFAULT_LATENCY_MS
+                schedulers = create_schedulers(
+                    [(entry['config'], entry['model_path']) for entry in entries],
+                    latency_ms=SYSTEM_SETTINGS.get('batch_latency_ms', DEFAULT_LATENCY_MS),
+                    max_batch=SYSTEM_SETTINGS.get('batch_max_size') or None,
+                )
+                if schedulers:
+                    # The forward passes run on the scheduler thread, pinned pipelines would pin it too
+                    cpus = [None] * len(entries)
+
+            messages = []
+            for index, entry in enumerate(entries):
+                config = entry['config']
+                pipeline = Pipeline(
+                    config,
+                    entry['model_path'],
+                    entry['stream'],
+                    only_simulation=only_simulation,
+                    standalone=entry['standalone'],
+                    namespace=get_namespace(config) if multiple else None,
+                    cpus=cpus[index],
+                    scheduler=schedulers.get(config['id']),
+                )
+                self.pipelines[pipeline.deviceConfigId] = pipeline
+
+                status, msg = pipeline.start(use_process)
+                if not status and index == 0:
+                    self.stop()
+                    return False, msg
+                if not status:
+                    logger.error(f"Pipeline {pipeline.deviceConfigId} could not be started: {msg}")
+                messages.append(msg if not multiple else f"{pipeline.deviceConfigId}: {msg}")
+
+            return True, " ".join(messages)
+
+    def stop(self):
+        with self.lock:
+            pipelines = list(self.pipelines.values())
+            for pipeline in reversed(pipelines):
+                pipeline.stop()
+            self.pipelines.clear()
+        return len(pipelines)
+
+    def get_primary(self):
+        with self.lock:
+            return next(iter(self.pipelines.values()), None)
+
+    def is_active(self):
+        with self.lock:
+            return any(pipeline.is_alive() for pipeline in self.pipelines.values())
+
+    def get_status(self):
+        with self.lock:
+            return [pipeline.get_status() for pipeline in self.pipelines.values()]
+
+
+PIPELINES = PipelineSupervisor()
@@ -0,0 +1,305 @@
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from src.utils.logger import Logger
+from src.utils.tools import load_config
+from settings import (
+    LOG_PATH,
+    VID_PATH,
+    CONFIG_PATH,
+)
+
+logger = Logger("Sweep", LOG_PATH + "/sweep.log")
+
+"""
+    Parameter sweep for simulations.
+    Takes a grid of device config values, runs one simulation per combination on the recorded test video
+    (capture.mp4) in parallel worker processes and writes one comparison table (sweep_*.json and sweep_*.csv)
+    next to the simvid_*.json results of the single runs.
+
+    Example grid:
+        {
+            "imgsz": [320, 640],
+            "conf": [0.25, 0.4],
+            "tracker": ["bytetrack.yaml", "botsort.yaml"]
+        }
+"""
+
+SWEEP_PARAMS = ("imgsz", "conf", "iou", "tracker", "vid_stride", "modelFormat")
+
+TABLE_COLUMNS = [
+    "run_name", *SWEEP_PARAMS, "status", "total_in", "total_out", "last_track_id", "detection_ratio",
+    "avg_fps", "avg_fps_model", "frames", "elapsed_time", "file", "error",
+]
+
+POLL_INTERVAL = 0.5 # seconds, how often the wait for exports checks for a stop
+
+
+# Runs in the worker process before any job, the thread limits have to be set before torch is imported
+def init_worker(threads_per_worker):
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads_per_worker)
+
+
+"""
+    Runs a single simulation of the sweep, executed in a worker process.
+    Returns a row of the comparison table.
+"""
+def run_simulation_job(job, stop_event):
+    import torch
+    from src.core.stream.cv2.stream_cv2 import CameraStream
+    from src.core.inference.inference import Inference
+
+    torch.set_num_threads(int(os.environ.get("OMP_NUM_THREADS", 1)))
+
+    row = {"run_name": job["run_name"], **job["overrides"], "status": "failed"}
+    start_time = time.time()
+    inference = None
+
+    try:
+        stream = CameraStream(source=job["video"], main_resolution=job["resolution"], fps=job["fps"], stream_channel=job["stream_channel"])
+        inference = Inference(
+            stream=stream,
+            model_str=job["model_path"],
+            only_simulation=True,
+            overrides=job["overrides"],
+            run_name=job["run_name"],
+            save_video=job["save_video"],
+            standalone=True,
+        )
+
+        # The sweep can be stopped from the main process
+        done = threading.Event()
+        def watch_stop():
+            while not done.is_set():
+                if stop_event.wait(0.5):
+                    inference.deactivate()
+                    return
+        threading.Thread(target=watch_stop, daemon=True).start()
+
+        try:
+            inference.run()
+        finally:
+            done.set()
+
+        result = inference.simulation_result
+        if result is None:
+            row["status"] = "stopped" if stop_event.is_set() else "failed"
+            return row
+
+        performance = result["performance"]
+        row.update({
+            "status": "done",
+            "total_in": result["total_in"],
+            "total_out": result["total_out"],
+            "last_track_id": result["last_track_id"],
+            "detection_ratio": result["detection_ratio"],
+            "avg_fps": performance["avg_fps"],
+            "avg_fps_model": performance["avg_fps_model"],
+            "frames": performance["frames_processed"],
+            "file": f"{inference.get_simulation_name()}.json",
+        })
+    except Exception as e:
+        row["error"] = str(e)
+    finally:
+        row["elapsed_time"] = round(time.time() - start_time, 2)
+
+    return row
+
+
+class SimulationSweep:
+    """
+        Args:
+            grid (dict): Lists of values per parameter, see SWEEP_PARAMS
+            workers (int): Number of worker processes, by default as many as the CPU cores allow (1 on GPU)
+            threads_per_worker (int): Torch/OpenMP threads per worker
+            save_video (bool): Also render and encode a video per run
+    """
+    def __init__(self, grid, workers=None, threads_per_worker=None, save_video=False):
+        if not grid:
+            raise ValueError("The sweep grid is empty.")
+
+        unknown = [key for key in grid if key not in SWEEP_PARAMS]
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {', '.join(unknown)}. Use {', '.join(SWEEP_PARAMS)}.")
+
+        self.grid = {key: values if isinstance(values, list) else [values] for key, values in grid.items()}
+        self.save_video = save_video
+        self.video = os.path.join(VID_PATH, "capture.mp4")
+        if not os.path.exists(self.video):
+            raise FileNotFoundError("No test video available. Record a video before starting a sweep.")
+
+        data = load_config(CONFIG_PATH)
+        self.config = next(config for config in data["deviceConfigs"])
+        self.deviceConfigId = self.config["id"]
+
+        cpu_count = os.cpu_count() or 1
+        self.threads_per_worker = max(1, int(threads_per_worker or (1 if cpu_count < 4 else 2)))
+        if workers is None:
+            workers = 1 if self.config["deviceType"] != "cpu" else cpu_count // self.threads_per_worker
+        self.workers = max(1, int(workers))
+
+        keys = list(self.grid.keys())
+        self.jobs = []
+        for index, values in enumerate(itertools.product(*self.grid.values())):
+            self.jobs.append({
+                "run_name": f"sweep{index:02d}",
+                "overrides": dict(zip(keys, values)),
+            })
+        self.workers = min(self.workers, len(self.jobs))
+
+        self.datetime = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+        self.results = []
+        self.stop_event = None
+        self.futures = []
+        self.export_jobs = []
+        self.error = None
+        self.active = True
+        self.stopping = False
+        self.finished = False
+
+    # Exports all needed model formats once before the workers start, the workers must not export the same model in parallel
+    def resolve_models(self):
+        from src.core.action_helpers import get_export_args
+        from src.core.inference.export_jobs import EXPORT_JOBS
+
+        exports = {}
+        for job in self.jobs:
+            config = {**self.config, **job["overrides"]}
+            weights = config["model"]
+            format = config["modelFormat"]
+            export_args = get_export_args(config)
+
+            key = json.dumps([weights, format, export_args], sort_keys=True)
+            if key not in exports:
+                # Cached exports come back as finished jobs
+                exports[key] = weights if format == 'pt' else EXPORT_JOBS.submit(weights, format, export_args)
+                if format != 'pt':
+                    self.export_jobs.append(exports[key])
+            job["model_key"] = key
+
+        model_paths = {}
+        for key, export in exports.items():
+            if isinstance(export, str):
+                model_paths[key] = export
+                continue
+            # Waits in steps, stop() cancels the jobs
+            while self.active and not export.done_event.is_set():
+                export.wait(POLL_INTERVAL)
+            if not self.active:
+                return
+            exp, model_path = export.wait(0)
+            if not exp:
+                raise Exception(f"Export of {export.weights} ({export.format}) failed: {model_path}")
+            model_paths[key] = model_path
+
+        for job in self.jobs:
+            job["model_path"] = model_paths[job.pop("model_key")]
+
+    def run(self):
+        try:
+            return self.run_jobs()
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Sweep failed: {e}")
+            self.active = False
+            if self.results:
+                self.save_results()
+            return self.results
+        finally:
+            self.finished = True
+
+    def run_jobs(self):
+        logger.info(f"Starting sweep with {len(self.jobs)} runs on {self.workers} workers ({self.threads_per_worker} threads each).")
+        start_time = time.time()
+
+        self.resolve_models()
+        if not self.active:
+            return self.results
+
+        width, height = map(int, self.config["stream_resolution"].split('x'))
+        context = multiprocessing.get_context("spawn")
+
+        with context.Manager() as manager:
+            self.stop_event = manager.Event()
+            if not self.active:
+                self.stop_event.set()
+
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=init_worker, initargs=(self.threads_per_worker,)) as executor:
+                for job in self.jobs:
+                    job.update({
+                        "video": self.video,
+                        "resolution": (width, height),
+                        "fps": self.config["stream_fps"],
+                        "stream_channel": self.config["stream_channel"],
+                        "save_video": self.save_video,
+                    })
+                    self.futures.append(executor.submit(run_simulation_job, job, self.stop_event))
+
+                for future in as_completed(self.futures):
+                    if future.cancelled():
+                        continue
+                    try:
+                        row = future.result()
+                    except Exception as e:
+                        row = {"status": "failed", "error": str(e)}
+                    self.results.append(row)
+                    logger.info(f"Sweep run {row.get('run_name')} finished: {row.get('status')} ({len(self.results)}/{len(self.jobs)})")
+
+        self.results.sort(key=lambda row: row.get("run_name", ""))
+        self.save_results()
+        self.active = False
+
+        logger.info(f"Sweep finished after {time.time() - start_time:.1f}s.")
+        return self.results
+
+    def stop(self):
+        self.active = False
+        self.stopping = True
+        if self.stop_event is not None:
+            self.stop_event.set()
+        for future in self.futures:
+            future.cancel()
+
+        from src.core.inference.export_jobs import EXPORT_JOBS
+        for job in self.export_jobs:
+            EXPORT_JOBS.cancel(job.id)
+
+    def save_results(self):
+        filename = f"sweep_{self.deviceConfigId}_{self.datetime}"
+
+        content = {
+            "datetime": self.datetime,
+            "deviceConfigId": self.deviceConfigId,
+            "model": self.config["model"],
+            "video": os.path.basename(self.video),
+            "grid": self.grid,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "results": self.results,
+        }
+        with open(os.path.join(VID_PATH, f"{filename}.json"), 'w') as f:
+            json.dump(content, f, indent=4)
+
+        with open(os.path.join(VID_PATH, f"{filename}.csv"), 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=TABLE_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(self.results)
+
+        logger.info(f"Sweep results saved: {filename}.json")
+
+    def get_status(self):
+        return {
+            "active": self.active,
+            "stopping": self.stopping and not self.finished,
+            "runs": len(self.jobs),
+            "finished": len(self.results),
+            "workers": self.workers,
+            "error": self.error,
+        }
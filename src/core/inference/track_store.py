@@ -0,0 +1,97 @@
+import numpy as np
+
+"""
+    Bounded track history for the counting.
+    Every track gets a slot with a fixed size ring buffer of its last positions in one NumPy array,
+    plus the timestamp when it was seen the last time. Tracks that were not seen for longer than
+    the TTL are evicted, independent of when the counts are flushed to the queue.
+"""
+
+class TrackStore:
+    def __init__(self, capacity=30, ttl=5, initial_tracks=64):
+        self.capacity = max(2, int(capacity))
+        self.ttl = ttl
+        self.index = {}
+
+        self.points = np.zeros((initial_tracks, self.capacity, 2), dtype=np.float32)
+        self.heads = np.zeros(initial_tracks, dtype=np.int64)
+        self.lengths = np.zeros(initial_tracks, dtype=np.int64)
+        self.last_seen = np.zeros(initial_tracks, dtype=np.float64)
+        self.slot_ids = np.full(initial_tracks, -1, dtype=np.int64)
+        self.free = list(range(initial_tracks - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, track_id):
+        return track_id in self.index
+
+    def _grow(self):
+        size = len(self.slot_ids)
+        self.points = np.concatenate([self.points, np.zeros_like(self.points)])
+        self.heads = np.concatenate([self.heads, np.zeros(size, dtype=np.int64)])
+        self.lengths = np.concatenate([self.lengths, np.zeros(size, dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.zeros(size, dtype=np.float64)])
+        self.slot_ids = np.concatenate([self.slot_ids, np.full(size, -1, dtype=np.int64)])
+        self.free.extend(range(2 * size - 1, size - 1, -1))
+
+    def _slot(self, track_id):
+        slot = self.index.get(track_id)
+        if slot is None:
+            if not self.free:
+                self._grow()
+            slot = self.free.pop()
+            self.index[track_id] = slot
+            self.slot_ids[slot] = track_id
+            self.heads[slot] = 0
+            self.lengths[slot] = 0
+        return slot
+
+    """
+        Appends the current position of each track.
+        Args:
+            track_ids (list): Track IDs of the current frame
+            positions (N x 2): Current positions (bbox centers)
+            now (float): Timestamp in seconds
+        Returns:
+            tuple: (previous positions N x 2, mask N of tracks that have a previous position)
+    """
+    def update(self, track_ids, positions, now):
+        positions = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+        slots = np.fromiter((self._slot(track_id) for track_id in track_ids), dtype=np.int64, count=len(track_ids))
+
+        heads = self.heads[slots]
+        has_previous = self.lengths[slots] > 0
+        previous = self.points[slots, (heads - 1) % self.capacity]
+
+        self.points[slots, heads] = positions
+        self.heads[slots] = (heads + 1) % self.capacity
+        self.lengths[slots] = np.minimum(self.lengths[slots] + 1, self.capacity)
+        self.last_seen[slots] = now
+
+        return previous, has_previous
+
+    # Positions of a track, oldest first
+    def get(self, track_id):
+        slot = self.index.get(track_id)
+        if slot is None:
+            return np.empty((0, 2), dtype=np.float32)
+        length = self.lengths[slot]
+        order = (self.heads[slot] - length + np.arange(length)) % self.capacity
+        return self.points[slot, order]
+
+    # Removes all tracks that were not seen within the TTL, returns the number of evicted tracks
+    def evict(self, now):
+        expired = np.nonzero((self.slot_ids >= 0) & (self.last_seen < now - self.ttl))[0]
+        for slot in expired.tolist():
+            del self.index[int(self.slot_ids[slot])]
+            self.slot_ids[slot] = -1
+            self.lengths[slot] = 0
+            self.free.append(slot)
+        return len(expired)
+
+    def clear(self):
+        self.index.clear()
+        self.slot_ids[:] = -1
+        self.lengths[:] = 0
+        self.free = list(range(len(self.slot_ids) - 1, -1, -1))
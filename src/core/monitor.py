@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import deque
+import psutil
+from src.utils.logger import Logger
+from settings import LOG_PATH
+
+logger = Logger("Monitor", LOG_PATH + "/control.log")
+
+"""
+    Background sampler for the system status.
+    A thread collects CPU, RAM, GPU and application status at a fixed rate, the last sample is kept as
+    snapshot together with short histories in ring buffers. Callers (UI polling, MQTT send_status) only
+    read the cached snapshot and never wait for psutil or nvidia-smi.
+
+    The GPU is sampled less often, because GPUtil shells out to nvidia-smi.
+"""
+
+SAMPLE_INTERVAL = 1 # seconds
+GPU_SAMPLE_INTERVAL = 5 # seconds
+HISTORY_LENGTH = 60 # samples
+
+
+class SystemMonitor:
+    """
+        Args:
+            collect_status (callable): Returns the application part of the status (mqtt, camera, inference, ...)
+            collect_gpu (callable): Returns a list with the status of each GPU
+            on_sample (callable): Called with the previous and the new snapshot after each sample
+    """
+    def __init__(self, collect_status, collect_gpu, interval=SAMPLE_INTERVAL, gpu_interval=GPU_SAMPLE_INTERVAL, history_length=HISTORY_LENGTH, on_sample=None):
+        self.collect_status = collect_status
+        self.collect_gpu = collect_gpu
+        self.on_sample = on_sample
+        self.interval = interval
+        self.gpu_interval = gpu_interval
+
+        self.history = {key: deque(maxlen=history_length) for key in ("timestamps", "cpu", "ram", "gpu", "fps", "queue_size")}
+        self.snapshot = None
+        self.gpu_status = []
+        self.last_gpu_sample = 0
+
+        self.ready = threading.Event()
+        self.sample_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        # First call initializes the CPU measurement, psutil compares against the previous call
+        psutil.cpu_percent()
+        self.thread = threading.Thread(target=self._sampler, daemon=True, name="SystemMonitor")
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(self.interval * 2)
+        self.thread = None
+
+    def _sampler(self):
+        while not self.stop_event.is_set():
+            started = time.time()
+            try:
+                with self.sample_lock:
+                    self.sample()
+            except Exception as e:
+                logger.error(f"Error while sampling the system status: {e}")
+            self.stop_event.wait(max(0, self.interval - (time.time() - started)))
+
+    def sample(self):
+        now = time.time()
+
+        memory = psutil.virtual_memory()
+        cpu = {
+            'percent': psutil.cpu_percent(),
+        }
+        ram = {
+            'available': memory.available * 100 / memory.total,
+            'total': memory.total / 1024 / 1024,
+            'used': memory.used / 1024 / 1024
+        }
+
+        if now - self.last_gpu_sample >= self.gpu_interval:
+            try:
+                self.gpu_status = self.collect_gpu()
+            except Exception as e:
+                logger.error(f"Error while sampling the GPU status: {e}")
+                self.gpu_status = []
+            self.last_gpu_sample = now
+
+        status = self.collect_status()
+        details = status.get('inference', {}).get('details') or {}
+
+        self.history["timestamps"].append(now)
+        self.history["cpu"].append(cpu['percent'])
+        self.history["ram"].append(ram['used'])
+        self.history["gpu"].append(self.gpu_status[0]['load'] if self.gpu_status else None)
+        self.history["fps"].append(details.get('avg_fps'))
+        self.history["queue_size"].append(status.get('inference', {}).get('queue_size'))
+
+        status.update({
+            'cpu': cpu,
+            'ram': ram,
+            'gpu': self.gpu_status,
+            'history': {key: list(values) for key, values in self.history.items()},
+            'sampled_at': now,
+        })
+
+        # Replaced as a whole, readers always get a consistent snapshot
+        previous = self.snapshot
+        self.snapshot = status
+        self.ready.set()
+
+        if self.on_sample is not None:
+            self.on_sample(previous, status)
+        return status
+
+    """
+        Returns the last snapshot. Before the first sample is available, waits up to timeout seconds and then
+        samples in the calling thread. Never returns None, the routes hand the status out directly.
+    """
+    def get_status(self, timeout=None):
+        if self.snapshot is None:
+            self.ready.wait(timeout if timeout is not None else self.interval * 2)
+        if self.snapshot is not None:
+            return self.snapshot
+        try:
+            with self.sample_lock:
+                return self.snapshot or self.sample()
+        except Exception as e:
+            logger.error(f"Error while sampling the system status: {e}")
+            return {'status': 'starting', 'error': str(e)}
@@ -0,0 +1,192 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+from src.core.metrics import REGISTRY
+from src.utils.logger import Logger
+from settings import LOG_PATH
+
+logger = Logger("FrameReader", LOG_PATH + "/stream.log")
+
+"""
+    Capture stage between the camera and the inference.
+    A dedicated reader thread pulls frames from a CameraStream (cv2 or picamera2) at the native
+    camera rate and copies them into a preallocated ring buffer. The inference consumes from the
+    buffer at its own rate, so camera/decoder latency is no longer added to the model latency.
+
+    Modes:
+        latest:   The consumer always gets the newest frame, older unconsumed frames are dropped (live cameras).
+        lossless: The reader thread blocks when the buffer is full, no frame is dropped (simulation videos).
+"""
+
+MODES = ("latest", "lossless")
+
+FRAME_AGE = REGISTRY.histogram("capture_frame_age_seconds", "Time between capturing a frame and handing it over to the inference.")
+FRAMES_DROPPED = REGISTRY.counter("capture_frames_dropped", "Frames dropped by the ring buffer because the inference was slower than the camera.")
+
+
+class FrameReader:
+    def __init__(self, stream, capacity=4, mode="latest"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown capture mode: {mode}")
+
+        self.stream = stream
+        self.mode = mode
+        self.capacity = max(2, int(capacity))
+
+        # Ring buffer, allocated with the first frame because we only know the shape then
+        self.slots = None
+        self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.free = deque(range(self.capacity))
+        self.ready = deque()
+        self.held = []
+
+        self.cond = threading.Condition()
+        self.thread = None
+        self.active = False
+        self.ended = False
+        self.error = None
+
+        # Stats
+        self.frames_captured = 0
+        self.frames_consumed = 0
+        self.frames_dropped = 0
+        self.last_latency = 0
+        self.avg_latency = 0
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.active = True
+        self.ended = False
+        self.thread = threading.Thread(target=self._reader, daemon=True, name="FrameReader")
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.active = False
+            self.cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(5)
+        self.thread = None
+
+    def _allocate(self, frame):
+        self.slots = np.empty((self.capacity, *frame.shape), dtype=frame.dtype)
+        self.free = deque(range(self.capacity))
+        self.ready.clear()
+        self.held = []
+        logger.info(f"Allocated ring buffer with {self.capacity} slots of shape {frame.shape} ({self.mode} mode).")
+
+    def _reader(self):
+        try:
+            while self.active:
+                ret, frame = self.stream.read()
+                captured_at = time.time()
+
+                if not ret or not isinstance(frame, np.ndarray):
+                    self.error = frame if isinstance(frame, str) else None
+                    break
+
+                with self.cond:
+                    if self.slots is None or self.slots.shape[1:] != frame.shape or self.slots.dtype != frame.dtype:
+                        # Frames already handed out keep a reference to the old buffer
+                        self._allocate(frame)
+
+                    while not self.free:
+                        if self.mode == "latest" and self.ready:
+                            self.free.append(self.ready.popleft())
+                            self.frames_dropped += 1
+                            FRAMES_DROPPED.inc()
+                        else:
+                            self.cond.wait(0.5)
+                            if not self.active:
+                                return
+
+                    slot = self.free.popleft()
+                    np.copyto(self.slots[slot], frame)
+                    self.timestamps[slot] = captured_at
+                    self.ready.append(slot)
+                    self.frames_captured += 1
+                    self.cond.notify_all()
+        except Exception as e:
+            self.error = f"Error in frame reader: {e}"
+            logger.error(self.error)
+        finally:
+            with self.cond:
+                self.ended = True
+                self.cond.notify_all()
+
+    def _release_held(self):
+        self.free.extend(self.held)
+        self.held = []
+
+    def _take(self, count):
+        if self.mode == "latest":
+            while len(self.ready) > count:
+                self.free.append(self.ready.popleft())
+                self.frames_dropped += 1
+                FRAMES_DROPPED.inc()
+
+        now = time.time()
+        frames = []
+        for _ in range(min(count, len(self.ready))):
+            slot = self.ready.popleft()
+            self.held.append(slot)
+            frames.append(self.slots[slot])
+
+            latency = float(now - self.timestamps[slot]) * 1000
+            FRAME_AGE.observe(latency / 1000)
+            self.frames_consumed += 1
+            self.last_latency = latency
+            self.avg_latency = (self.avg_latency * (self.frames_consumed - 1) + latency) / self.frames_consumed
+
+        self.cond.notify_all()
+        return frames
+
+    """
+        Same signature as CameraStream.read(). The returned frame is a view into the ring buffer,
+        it stays valid until the next call of read() or read_batch().
+    """
+    def read(self, timeout=None):
+        ret, frames = self.read_batch(1, timeout)
+        return (True, frames[0]) if ret else (False, self.error)
+
+    def read_batch(self, count, timeout=None):
+        if count >= self.capacity:
+            raise ValueError(f"Batch size {count} needs a capacity greater than {self.capacity}.")
+
+        deadline = time.time() + timeout if timeout else None
+        with self.cond:
+            self._release_held()
+            self.cond.notify_all()
+
+            while len(self.ready) < (count if self.mode == "lossless" else 1) and not self.ended:
+                remaining = deadline - time.time() if deadline else 0.5
+                if deadline and remaining <= 0:
+                    break
+                self.cond.wait(min(remaining, 0.5))
+
+            if not self.ready:
+                return False, []
+            return True, self._take(count)
+
+    """
+        True if the stream has ended and every frame was handed out, i.e. the last read_batch() returned the
+        final frames. Waits up to timeout seconds until the reader has either buffered the next frame or ended.
+    """
+    def exhausted(self, timeout=None):
+        with self.cond:
+            self.cond.wait_for(lambda: self.ready or self.ended, timeout)
+            return self.ended and not self.ready
+
+    def get_stats(self):
+        return {
+            "mode": self.mode,
+            "capacity": self.capacity,
+            "frames_captured": self.frames_captured,
+            "frames_consumed": self.frames_consumed,
+            "frames_dropped": self.frames_dropped,
+            "buffered": len(self.ready),
+            "last_latency": self.last_latency,
+            "avg_latency": self.avg_latency,
+        }
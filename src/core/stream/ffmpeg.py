@@ -1,5 +1,7 @@
 import subprocess
 import os
+import queue
+import threading
 
 # Global variable to track conversion status
 conversion_in_progress = False
@@ -20,4 +22,82 @@ def convert_video(input_path, output_path):
 
 # Get method
 def is_conversion_in_progress():
-    return conversion_in_progress
\ No newline at end of file
+    return conversion_in_progress
+
+"""
+    Streaming encoder for simulation videos.
+    Frames are handed over as raw BGR arrays through a bounded queue to a background thread, which pipes
+    them into a single ffmpeg libx264 process. No intermediate images or videos are written to disk.
+"""
+class VideoEncoder:
+    def __init__(self, output_path, width, height, fps, channels=3, queue_size=32):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.pix_fmt = {1: "gray", 3: "bgr24", 4: "bgra"}.get(channels, "bgr24")
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.process = None
+        self.thread = None
+        self.error = None
+        self.frames_written = 0
+
+    def start(self):
+        self.process = subprocess.Popen([
+            'ffmpeg', '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', self.pix_fmt, '-s', f"{self.width}x{self.height}", '-r', str(self.fps), '-i', '-',
+            '-an', '-vcodec', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+            self.output_path
+        ], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+        self.thread = threading.Thread(target=self._writer, daemon=True, name="VideoEncoder")
+        self.thread.start()
+
+    def _writer(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error:
+                continue
+            try:
+                self.process.stdin.write(frame.tobytes())
+                self.frames_written += 1
+            except (BrokenPipeError, OSError) as e:
+                self.error = f"ffmpeg stopped accepting frames: {e}"
+
+    # Blocks if the encoder falls behind. The frame must not be modified afterwards.
+    def write(self, frame):
+        if self.error:
+            raise RuntimeError(self.error)
+        self.queue.put(frame)
+
+    def close(self):
+        global conversion_in_progress
+        conversion_in_progress = True
+        try:
+            self.queue.put(None)
+            self.thread.join()
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            stderr = self.process.stderr.read().decode(errors="ignore").strip()
+            returncode = self.process.wait()
+
+            if self.error or returncode != 0:
+                raise RuntimeError(f"Error occurred during video encoding: {self.error or stderr or returncode}")
+            return True
+        finally:
+            conversion_in_progress = False
+
+    def abort(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        if self.thread and self.thread.is_alive():
+            self.error = self.error or "Encoding aborted."
+            self.queue.put(None)
+            self.thread.join(5)
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
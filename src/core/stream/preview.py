@@ -0,0 +1,152 @@
+import threading
+import time
+import cv2
+import numpy as np
+from src.utils.logger import Logger
+from settings import LOG_PATH
+
+logger = Logger("Preview", LOG_PATH + "/stream.log")
+
+"""
+    Live preview for the UI as MJPEG stream (multipart/x-mixed-replace).
+    One encoder thread fetches the last inference frame at the preview FPS, scales it down to the preview width,
+    encodes it as JPEG once and hands the same bytes to all connected viewers. The load does not depend on the
+    number of viewers and the encoding never runs in the inference thread.
+    The thread starts with the first viewer and stops when nobody watched for IDLE_TIMEOUT seconds.
+    Every viewer holds a thread of the WSGI server as long as it watches, so the number of viewers is limited
+    (max_viewers), further viewers are rejected instead of starving the REST API.
+"""
+
+BOUNDARY = "frame"
+IDLE_TIMEOUT = 10 # seconds
+KEEPALIVE_INTERVAL = 5 # seconds, the last frame is sent again so disconnected viewers are noticed
+
+
+class PreviewBroadcaster:
+    """
+        Args:
+            get_frame (callable): Returns the current frame as np.ndarray or None
+            fps (float): Preview frames per second
+            width (int): Width of the preview, 0 keeps the original size
+            quality (int): JPEG quality
+            max_viewers (int): Viewers at the same time, 0 for no limit
+    """
+    def __init__(self, get_frame, fps=5, width=640, quality=70, max_viewers=0):
+        self.get_frame = get_frame
+        self.fps = max(0.1, float(fps))
+        self.width = int(width or 0)
+        self.quality = int(quality)
+        self.max_viewers = int(max_viewers or 0)
+
+        self.cond = threading.Condition()
+        self.jpeg = None
+        self.sequence = 0
+        self.viewers = 0
+        self.last_viewer_time = 0
+        self.thread = None
+        self.active = False
+        self.generation = 0
+
+    # Called with the lock held. An encoder that is shutting down because of the idle timeout has set active to False already
+    def _ensure_running(self):
+        if self.active and self.thread is not None and self.thread.is_alive():
+            return
+        self.active = True
+        self.generation += 1
+        self.thread = threading.Thread(target=self._encoder, args=(self.generation,), daemon=True, name="PreviewEncoder")
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.active = False
+            self.cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(2)
+        self.thread = None
+
+    def encode(self, frame):
+        if self.width and frame.shape[1] > self.width:
+            height = int(frame.shape[0] * self.width / frame.shape[1])
+            frame = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        ret, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return jpeg.tobytes() if ret else None
+
+    def _encoder(self, generation):
+        logger.info(f"Preview encoder started ({self.fps} FPS, width {self.width or 'original'}).")
+        interval = 1 / self.fps
+
+        # A stopped encoder must not continue when a new one was started in the meantime
+        while self.active and generation == self.generation:
+            started = time.time()
+
+            with self.cond:
+                if self.viewers == 0 and started - self.last_viewer_time > IDLE_TIMEOUT:
+                    self.active = False
+                    self.jpeg = None
+                    break
+
+            try:
+                frame = self.get_frame()
+                jpeg = self.encode(frame) if isinstance(frame, np.ndarray) and frame.size > 0 else None
+            except Exception as e:
+                logger.error(f"Error while encoding preview frame: {e}")
+                jpeg = None
+
+            if jpeg is not None:
+                with self.cond:
+                    self.jpeg = jpeg
+                    self.sequence += 1
+                    self.cond.notify_all()
+
+            time.sleep(max(0, interval - (time.time() - started)))
+
+        logger.info("Preview encoder stopped, no viewers.")
+
+    # Latest encoded frame, e.g. for single image requests
+    def get_jpeg(self):
+        return self.jpeg
+
+    """
+        Registers a viewer, the encoder starts with the first one.
+        Returns:
+            bool: False if max_viewers are already watching
+    """
+    def add_viewer(self):
+        with self.cond:
+            if self.max_viewers and self.viewers >= self.max_viewers:
+                return False
+            self.viewers += 1
+            self.last_viewer_time = time.time()
+            self._ensure_running()
+        return True
+
+    # Called when the response of a viewer is closed, also if it was never iterated
+    def remove_viewer(self):
+        with self.cond:
+            self.viewers = max(0, self.viewers - 1)
+            self.last_viewer_time = time.time()
+
+    """
+        Generator for one viewer (registered with add_viewer), yields the multipart chunks.
+    """
+    def stream(self):
+        sequence = -1
+        last_sent = 0
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.sequence != sequence or not self.active, timeout=KEEPALIVE_INTERVAL)
+                if not self.active:
+                    # Stopped from outside (e.g. server shutdown)
+                    return
+                jpeg = self.jpeg
+                changed = self.sequence != sequence
+                sequence = self.sequence
+
+            if jpeg is None or (not changed and time.time() - last_sent < KEEPALIVE_INTERVAL):
+                continue
+
+            last_sent = time.time()
+            yield (
+                f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n".encode()
+                + jpeg + b"\r\n"
+            )
@@ -1,12 +1,11 @@
 from src.utils.logger import Logger
 import json
 import time
+import settings
 from settings import (
     LOG_PATH,
     CONFIG_PATH,
     CAM_SOLUTIONS_PATH,
-    CV2_INSTALLED,
-    PICAMERA2_INSTALLED,
 )
 
 """
@@ -32,10 +31,11 @@ def StreamSolution(only_simulation=False, youtube=False):
     elif youtube:
         from src.core.stream.cv2.stream_cv2 import CameraStream as cv2_stream
         return cv2_stream
-    elif PICAMERA2_INSTALLED and int(source) == 0:
+    # Read from settings at call time, the camera solutions are probed on first access
+    elif settings.PICAMERA2_INSTALLED and int(source) == 0:
         from src.core.stream.picamera.stream_pi import CameraStream as picamera_stream
         return picamera_stream
-    elif CV2_INSTALLED:
+    elif settings.CV2_INSTALLED:
         from src.core.stream.cv2.stream_cv2 import CameraStream as cv2_stream
         return cv2_stream
     else:
@@ -1,9 +1,9 @@
-from src.core.clients.mqtt import MQTTClient
 from src.core.inference.queuemanager import QueueManager
 
 def check_mqtt_client_exists():
     from src.control import mqtt_client
-    if isinstance(mqtt_client, MQTTClient) and mqtt_client.is_connected():
+    # mqtt_client is only set to MQTTClient instances, paho is loaded with the first client
+    if mqtt_client is not None and mqtt_client.is_connected():
         return mqtt_client
     else:
         return False
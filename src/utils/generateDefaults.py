@@ -1,67 +1,72 @@
 import os, json
 from src.utils.tools import generateUUID
 from settings import (
-    CV2_INSTALLED,
-    PICAMERA2_INSTALLED,
-    CUDA_AVAILABLE,
-    CUDA_DEVICE_COUNT,
-    CUDA_DEVICE_NAME,
-    MPS_AVAILABLE,
-    MPS_BUILT,
     CONFIG_PATH,
     SYSTEM_SETTINGS_PATH
 )
 
 id = generateUUID()
 
-config_data = {
-    "id": id,
-    "deviceConfigs": [
-        {
-            "id": generateUUID(),
-            "batch": 1,
-            "conf": 0.25,
-            "deviceType": "cpu",
-            "dynamic": False,
-            "imgsz": 320,
-            "iou": 0.7,
-            "keras": False,
-            "max_det": 300,
-            "model": "yolo11n",
-            "modelFormat": "pt",
-            "nms": False,
-            "opset": None,
-            "optimize": False,
-            "persist": False,
-            "quantization": "default",
-            "simplify": False,
-            "stream_channel": "RGB888",
-            "stream_fps": 30,
-            "stream_resolution": "640x480",
-            "stream_source": "0" if CV2_INSTALLED or PICAMERA2_INSTALLED else "youtube",
-            "tracker": "botsort.yaml",
-            "vid_stride": 1,
-            "workspace": 4,
-            "webcam_available": True if CV2_INSTALLED or PICAMERA2_INSTALLED else False,
-        }
-    ],
-    "deviceTags": [
-        {
-            "tags": ["0", "1", "2", "3", "5",]
-        }
-    ],
-    "cuda": CUDA_AVAILABLE,
-    "cuda_device_count": CUDA_DEVICE_COUNT,
-    "cuda_device_name": CUDA_DEVICE_NAME,
-    "mps_available": MPS_AVAILABLE,
-    "mps_built": MPS_BUILT,
-}
+# Built only when the config doesn't exist, the camera and GPU values are probed on first access (see settings.py)
+def get_default_config():
+    from settings import (
+        CV2_INSTALLED,
+        PICAMERA2_INSTALLED,
+        CUDA_AVAILABLE,
+        CUDA_DEVICE_COUNT,
+        CUDA_DEVICE_NAME,
+        MPS_AVAILABLE,
+        MPS_BUILT,
+    )
+
+    return {
+        "id": id,
+        "deviceConfigs": [
+            {
+                "id": generateUUID(),
+                "batch": 1,
+                "conf": 0.25,
+                "deviceType": "cpu",
+                "dynamic": False,
+                "imgsz": 320,
+                "iou": 0.7,
+                "keras": False,
+                "max_det": 300,
+                "model": "yolo11n",
+                "modelFormat": "pt",
+                "nms": False,
+                "opset": None,
+                "optimize": False,
+                "persist": False,
+                "quantization": "default",
+                "simplify": False,
+                "stream_channel": "RGB888",
+                "stream_fps": 30,
+                "stream_resolution": "640x480",
+                "stream_source": "0" if CV2_INSTALLED or PICAMERA2_INSTALLED else "youtube",
+                "tracker": "botsort.yaml",
+                "vid_stride": 1,
+                "workspace": 4,
+                "webcam_available": True if CV2_INSTALLED or PICAMERA2_INSTALLED else False,
+            }
+        ],
+        "deviceTags": [
+            {
+                "tags": ["0", "1", "2", "3", "5",]
+            }
+        ],
+        "cuda": CUDA_AVAILABLE,
+        "cuda_device_count": CUDA_DEVICE_COUNT,
+        "cuda_device_name": CUDA_DEVICE_NAME,
+        "mps_available": MPS_AVAILABLE,
+        "mps_built": MPS_BUILT,
+    }
 
 
 def generateDefaultConfigIfNotExists():
     if not os.path.exists(CONFIG_PATH):
         with open(CONFIG_PATH, "w") as file:
-            json.dump(config_data, file)
+            json.dump(get_default_config(), file)
 
 
 system_settings_data = {
@@ -74,6 +79,36 @@ system_settings_data = {
     "counts_publish_intervall_format": "min",
     "detect_count_timespan": False,
     "blur_humans": True,
+    "track_history_length": 30,
+    "track_ttl": 5,
+    "headless": True,
+    "queue_max_entries": 100000,
+    "queue_retention": 168,
+    "queue_retention_format": "h",
+    "mqtt_publish_mode": "topic",
+    "mqtt_payload_encoding": "json",
+    "preview_fps": 5,
+    "preview_width": 640,
+    "preview_quality": 70,
+    "preview_max_viewers": 2,
+    "events_max_subscribers": 3,
+    "model_cache_size": 2,
+    "model_cache_memory_mb": 0,
+    "export_max_concurrent": 1,
+    "pipeline_cpu_affinity": True,
+    "inference_process": False,
+    "batch_streams": False,
+    "batch_latency_ms": 20,
+    "batch_max_size": 0,
+    "adaptive_stride": False,
+    "adaptive_target_fps": 0,
+    "adaptive_latency_ms": 0,
+    "adaptive_imgsz": False,
+    "adaptive_max_stride": 8,
+    "adaptive_max_stride_active": 2,
+    "motion_gate": False,
+    "motion_gate_threshold": 0.002,
+    "motion_gate_hold": 2,
 }
 
 def generateDefaultSystemSettingsIfNotExists():
@@ -0,0 +1,82 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+"""
+    Startup profile of the application process.
+    Imports the given module (default: app, the HTTP server with all routes) in a fresh interpreter with
+    `python -X importtime` and prints the slowest imports by cumulative time. Heavy modules like torch,
+    ultralytics or cv2 should not show up here, they are loaded with the first counting, benchmark or export.
+
+    Usage:
+        python -m src.utils.importtime
+        python -m src.utils.importtime --module src.control --top 30
+"""
+
+HOME_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules that are expected to be loaded lazily
+HEAVY_MODULES = ("torch", "ultralytics", "cv2", "GPUtil", "yt_dlp", "paho", "picamera2")
+
+
+"""
+    Parses the stderr output of -X importtime.
+    Returns:
+        list: (module, self_us, cumulative_us, depth) tuples in import order
+"""
+def parse_importtime(output):
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        except ValueError:
+            continue
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def profile_imports(module="app"):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HOME_DIR,
+        capture_output=True,
+        text=True,
+    )
+    wall_time = time.perf_counter() - started
+    return parse_importtime(result.stderr), wall_time, result.returncode, result.stderr
+
+
+def report(module="app", top=20):
+    imports, wall_time, returncode, stderr = profile_imports(module)
+    if returncode != 0:
+        errors = [line for line in stderr.splitlines() if not line.startswith("import time:")]
+        print(f"Import of {module} failed:\n" + "\n".join(errors[-10:]))
+        return False
+
+    total = sum(self_us for _, self_us, _, _ in imports)
+    print(f"Import of {module}: {total / 1e6:.2f} s in imports, {wall_time:.2f} s wall time (incl. interpreter start)\n")
+
+    print(f"{'cumulative [ms]':>16} {'self [ms]':>10}  module")
+    for name, self_us, cumulative_us, _ in sorted(imports, key=lambda i: i[2], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:16.1f} {self_us / 1000:10.1f}  {name}")
+
+    loaded = sorted({name.split(".")[0] for name, _, _, _ in imports} & set(HEAVY_MODULES))
+    if loaded:
+        print(f"\nHeavy modules loaded at startup: {', '.join(loaded)}")
+    else:
+        print("\nNo heavy modules loaded at startup.")
+    return not loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Startup import profile of the application.")
+    parser.add_argument("--module", default="app", help="Module to import (default: app)")
+    parser.add_argument("--top", type=int, default=20, help="Number of imports to show")
+    args = parser.parse_args()
+    sys.exit(0 if report(args.module, args.top) else 1)
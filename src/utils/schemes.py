@@ -60,6 +60,7 @@ CONFIG_SCHEMA = {
                 "type": "object",
                 "properties": {
                     "id": {"type": "string", "format": "uuid"},
+                    "name": {"type": "string"},
                     "batch": {"type": "integer"},
                     "conf": {"type": "number"},
                     "deviceType": {"type": "string"},
@@ -97,6 +98,7 @@ CONFIG_SCHEMA = {
                     "isFormationClosed": {"type": "boolean"},
                     "line_thickness": {"type": "integer"},
                     "deviceId": {"type": "string"},
+                    "deviceConfigId": {"type": "string", "format": "uuid"},
                     "onRes:": {"type": "string"},
                     "points": {
                         "type": "array",
@@ -129,6 +131,7 @@ CONFIG_SCHEMA = {
             "items": {
                 "type": "object",
                 "properties": {
+                    "deviceConfigId": {"type": "string", "format": "uuid"},
                     "tags": {
                         "type": "array",
                         "items": {"type": "string"}
@@ -167,7 +170,36 @@ SETTINGS_SCHEMA = {
         "counts_publish_intervall_format": {"type": "string"},
         "detect_count_timespan": {"type": "boolean"},
         "blur_humans": {"type": "boolean"},
-        
+        "track_history_length": {"type": "integer", "minimum": 2},
+        "track_ttl": {"type": "number", "minimum": 0},
+        "headless": {"type": "boolean"},
+        "queue_max_entries": {"type": "integer", "minimum": 0},
+        "queue_retention": {"type": "integer", "minimum": 0},
+        "queue_retention_format": {"type": "string"},
+        "mqtt_publish_mode": {"type": "string", "enum": ["topic", "batch"]},
+        "mqtt_payload_encoding": {"type": "string", "enum": ["json", "gzip", "cbor"]},
+        "preview_fps": {"type": "number", "exclusiveMinimum": 0},
+        "preview_width": {"type": "integer", "minimum": 0},
+        "preview_quality": {"type": "integer", "minimum": 1, "maximum": 100},
+        "preview_max_viewers": {"type": "integer", "minimum": 0},
+        "events_max_subscribers": {"type": "integer", "minimum": 0},
+        "model_cache_size": {"type": "integer", "minimum": 0},
+        "model_cache_memory_mb": {"type": "integer", "minimum": 0},
+        "export_max_concurrent": {"type": "integer", "minimum": 1},
+        "pipeline_cpu_affinity": {"type": "boolean"},
+        "inference_process": {"type": "boolean"},
+        "batch_streams": {"type": "boolean"},
+        "batch_latency_ms": {"type": "number", "minimum": 0},
+        "batch_max_size": {"type": "integer", "minimum": 0},
+        "adaptive_stride": {"type": "boolean"},
+        "adaptive_target_fps": {"type": "number", "minimum": 0},
+        "adaptive_latency_ms": {"type": "number", "minimum": 0},
+        "adaptive_imgsz": {"type": "boolean"},
+        "adaptive_max_stride": {"type": "integer", "minimum": 1},
+        "adaptive_max_stride_active": {"type": "integer", "minimum": 1},
+        "motion_gate": {"type": "boolean"},
+        "motion_gate_threshold": {"type": "number", "minimum": 0, "maximum": 1},
+        "motion_gate_hold": {"type": "number", "minimum": 0},
     },
     "required": ["auto_start_inference", "auto_start_mqtt_client",
                  "counts_save_intervall", "counts_save_intervall_format", 
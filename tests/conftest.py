@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+"""
+    settings.py writes its generated keys into the .env of the working directory.
+    The tests run in a temporary working directory, so the .env of the repository stays untouched.
+"""
+def pytest_sessionstart(session):
+    os.chdir(tempfile.mkdtemp(prefix="tests-"))
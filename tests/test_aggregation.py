@@ -0,0 +1,85 @@
+import pytest
+from src.core.clients.aggregation import aggregate_counts, to_payload
+
+"""
+    Merging of queued count snapshots into totals per topic (region/direction/class) and time bucket.
+"""
+
+
+def snapshot(region="entrance", direction="north", category="IN", cls="person", count=1, conf=0.5):
+    return {region: {direction: {category: {cls: {"count": count, "total_conf": conf}}}}}
+
+
+def totals(IN=0, OUT=0, IN_CONF=0.0, OUT_CONF=0.0):
+    return {"IN": IN, "OUT": OUT, "IN_CONF": IN_CONF, "OUT_CONF": OUT_CONF}
+
+
+@pytest.mark.parametrize("snapshots, expected", [
+    # Same topic is summed
+    (
+        [snapshot(count=2, conf=1.6), snapshot(count=1, conf=0.9)],
+        {"entrance/north/person": totals(IN=3, IN_CONF=2.5)},
+    ),
+    # IN and OUT of the same topic end up in one entry
+    (
+        [snapshot(count=2, conf=1.0), snapshot(category="OUT", count=1, conf=0.7)],
+        {"entrance/north/person": totals(IN=2, OUT=1, IN_CONF=1.0, OUT_CONF=0.7)},
+    ),
+    # Regions, directions and classes are separate topics
+    (
+        [snapshot(), snapshot(region="exit"), snapshot(direction="south"), snapshot(cls="car")],
+        {
+            "entrance/north/person": totals(IN=1, IN_CONF=0.5),
+            "exit/north/person": totals(IN=1, IN_CONF=0.5),
+            "entrance/south/person": totals(IN=1, IN_CONF=0.5),
+            "entrance/north/car": totals(IN=1, IN_CONF=0.5),
+        },
+    ),
+    # Several classes and both categories in one snapshot
+    (
+        [{"entrance": {"north": {
+            "IN": {"person": {"count": 2, "total_conf": 1.2}, "car": {"count": 1, "total_conf": 0.8}},
+            "OUT": {"person": {"count": 1, "total_conf": 0.4}},
+        }}}],
+        {
+            "entrance/north/person": totals(IN=2, OUT=1, IN_CONF=1.2, OUT_CONF=0.4),
+            "entrance/north/car": totals(IN=1, IN_CONF=0.8),
+        },
+    ),
+    # Missing categories and fields count as zero
+    (
+        [{"entrance": {"north": {"OUT": {"person": {}}}}}, {"entrance": {"north": {}}}],
+        {"entrance/north/person": totals()},
+    ),
+    ([], {}),
+])
+def test_merge_per_topic(snapshots, expected):
+    entries = [(index, 1000 + index, counts) for index, counts in enumerate(snapshots)]
+    buckets = aggregate_counts(entries)
+
+    result = {topic: dict(values) for topic, values in buckets[0].items()} if buckets else {}
+    assert result.keys() == expected.keys()
+    for topic, values in expected.items():
+        assert result[topic] == pytest.approx(values)
+
+
+@pytest.mark.parametrize("created, bucket_seconds, expected", [
+    ([0, 30, 59, 60, 125], 60, {0: 3, 60: 1, 120: 1}),
+    ([10, 20, 30], 10, {10: 1, 20: 1, 30: 1}),
+    ([10, 20, 3600], 0, {0: 3}),
+    ([1000.5, 1001.9], 1, {1000: 1, 1001: 1}),
+])
+def test_time_buckets(created, bucket_seconds, expected):
+    entries = [(index, timestamp, snapshot()) for index, timestamp in enumerate(created)]
+    buckets = aggregate_counts(entries, bucket_seconds)
+
+    assert {bucket: topics["entrance/north/person"]["IN"] for bucket, topics in buckets.items()} == expected
+
+
+@pytest.mark.parametrize("values, timestamp, expected", [
+    (totals(IN=4, OUT=2, IN_CONF=3.0, OUT_CONF=1.0), None, {"IN": 4, "OUT": 2, "IN_CONF": 0.75, "OUT_CONF": 0.5}),
+    (totals(IN=2, IN_CONF=1.0), 1700000000, {"IN": 2, "OUT": 0, "IN_CONF": 0.5, "OUT_CONF": 0, "timestamp": 1700000000}),
+    (totals(), None, {"IN": 0, "OUT": 0, "IN_CONF": 0, "OUT_CONF": 0}),
+])
+def test_to_payload_averages_the_confidence(values, timestamp, expected):
+    assert to_payload(values, timestamp) == pytest.approx(expected)
@@ -0,0 +1,144 @@
+import json
+import pytest
+from src.core.inference import benchmark_store
+from src.core.inference.benchmark_store import BenchmarkStore
+
+"""
+    Regression check of the benchmarks against earlier runs of the same series (model, format, quantization,
+    image size and hardware fingerprint) and the index of the benchmark files in tmp_path.
+"""
+
+HARDWARE = {"machine": "x86_64", "cpu": "Test CPU", "cpu_count": 4, "memory_gb": 8, "gpu": None, "fingerprint": "aaaaaaaaaaaa"}
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(benchmark_store, "get_hardware", lambda: dict(HARDWARE))
+    return BenchmarkStore(path=str(tmp_path))
+
+
+def make_meta(**overrides):
+    meta = {"type": "model", "model": "yolo11n.pt", "format": "onnx", "quantization": "default", "imgsz": 320, "hardware": HARDWARE}
+    meta.update(overrides)
+    return meta
+
+
+# Written like save() does, with a given date
+def write_benchmark(store, name, day, fps, meta=None, device_config_id="1"):
+    content = {
+        "deviceConfigId": device_config_id,
+        "header": "Benchmarks complete for yolo11n.pt with imgsz=320, half=False, int8=False, device=cpu",
+        "data": {str(index): {"Format": "ONNX", "FPS": value} for index, value in enumerate(fps if isinstance(fps, list) else [fps])},
+        "date": f"{day:02d}.01.2026 - 12:00:00",
+        "meta": meta or make_meta(),
+    }
+    file = f"benchmark_{name}.json"
+    with open(f"{store.path}/{file}", "w") as f:
+        json.dump(content, f)
+    return file
+
+
+def test_compare_flags_regression_against_the_best_run(store):
+    write_benchmark(store, "a", 1, 20.0)
+    best = write_benchmark(store, "b", 2, 25.0)
+    latest = write_benchmark(store, "c", 3, 20.0)
+
+    result = store.compare()
+    assert result["file"] == latest
+    assert result["compared_runs"] == 2
+    row = result["rows"][0]
+    assert (row["fps"], row["best_fps"], row["best_file"]) == (20.0, 25.0, best)
+    assert row["change"] == -0.2
+    assert row["regression"] and result["regression"]
+
+
+@pytest.mark.parametrize("fps, threshold, regression", [
+    (23.0, 0.1, False),
+    (22.0, 0.1, True),
+    (22.0, 0.15, False),
+    (30.0, 0.1, False),
+])
+def test_compare_threshold(store, fps, threshold, regression):
+    write_benchmark(store, "a", 1, 25.0)
+    write_benchmark(store, "b", 2, fps)
+
+    assert store.compare(threshold=threshold)["regression"] == regression
+
+
+@pytest.mark.parametrize("other_meta, other_config", [
+    (make_meta(hardware={**HARDWARE, "fingerprint": "bbbbbbbbbbbb"}), "1"),
+    (make_meta(hardware=None), "1"),
+    (make_meta(quantization="int8"), "1"),
+    (make_meta(format="openvino"), "1"),
+    (make_meta(imgsz=640), "1"),
+    (make_meta(model="yolo11s.pt"), "1"),
+    (make_meta(type="inference"), "1"),
+    (make_meta(), "2"),
+])
+def test_other_series_are_not_compared(store, other_meta, other_config):
+    write_benchmark(store, "other", 1, 100.0, other_meta, device_config_id=other_config)
+    write_benchmark(store, "latest", 2, 20.0)
+
+    result = store.compare()
+    assert result["compared_runs"] == 0
+    assert result["rows"][0]["best_fps"] is None
+    assert not result["regression"]
+
+
+def test_later_runs_are_not_compared(store):
+    first = write_benchmark(store, "a", 1, 20.0)
+    write_benchmark(store, "b", 2, 100.0)
+
+    result = store.compare(first)
+    assert result["compared_runs"] == 0
+    assert not result["regression"]
+
+
+def test_compare_without_benchmarks(store):
+    assert store.compare() is None
+    write_benchmark(store, "a", 1, 20.0)
+    with pytest.raises(FileNotFoundError):
+        store.compare("benchmark_missing.json")
+
+
+def test_index_picks_up_added_and_removed_files(store, tmp_path):
+    first = write_benchmark(store, "a", 1, 20.0)
+    assert [entry["file"] for entry in store.list_meta()] == [first]
+
+    second = write_benchmark(store, "b", 2, 25.0)
+    assert sorted(entry["file"] for entry in store.list_meta()) == [first, second]
+
+    (tmp_path / first).unlink()
+    assert [entry["file"] for entry in store.list_meta()] == [second]
+    assert list(json.loads((tmp_path / "index.json").read_text())["benchmarks"]) == [second]
+
+
+def test_index_is_rebuilt_with_the_metadata_of_the_files(store, tmp_path):
+    write_benchmark(store, "a", 1, 25.0)
+    store.save({"deviceConfigId": "1", "header": "", "data": {"0": {"Format": "ONNX", "FPS": 20.0}}, "date": "02.01.2026 - 12:00:00"}, make_meta())
+    assert store.compare()["regression"]
+
+    (tmp_path / "index.json").unlink()
+    meta = {entry["file"]: entry for entry in store.list_meta()}
+    assert len(meta) == 2
+    assert all(entry["hardware"]["fingerprint"] == HARDWARE["fingerprint"] for entry in meta.values())
+    assert store.compare()["regression"]
+
+
+def test_files_without_metadata_use_the_header(store, tmp_path):
+    content = {
+        "deviceConfigId": "1",
+        "header": "Benchmarks complete for yolo11n.pt with imgsz=640, half=True, int8=False, device=cpu",
+        "data": {},
+        "date": "01.01.2026 - 12:00:00",
+    }
+    (tmp_path / "benchmark_old.json").write_text(json.dumps(content))
+
+    meta = store.list_meta()[0]
+    assert (meta["model"], meta["imgsz"], meta["quantization"], meta["device"]) == ("yolo11n.pt", 640, "fp16", "cpu")
+
+
+def test_clear(store):
+    write_benchmark(store, "a", 1, 20.0)
+    store.clear()
+    assert store.list_meta() == []
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from shapely.geometry import LineString
+from src.core.inference.crossing import LineCrossingEngine
+
+"""
+    Parity of the vectorized LineCrossingEngine with the former shapely check:
+    LineString(line).crosses(LineString(previous, current)), IN/OUT by the side of the current position.
+    Coordinates on a small integer grid, so touching, collinear and degenerate segments occur often.
+"""
+
+GRID = 6
+
+
+def make_regions(rng, region_count=3, line_count=3, classes=(0, 1, 2)):
+    regions = []
+    for index in range(region_count):
+        lines = []
+        for line_index in range(line_count):
+            start, end = rng.integers(0, GRID, size=(2, 2)).tolist()
+            lines.append({"id": f"{index}-{line_index}", "start_coord": start, "end_coord": end, "direction": "north"})
+        regions.append({
+            "name": f"region{index}",
+            "lines": lines,
+            "tagsInThisRegion": rng.choice(classes, size=rng.integers(1, len(classes) + 1), replace=False).tolist(),
+        })
+    return regions
+
+
+# Crossings the way Inference.count found them with shapely, ordered by track and line
+def shapely_crossings(regions, previous, current, clss):
+    lines = [(region, line) for region in regions for line in region["lines"]]
+    result = []
+    for i, (p, c, cls) in enumerate(zip(previous, current, clss)):
+        for j, (region, line) in enumerate(lines):
+            if cls not in region["tagsInThisRegion"]:
+                continue
+            if not LineString([line["start_coord"], line["end_coord"]]).crosses(LineString([p, c])):
+                continue
+            (x1, y1), (x2, y2) = line["start_coord"], line["end_coord"]
+            cross_product = (c[0] - x1) * (y2 - y1) - (c[1] - y1) * (x2 - x1)
+            result.append((i, j, -1 if cross_product < 0 else 1))
+    return result
+
+
+def engine_crossings(regions, previous, current, clss):
+    track_index, line_index, signs = LineCrossingEngine(regions).crossings(previous, current, clss)
+    return list(zip(track_index.tolist(), line_index.tolist(), signs.tolist()))
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_scenes(seed):
+    rng = np.random.default_rng(seed)
+    regions = make_regions(rng)
+    previous = rng.integers(0, GRID, size=(40, 2)).tolist()
+    current = rng.integers(0, GRID, size=(40, 2)).tolist()
+    clss = rng.integers(0, 3, size=40).tolist()
+
+    assert engine_crossings(regions, previous, current, clss) == shapely_crossings(regions, previous, current, clss)
+
+
+LINE = {"id": "l", "start_coord": [0, 0], "end_coord": [4, 0], "direction": "north"}
+
+
+@pytest.mark.parametrize("previous, current", [
+    ([2, -2], [2, 2]),  # crossing
+    ([2, 2], [2, -2]),  # crossing, other direction
+    ([2, -2], [2, 0]),  # ends on the line
+    ([2, 0], [2, 2]),   # starts on the line
+    ([0, -2], [0, 2]),  # through the end point of the line
+    ([1, 0], [3, 0]),   # collinear, overlapping
+    ([5, 0], [6, 0]),   # collinear, apart
+    ([1, 1], [3, 1]),   # parallel
+    ([2, 2], [2, 2]),   # no movement
+    ([2, 0], [2, 0]),   # no movement on the line
+])
+def test_special_segments(previous, current):
+    regions = [{"name": "region", "lines": [dict(LINE)], "tagsInThisRegion": [0]}]
+    assert engine_crossings(regions, [previous], [current], [0]) == shapely_crossings(regions, [previous], [current], [0])
+
+
+def test_degenerate_line():
+    regions = [{"name": "region", "lines": [dict(LINE, end_coord=[0, 0])], "tagsInThisRegion": [0]}]
+    previous, current = [[-1, -1], [0, -1]], [[1, 1], [0, 1]]
+    assert engine_crossings(regions, previous, current, [0, 0]) == shapely_crossings(regions, previous, current, [0, 0]) == []
+
+
+def test_class_not_counted():
+    regions = [{"name": "region", "lines": [dict(LINE)], "tagsInThisRegion": [1]}]
+    assert engine_crossings(regions, [[2, -2]], [[2, 2]], [0]) == []
+
+
+def test_no_tracks_or_lines():
+    regions = [{"name": "region", "lines": [dict(LINE)], "tagsInThisRegion": [0]}]
+    assert engine_crossings(regions, [], [], []) == []
+    assert engine_crossings([], [[2, -2]], [[2, 2]], [0]) == []
@@ -0,0 +1,102 @@
+import json
+import pytest
+from src.core.events import EventBus, diff, merge_delta, stream_events
+
+"""
+    Deltas of the SSE event bus (diff/merge_delta), coalescing per subscriber and the subscriber limit.
+"""
+
+
+@pytest.mark.parametrize("old, new, expected", [
+    ({"a": 1, "b": 2}, {"a": 1, "b": 2}, {}),
+    ({"a": 1, "b": 2}, {"a": 1, "b": 3}, {"b": 3}),
+    ({"a": 1}, {"a": 1, "c": 4}, {"c": 4}),
+    ({"a": 1, "b": 2}, {"a": 1}, {"b": None}),
+    ({"x": {"y": 1, "z": 2}}, {"x": {"y": 1, "z": 3}}, {"x": {"z": 3}}),
+    ({"x": {"y": 1}}, {"x": {"y": 1}}, {}),
+    ({"x": {"y": 1}}, {"x": 5}, {"x": 5}),
+    ({"x": 5}, {"x": {"y": 1}}, {"x": {"y": 1}}),
+    ({"x": [1, 2]}, {"x": [1, 3]}, {"x": [1, 3]}),
+    (None, {"a": 1}, {"a": 1}),
+])
+def test_diff(old, new, expected):
+    assert diff(old, new) == expected
+
+
+@pytest.mark.parametrize("target, delta, expected", [
+    ({"a": 1}, {"b": 2}, {"a": 1, "b": 2}),
+    ({"a": 1}, {"a": None}, {"a": None}),
+    ({"x": {"y": 1, "z": 2}}, {"x": {"z": 3}}, {"x": {"y": 1, "z": 3}}),
+    ({"x": 5}, {"x": {"y": 1}}, {"x": {"y": 1}}),
+    ({"x": {"y": 1}}, {"x": 5}, {"x": 5}),
+    ({}, {}, {}),
+])
+def test_merge_delta(target, delta, expected):
+    assert merge_delta(target, delta) == expected
+
+
+@pytest.mark.parametrize("old, new", [
+    ({"cpu": 10, "inference": {"fps": 20, "running": True}}, {"cpu": 12, "inference": {"fps": 20, "running": False}}),
+    ({"a": {"b": {"c": 1}}}, {"a": {"b": {"c": 2, "d": 3}}}),
+    ({"a": 1, "b": 2}, {"a": 1, "b": 2, "c": 3}),
+])
+def test_merging_the_diff_restores_the_new_state(old, new):
+    assert merge_delta(json.loads(json.dumps(old)), diff(old, new)) == new
+
+
+def test_subscribe_rejects_over_the_limit():
+    bus = EventBus()
+    first = bus.subscribe(max_subscribers=2)
+    second = bus.subscribe(max_subscribers=2)
+
+    assert first is not None and second is not None
+    assert bus.subscribe(max_subscribers=2) is None
+    assert len(bus.subscriptions) == 2
+
+    # A free place after a client closed the stream
+    first.close()
+    assert bus.subscribe(max_subscribers=2) is not None
+
+    # 0 is no limit
+    assert bus.subscribe() is not None
+    assert len(bus.subscriptions) == 3
+
+
+def test_new_subscriber_gets_the_current_state():
+    bus = EventBus()
+    bus.publish("queue", {"size": 3})
+    bus.publish("status", {"cpu": 10, "inference": {"fps": 20}})
+    bus.publish("status", {"inference": {"fps": 25}}, delta=True)
+
+    events = dict(bus.subscribe().get(timeout=0))
+    assert events == {"queue": {"size": 3}, "status": {"cpu": 10, "inference": {"fps": 25}}}
+
+
+def test_deltas_are_coalesced_per_subscriber():
+    bus = EventBus()
+    bus.publish("status", {"cpu": 10, "ram": 20})
+    subscription = bus.subscribe()
+    subscription.get(timeout=0)
+
+    bus.publish("status", {"cpu": 11}, delta=True)
+    bus.publish("status", {"ram": 21}, delta=True)
+    bus.publish("queue", {"size": 1})
+    bus.publish("queue", {"size": 2})
+
+    assert dict(subscription.get(timeout=0)) == {"status": {"cpu": 11, "ram": 21}, "queue": {"size": 2}}
+    assert subscription.get(timeout=0) == []
+    assert bus.state["status"] == {"cpu": 11, "ram": 21}
+
+
+def test_stream_events_unsubscribes_when_closed():
+    bus = EventBus()
+    bus.publish("queue", {"size": 1})
+    subscription = bus.subscribe(max_subscribers=1)
+    stream = stream_events(subscription)
+
+    assert next(stream) == "retry: 3000\n\n"
+    assert next(stream) == 'event: queue\ndata: {"size": 1}\n\n'
+
+    stream.close()
+    assert subscription.closed
+    assert bus.subscribe(max_subscribers=1) is not None
@@ -0,0 +1,92 @@
+import os
+import pytest
+from src.core.inference.export_cache import ExportCache, filter_export_args
+
+"""
+    Keys of the export cache: only the arguments that matter for the format, independent of their order and types,
+    and a new key when the contents of the weights change.
+"""
+
+SHA256 = "0" * 64
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExportCache(path=str(tmp_path / "exports" / "manifest.json"), exports_path=str(tmp_path / "exports"))
+
+
+@pytest.mark.parametrize("format, export_args, expected", [
+    ("onnx", {"imgsz": 320, "int8": True, "keras": False, "half": False}, {"half": False, "imgsz": 320}),
+    ("onnx", {"imgsz": "640", "dynamic": 1, "simplify": 0}, {"dynamic": True, "imgsz": 640, "simplify": False}),
+    ("torchscript", {"imgsz": 320, "optimize": 1, "half": True}, {"imgsz": 320, "optimize": True}),
+    ("edgetpu", {"imgsz": 320, "batch": 4, "int8": True}, {"imgsz": 320}),
+    ("openvino", {"imgsz": 320, "batch": "4", "int8": 1}, {"batch": 4, "imgsz": 320, "int8": True}),
+    # Unknown formats keep all arguments
+    ("unknown", {"imgsz": 320, "foo": "bar"}, {"foo": "bar", "imgsz": 320}),
+    ("onnx", {}, {}),
+])
+def test_filter_export_args(format, export_args, expected):
+    assert filter_export_args(format, export_args) == expected
+
+
+def test_filter_export_args_is_sorted():
+    assert list(filter_export_args("engine", {"workspace": 4, "imgsz": 320, "half": True, "dynamic": False})) == ["dynamic", "half", "imgsz", "workspace"]
+
+
+@pytest.mark.parametrize("format, first, second", [
+    # Order of the arguments
+    ("onnx", {"imgsz": 320, "half": True, "simplify": True}, {"simplify": True, "half": True, "imgsz": 320}),
+    # Arguments that don't apply to the format
+    ("onnx", {"imgsz": 320, "half": False}, {"imgsz": 320, "half": False, "int8": True, "keras": True, "optimize": True}),
+    ("edgetpu", {"imgsz": 320}, {"imgsz": 320, "half": True, "batch": 8}),
+    # Types
+    ("onnx", {"imgsz": 320, "half": True}, {"imgsz": "320", "half": 1}),
+    ("tflite", {"imgsz": 320, "int8": False}, {"int8": 0, "imgsz": "320"}),
+])
+def test_same_key(cache, format, first, second):
+    assert cache.make_key(SHA256, format, first) == cache.make_key(SHA256, format, second)
+
+
+@pytest.mark.parametrize("first, second", [
+    (("onnx", {"imgsz": 320}), ("onnx", {"imgsz": 640})),
+    (("onnx", {"imgsz": 320, "half": False}), ("onnx", {"imgsz": 320, "half": True})),
+    (("onnx", {"imgsz": 320}), ("openvino", {"imgsz": 320})),
+    (("onnx", {"imgsz": 320, "batch": 1}), ("onnx", {"imgsz": 320, "batch": 4})),
+])
+def test_different_key(cache, first, second):
+    assert cache.make_key(SHA256, *first) != cache.make_key(SHA256, *second)
+
+
+def test_different_weights_give_different_keys(cache):
+    assert cache.make_key(SHA256, "onnx", {"imgsz": 320}) != cache.make_key("1" * 64, "onnx", {"imgsz": 320})
+
+
+def test_store_and_lookup(cache, tmp_path):
+    weights = tmp_path / "model.pt"
+    weights.write_bytes(b"weights")
+    export_path = tmp_path / "exports" / "model.onnx"
+    export_path.parent.mkdir(parents=True, exist_ok=True)
+    export_path.write_bytes(b"onnx")
+
+    cache.store(str(weights), "onnx", {"imgsz": 320, "half": False}, str(export_path), 12.5)
+
+    assert cache.lookup(str(weights), "onnx", {"half": False, "imgsz": 320, "int8": True}) == str(export_path)
+    assert cache.lookup(str(weights), "onnx", {"imgsz": 640, "half": False}) is None
+
+    # Retrained weights with the same name are exported again
+    weights.write_bytes(b"new weights")
+    os.utime(weights, (0, 0))
+    assert cache.lookup(str(weights), "onnx", {"imgsz": 320, "half": False}) is None
+
+
+def test_missing_export_is_removed(cache, tmp_path):
+    weights = tmp_path / "model.pt"
+    weights.write_bytes(b"weights")
+    export_path = tmp_path / "model.onnx"
+    export_path.write_bytes(b"onnx")
+
+    key = cache.store(str(weights), "onnx", {"imgsz": 320}, str(export_path), 1.0)
+    export_path.unlink()
+
+    assert cache.lookup(str(weights), "onnx", {"imgsz": 320}) is None
+    assert key not in [entry["key"] for entry in cache.list_exports()]
@@ -0,0 +1,100 @@
+import sys
+import types
+import pytest
+from src.core.inference.model_registry import ModelKey, ModelRegistry, WARMUP_RUNS, predict_padded
+
+
+class StubModel:
+    def __init__(self, weights):
+        self.weights = weights
+        self.batches = []
+
+    def predict(self, source, **kwargs):
+        images = source if isinstance(source, list) else [source]
+        if self.weights.endswith("_b4.onnx") and len(images) != 4:
+            raise RuntimeError(f"Got invalid dimensions for input: images, expected 4, got {len(images)}")
+        self.batches.append(len(images))
+        return [None] * len(images)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setitem(sys.modules, "ultralytics", types.SimpleNamespace(YOLO=StubModel))
+    return ModelRegistry(max_models=1, max_memory_mb=0)
+
+
+def make_key(weights="yolo11n.pt", format="pt", batch=1):
+    return ModelKey(weights, format, "cpu", 64, "FP32", "botsort.yaml", batch)
+
+
+def test_warmup_single_image(registry):
+    model, info = registry.acquire(make_key())
+    assert model.batches == [1] * WARMUP_RUNS
+    assert info["model_cached"] is False
+
+
+def test_warmup_static_batch(registry):
+    model, _ = registry.acquire(make_key("yolo11n_b4.onnx", "onnx", batch=4))
+    assert model.batches == [4] * WARMUP_RUNS
+
+
+def test_static_batch_fails_with_single_image(registry):
+    # What the warm-up did before the batch was part of the key
+    with pytest.raises(RuntimeError):
+        registry.acquire(make_key("yolo11n_b4.onnx", "onnx"))
+
+
+def test_default_batch():
+    key = ModelKey("yolo11n.pt", "pt", "cpu", 640, "FP32", "botsort.yaml")
+    assert key.batch == 1
+
+
+def test_reuse_and_eviction(registry):
+    key = make_key()
+    model, _ = registry.acquire(key)
+    registry.release(model)
+
+    reused, info = registry.acquire(key)
+    assert reused is model and info["model_cached"] is True
+    registry.release(reused)
+
+    other, _ = registry.acquire(make_key("yolo11s.pt"))
+    registry.release(other)
+    assert [entry["model"].split(" ")[0] for entry in registry.get_status()] == ["yolo11s.pt"]
+
+
+def test_model_in_use_is_not_shared(registry):
+    key = make_key()
+    first, _ = registry.acquire(key)
+    second, _ = registry.acquire(key)
+    assert first is not second
+
+
+class StaticExport:
+    def __init__(self, batch):
+        self.batch = batch
+
+    def track(self, frames):
+        assert len(frames) == self.batch
+        return [f"result-{frame}" for frame in frames]
+
+
+@pytest.mark.parametrize("frames, expected", [
+    ([1, 2, 3, 4], ["result-1", "result-2", "result-3", "result-4"]),
+    ([1, 2, 3], ["result-1", "result-2", "result-3"]),
+    ([1], ["result-1"]),
+])
+def test_predict_padded_static(frames, expected):
+    assert predict_padded(StaticExport(4).track, frames, 4) == expected
+
+
+def test_predict_padded_pads_with_last_frame():
+    calls = []
+    predict_padded(lambda frames: calls.append(list(frames)) or frames, [1, 2], 4)
+    assert calls == [[1, 2, 2, 2]]
+
+
+def test_predict_padded_dynamic():
+    calls = []
+    assert predict_padded(lambda frames: calls.append(len(frames)) or frames, [1, 2], 0) == [1, 2]
+    assert calls == [2]
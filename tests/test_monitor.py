@@ -0,0 +1,32 @@
+from src.core.monitor import SystemMonitor
+
+
+def collect_status():
+    return {'inference': {'details': {'avg_fps': 12.5}, 'queue_size': 3}}
+
+
+def failing_status():
+    raise RuntimeError("camera not ready")
+
+
+def test_cold_start_samples_synchronously():
+    # Sampler thread not started, e.g. the first sample is still running
+    monitor = SystemMonitor(collect_status, lambda: [], interval=0.01)
+    status = monitor.get_status()
+    assert status['inference']['queue_size'] == 3
+    assert status['history']['fps'] == [12.5]
+    assert monitor.get_status() is status
+
+
+def test_failing_sample_returns_fallback():
+    monitor = SystemMonitor(failing_status, lambda: [], interval=0.01)
+    status = monitor.get_status()
+    assert status == {'status': 'starting', 'error': 'camera not ready'}
+
+
+def test_on_sample_gets_previous_snapshot():
+    samples = []
+    monitor = SystemMonitor(collect_status, lambda: [], interval=0.01, on_sample=lambda previous, status: samples.append(previous))
+    first = monitor.sample()
+    monitor.sample()
+    assert samples == [None, first]
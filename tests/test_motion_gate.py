@@ -0,0 +1,142 @@
+import numpy as np
+import pytest
+from src.core.inference.motion_gate import MARGIN, MotionGate, get_lines_box
+
+"""
+    MotionGate with synthetic frames: a static gray background and a bright square moving through the watched area.
+"""
+
+WIDTH, HEIGHT = 640, 480
+HOLD_SECONDS = 2
+
+
+def make_regions(*lines):
+    return [{"lines": [{"start_coord": start, "end_coord": end} for start, end in lines]}]
+
+
+def static_frame():
+    return np.full((HEIGHT, WIDTH, 3), 80, dtype=np.uint8)
+
+
+def moving_frame(step):
+    frame = static_frame()
+    x = 100 + step * 40
+    frame[200:280, x:x + 80] = 255
+    return frame
+
+
+@pytest.fixture
+def gate():
+    return MotionGate("test", make_regions(([0, 240], [640, 240])), WIDTH, HEIGHT, hold_seconds=HOLD_SECONDS)
+
+
+# Checks the static frame every 0.1 s until the gate skips, returns the time of the first skipped frame
+def run_until_skipped(gate, now, frame=None):
+    frame = static_frame() if frame is None else frame
+    while gate.check(frame, now, active_tracks=0):
+        now += 0.1
+        assert now < 100, "The gate never skipped"
+    return now
+
+
+def test_first_frame_passes(gate):
+    assert gate.check(static_frame(), 0, active_tracks=0)
+    assert not gate.reopened()
+
+
+def test_static_frame_is_skipped_after_hold_seconds(gate):
+    skipped_at = run_until_skipped(gate, 0)
+
+    assert HOLD_SECONDS <= skipped_at < HOLD_SECONDS + 0.2
+    assert not gate.check(static_frame(), skipped_at + 10, active_tracks=0)
+    assert gate.get_status()["skipping"]
+    assert gate.skipped == 2
+
+
+def test_passes_while_tracks_are_active(gate):
+    gate.check(static_frame(), 0, active_tracks=0)
+    for step in range(1, 100):
+        assert gate.check(static_frame(), step * 0.1, active_tracks=1)
+    assert gate.skipped == 0
+
+    # Without tracks the hold time since the last motion applies
+    assert not gate.check(static_frame(), 10, active_tracks=0)
+
+
+def test_motion_keeps_the_gate_open(gate):
+    gate.check(static_frame(), 0, active_tracks=0)
+    for step in range(1, 12):
+        assert gate.check(moving_frame(step), step * 0.5, active_tracks=0)
+    assert gate.last_changed > gate.threshold
+
+
+def test_reopened_once_after_skipping(gate):
+    now = run_until_skipped(gate, 0)
+    assert gate.check(moving_frame(1), now + 1, active_tracks=0)
+
+    assert gate.reopened()
+    assert not gate.reopened()
+    assert gate.check(moving_frame(2), now + 1.1, active_tracks=0)
+    assert not gate.reopened()
+
+
+def test_reopened_by_tracks(gate):
+    now = run_until_skipped(gate, 0)
+    assert gate.check(static_frame(), now + 1, active_tracks=1)
+    assert gate.reopened()
+    assert not gate.reopened()
+
+
+def test_motion_outside_the_lines_box_is_ignored():
+    gate = MotionGate("test", make_regions(([0, 100], [640, 100])), WIDTH, HEIGHT, hold_seconds=HOLD_SECONDS)
+
+    # The box reaches from y 52 to 148, the square moves at y 400
+    def frame(step):
+        result = static_frame()
+        result[380:460, 40 * step:40 * step + 80] = 255
+        return result
+
+    gate.check(frame(0), 0, active_tracks=0)
+    now = 0
+    for step in range(1, 13):
+        now = step * 0.5
+        if not gate.check(frame(step), now, active_tracks=0):
+            break
+    assert now <= HOLD_SECONDS + 0.5
+    assert gate.skipped == 1
+
+
+@pytest.mark.parametrize("lines, expected", [
+    # Inside: margin of 10 % of the frame on every side
+    ([([200, 200], [400, 300])], (136, 152, 464, 348)),
+    # At the edges the box is clamped to the frame
+    ([([0, 240], [640, 240])], (0, 192, 640, 288)),
+    ([([10, 5], [630, 470])], (0, 0, 640, 480)),
+    ([([-50, -20], [700, 520])], (0, 0, 640, 480)),
+    # Several lines
+    ([([100, 100], [150, 120]), ([500, 400], [520, 420])], (36, 52, 584, 468)),
+])
+def test_lines_box(lines, expected):
+    assert get_lines_box(make_regions(*lines), WIDTH, HEIGHT) == expected
+
+
+def test_lines_box_without_lines():
+    assert get_lines_box([], WIDTH, HEIGHT) == (0, 0, WIDTH, HEIGHT)
+    assert get_lines_box(None, WIDTH, HEIGHT) == (0, 0, WIDTH, HEIGHT)
+    assert get_lines_box([{"lines": []}], WIDTH, HEIGHT) == (0, 0, WIDTH, HEIGHT)
+
+
+def test_lines_box_is_never_empty():
+    # A point without margin, also on or beyond the right and bottom edge, gives a box of one pixel
+    assert get_lines_box(make_regions(([100, 100], [100, 100])), WIDTH, HEIGHT, margin=0) == (100, 100, 101, 101)
+    assert get_lines_box(make_regions(([640, 480], [640, 480])), WIDTH, HEIGHT, margin=0) == (639, 479, 640, 480)
+    assert get_lines_box(make_regions(([700, 500], [800, 600])), WIDTH, HEIGHT, margin=0) == (639, 479, 640, 480)
+
+
+def test_gate_on_a_box_at_the_frame_edge():
+    gate = MotionGate("test", make_regions(([600, 460], [640, 480])), WIDTH, HEIGHT, hold_seconds=HOLD_SECONDS)
+    x1, y1, x2, y2 = gate.box
+    assert (x2, y2) == (WIDTH, HEIGHT)
+    assert (x1, y1) == (600 - int(MARGIN * WIDTH), 460 - int(MARGIN * HEIGHT))
+    assert gate.check(static_frame(), 0, active_tracks=0)
+    assert not gate.check(static_frame(), HOLD_SECONDS, active_tracks=0)
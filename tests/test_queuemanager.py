@@ -0,0 +1,121 @@
+import os
+import subprocess
+import sys
+import time
+import pytest
+from src.core.inference.queuemanager import QueueManager
+
+"""
+    SQLite queue of the unpublished counts: peek/ack, limits and restoring the entries after a crash.
+    Every test works on its own database in tmp_path.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def make_queue(tmp_path):
+    queues = []
+    def make(**kwargs):
+        kwargs.setdefault("max_entries", 0)
+        kwargs.setdefault("retention", 0)
+        manager = QueueManager(path=str(tmp_path / "queue" / "counts.db"), **kwargs)
+        queues.append(manager)
+        return manager
+    yield make
+    for manager in queues:
+        manager.close()
+
+
+def payloads(entries):
+    return [counts["n"] for _, _, counts in entries]
+
+
+def test_peek_does_not_remove(make_queue):
+    manager = make_queue()
+    for n in range(3):
+        manager.save_counts({"n": n})
+
+    assert payloads(manager.peek_counts()) == [0, 1, 2]
+    assert payloads(manager.peek_counts(limit=2)) == [0, 1]
+    assert manager.get_counts_queue_size() == 3
+
+
+def test_ack_removes_only_acked_entries(make_queue):
+    manager = make_queue()
+    for n in range(5):
+        manager.save_counts({"n": n})
+
+    entries = manager.peek_counts(limit=2)
+    assert manager.ack_counts([row_id for row_id, _, _ in entries]) == 2
+    assert payloads(manager.peek_counts()) == [2, 3, 4]
+
+    # Acking out of order keeps the order of the rest
+    ids = [row_id for row_id, _, _ in manager.peek_counts()]
+    assert manager.ack_counts([ids[1]]) == 1
+    assert payloads(manager.peek_counts()) == [2, 4]
+
+    assert manager.ack_counts([ids[1]]) == 0
+    assert manager.ack_counts([]) == 0
+
+
+def test_ack_in_chunks(make_queue):
+    manager = make_queue()
+    for n in range(1200):
+        manager.save_counts({"n": n})
+
+    ids = [row_id for row_id, _, _ in manager.peek_counts(limit=-1)]
+    assert manager.ack_counts(ids[:1100]) == 1100
+    assert manager.get_counts_queue_size() == 100
+
+
+def test_max_entries_drops_the_oldest(make_queue):
+    manager = make_queue(max_entries=3)
+    for n in range(5):
+        manager.save_counts({"n": n})
+
+    assert manager.get_counts_queue_size() == 3
+    assert payloads(manager.peek_counts()) == [2, 3, 4]
+
+
+def test_retention_drops_expired_entries(make_queue):
+    manager = make_queue(retention=60)
+    now = time.time()
+    manager.save_counts({"n": 0}, created=now - 120)
+    manager.save_counts({"n": 1}, created=now - 30)
+    manager.save_counts({"n": 2})
+
+    assert payloads(manager.peek_counts()) == [1, 2]
+
+
+def test_get_counts_history_empties_the_queue(make_queue):
+    manager = make_queue()
+    for n in range(3):
+        manager.save_counts({"n": n})
+
+    assert [counts["n"] for counts in manager.get_counts_history()] == [0, 1, 2]
+    assert manager.is_queue_empty()
+
+
+def test_reopen_after_crash(tmp_path, make_queue):
+    path = tmp_path / "queue" / "counts.db"
+
+    # The process dies without closing the database
+    script = (
+        "import os\n"
+        "from src.core.inference.queuemanager import QueueManager\n"
+        f"manager = QueueManager(path={str(path)!r}, max_entries=0, retention=0)\n"
+        "for n in range(3):\n"
+        "    manager.save_counts({'n': n})\n"
+        "manager.ack_counts([manager.peek_counts(limit=1)[0][0]])\n"
+        "os._exit(0)\n"
+    )
+    env = {**os.environ, "PYTHONPATH": ROOT}
+    subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env, check=True, timeout=60)
+
+    manager = make_queue()
+    assert payloads(manager.peek_counts()) == [1, 2]
+
+    # New entries continue after the restored ones
+    manager.save_counts({"n": 3})
+    assert payloads(manager.peek_counts()) == [1, 2, 3]
@@ -0,0 +1,160 @@
+import pytest
+from src.core.inference.stride_controller import HOLD_SECONDS, IDLE_SECONDS, IMGSZ_STEP, StrideController
+
+"""
+    StrideController against a simulated live pipeline with an injected clock.
+    The camera delivers camera_fps frames, the pipeline takes `busy` seconds per frame and processes every
+    stride-th frame. When it is slower than that, the reader drops the frames in between.
+"""
+
+CAMERA_FPS = 30
+START = 1000.0
+
+
+class Pipeline:
+    def __init__(self, controller, busy=0.01, scale_with_imgsz=False):
+        self.controller = controller
+        self.base_busy = busy
+        self.scale_with_imgsz = scale_with_imgsz
+        self.now = START
+        self.captured = 0
+        self.dropped = 0
+        self.stride, self.imgsz = controller.stride, controller.imgsz
+
+    def get_busy(self):
+        if self.scale_with_imgsz:
+            return self.base_busy * (self.imgsz / self.controller.max_imgsz) ** 2
+        return self.base_busy
+
+    def run(self, seconds, tracks=0):
+        end = self.now + seconds
+        while self.now < end:
+            busy = self.get_busy()
+            interval = max(busy, self.stride / CAMERA_FPS)
+            frames = round(interval * CAMERA_FPS)
+            self.now += interval
+            self.captured += frames
+            self.dropped += max(0, frames - self.stride)
+            self.stride, self.imgsz = self.controller.update(busy, tracks, self.captured, self.dropped, now=self.now)
+        return self
+
+    def actions(self):
+        return [decision["action"] for decision in self.controller.history]
+
+
+def make_controller(**kwargs):
+    kwargs.setdefault("max_stride", 8)
+    kwargs.setdefault("max_stride_active", 2)
+    return StrideController("test", CAMERA_FPS, **kwargs)
+
+
+def test_no_decision_without_measurements():
+    controller = make_controller()
+    assert controller.update(0.01, 0, 0, 0, now=START) == (1, 640)
+    # An interval, but no new camera frames for the drop ratio
+    assert controller.update(0.01, 0, 0, 0, now=START + 0.1) == (1, 640)
+    assert not controller.history
+
+    assert controller.update(0.01, 0, 3, 0, now=START + 0.2) == (2, 640)
+
+
+def test_stride_goes_up_while_idle():
+    pipeline = Pipeline(make_controller()).run(60)
+
+    assert pipeline.stride == 8
+    assert set(pipeline.actions()) == {"stride_up"}
+
+
+def test_stride_is_capped_while_objects_are_present():
+    pipeline = Pipeline(make_controller(target_fps=5))
+    pipeline.run(60)
+    assert pipeline.stride == 6 # 30 fps / 6 = 5 fps
+
+    pipeline.run(30, tracks=3)
+    assert pipeline.stride == 2
+    assert "objects in the scene" in [decision["reason"] for decision in pipeline.controller.history]
+
+    # The target alone would raise the stride again, the tracks keep it at the cap
+    decisions = len(pipeline.controller.history)
+    pipeline.run(30, tracks=3)
+    assert pipeline.stride == 2
+    assert len(pipeline.controller.history) == decisions
+
+
+def test_stride_returns_to_the_limit_after_idle_seconds():
+    pipeline = Pipeline(make_controller(target_fps=5)).run(30, tracks=1)
+    assert pipeline.stride == 2
+
+    pipeline.run(IDLE_SECONDS - 1)
+    assert pipeline.stride == 2
+    pipeline.run(30)
+    assert pipeline.stride == 6
+
+
+def test_stride_down_when_the_reader_drops_frames():
+    pipeline = Pipeline(make_controller()).run(60)
+    assert pipeline.stride == 8
+
+    # The pipeline gets slower than 8 camera frames, the stride only adds skipped frames to the dropped ones
+    pipeline.base_busy = 0.5
+    pipeline.run(60)
+
+    assert pipeline.stride == 1
+    reasons = [decision["reason"] for decision in pipeline.controller.history if decision["action"] == "stride_down"]
+    assert reasons and all(reason.startswith("reader drops") for reason in reasons)
+
+
+def test_imgsz_down_over_the_latency_budget():
+    controller = make_controller(latency_ms=50, adapt_imgsz=True)
+    pipeline = Pipeline(controller, busy=0.08, scale_with_imgsz=True).run(60, tracks=1)
+
+    # 80 ms at 640, the first size within 50 ms is 480 (45 ms), the next step up would exceed 80 % of the budget
+    assert pipeline.imgsz == 480
+    assert pipeline.actions() == ["imgsz_down"] * ((640 - 480) // IMGSZ_STEP)
+    assert pipeline.stride == 1
+
+
+def test_imgsz_is_kept_without_adapt_imgsz():
+    pipeline = Pipeline(make_controller(latency_ms=50), busy=0.08, scale_with_imgsz=True).run(60, tracks=1)
+
+    assert pipeline.imgsz == 640
+    assert "imgsz_down" not in pipeline.actions()
+
+
+def test_imgsz_up_with_headroom():
+    controller = make_controller(latency_ms=50, adapt_imgsz=True)
+    pipeline = Pipeline(controller, busy=0.08, scale_with_imgsz=True).run(60, tracks=1)
+    assert pipeline.imgsz == 480
+
+    pipeline.base_busy = 0.02
+    pipeline.run(60, tracks=1)
+    assert pipeline.imgsz == 640
+    assert pipeline.actions()[-1] == "imgsz_up"
+
+
+@pytest.mark.parametrize("kwargs, busy, tracks", [
+    ({}, 0.01, 0),
+    ({"target_fps": 5}, 0.01, 0),
+    ({"latency_ms": 50, "adapt_imgsz": True}, 0.08, 1),
+])
+def test_hold_seconds_between_decisions(kwargs, busy, tracks):
+    pipeline = Pipeline(make_controller(**kwargs), busy=busy, scale_with_imgsz=True).run(60, tracks=tracks)
+
+    times = [decision["time"] for decision in pipeline.controller.history]
+    assert len(times) >= 2
+    assert all(later - earlier >= HOLD_SECONDS for earlier, later in zip(times, times[1:]))
+
+
+def test_no_change_within_hold_seconds():
+    controller = make_controller()
+    pipeline = Pipeline(controller).run(10)
+    last_change = controller.last_change
+    stride = pipeline.stride
+    assert stride > 1
+
+    # Tracks would lower the stride right away, the hold time delays the decision
+    while pipeline.now < last_change + HOLD_SECONDS - 0.2:
+        pipeline.run(0.1, tracks=1)
+        assert pipeline.stride == stride
+    pipeline.run(HOLD_SECONDS, tracks=1)
+    assert pipeline.stride < stride
@@ -0,0 +1,79 @@
+import numpy as np
+from src.core.inference.track_store import TrackStore
+
+"""
+    TrackStore: previous positions, ring buffer per track, TTL eviction and growth of the slot arrays.
+"""
+
+
+def test_first_update_has_no_previous_position():
+    store = TrackStore()
+    previous, has_previous = store.update([1, 2], [[0, 0], [5, 5]], now=0)
+
+    assert has_previous.tolist() == [False, False]
+    assert len(store) == 2 and 1 in store and 2 in store
+
+
+def test_update_returns_previous_positions():
+    store = TrackStore()
+    store.update([1, 2], [[0, 0], [5, 5]], now=0)
+    previous, has_previous = store.update([2, 1, 3], [[6, 6], [1, 1], [9, 9]], now=1)
+
+    assert has_previous.tolist() == [True, True, False]
+    assert previous[:2].tolist() == [[5, 5], [0, 0]]
+
+
+def test_history_is_bounded_and_oldest_first():
+    store = TrackStore(capacity=3)
+    for step in range(5):
+        store.update([7], [[step, step]], now=step)
+
+    assert store.get(7).tolist() == [[2, 2], [3, 3], [4, 4]]
+    assert store.get(8).shape == (0, 2)
+
+
+def test_evict_removes_tracks_older_than_ttl():
+    store = TrackStore(ttl=5)
+    store.update([1, 2], [[0, 0], [1, 1]], now=0)
+    store.update([2], [[2, 2]], now=4)
+
+    assert store.evict(now=5) == 0 # Exactly at the TTL is not expired yet
+    assert store.evict(now=6) == 1
+    assert 1 not in store and 2 in store
+
+    # An evicted track starts without history when it shows up again
+    previous, has_previous = store.update([1], [[3, 3]], now=6)
+    assert has_previous.tolist() == [False]
+    assert store.get(1).tolist() == [[3, 3]]
+
+
+def test_evicted_slots_are_reused():
+    store = TrackStore(initial_tracks=2)
+    store.update([1, 2], [[0, 0], [1, 1]], now=0)
+    store.evict(now=10)
+    store.update([3, 4], [[0, 0], [1, 1]], now=10)
+
+    assert len(store.slot_ids) == 2
+    assert sorted(store.index) == [3, 4]
+
+
+def test_grows_beyond_initial_tracks():
+    store = TrackStore(initial_tracks=2)
+    ids = list(range(5))
+    store.update(ids, np.arange(10).reshape(5, 2), now=0)
+    previous, has_previous = store.update(ids, np.arange(10).reshape(5, 2) + 1, now=1)
+
+    assert len(store) == 5 and len(store.slot_ids) >= 5
+    assert has_previous.all()
+    assert previous.tolist() == np.arange(10).reshape(5, 2).tolist()
+
+
+def test_clear():
+    store = TrackStore(initial_tracks=2)
+    store.update([1, 2, 3], [[0, 0], [1, 1], [2, 2]], now=0)
+    store.clear()
+
+    assert len(store) == 0
+    assert store.evict(now=100) == 0
+    _, has_previous = store.update([1], [[0, 0]], now=1)
+    assert has_previous.tolist() == [False]